@@ -33,15 +33,33 @@ def readPrintFilesForOrigin(origin):
 	if origin not in [FileDestinations.LOCAL, FileDestinations.SDCARD]:
 		return make_response("Unknown origin: %s" % origin, 404)
 
-	files = _getFileList(origin)
-
 	if origin == FileDestinations.LOCAL:
-		return jsonify(files=files, free=util.getFreeBytes(settings().getBaseFolder("uploads")))
+		# Local files can be requested sorted (by date or name) and in pages, the total number of files goes in X-Total-Count
+		sortBy = request.args.get('sort')
+		offset = request.args.get('offset', 0, type=int)
+		limit = request.args.get('limit', None, type=int)
+
+		if sortBy is None and not offset and limit is None:
+			return jsonify(files=_getFileList(origin), free=util.getFreeBytes(settings().getBaseFolder("uploads")))
+
+		try:
+			total, files = printerManager().fileManager.queryFileData(sortBy or "date", request.args.get('order') == 'desc', offset, limit)
+		except ValueError as e:
+			return make_response(str(e), 400)
+
+		response = jsonify(files=[_addLocalFileRefs(f) for f in files], free=util.getFreeBytes(settings().getBaseFolder("uploads")))
+		response.headers['X-Total-Count'] = str(total)
+		return response
+
 	else:
-		return jsonify(files=files)
+		return jsonify(files=_getFileList(origin))
 
 
 def _getFileDetails(origin, filename):
+	if origin == FileDestinations.LOCAL:
+		file = printerManager().fileManager.getFileData(filename)
+		return _addLocalFileRefs(file) if file is not None else None
+
 	files = _getFileList(origin)
 	for file in files:
 		if file["name"] == filename:
@@ -49,6 +67,16 @@ def _getFileDetails(origin, filename):
 	return None
 
 
+def _addLocalFileRefs(file):
+	file.update({
+		"refs": {
+			"resource": url_for(".readPrintFile", target=FileDestinations.LOCAL, filename=file["name"], _external=True),
+			"download": url_for("index", _external=True) + "downloads/files/" + FileDestinations.LOCAL + "/" + file["name"]
+		}
+	})
+	return file
+
+
 def _getFileList(origin):
 	if origin == FileDestinations.SDCARD:
 		sdFileList = printerManager().getSdFiles()
@@ -67,14 +95,7 @@ def _getFileList(origin):
 					file.update({"size": sdSize})
 				files.append(file)
 	else:
-		files = printerManager().fileManager.getAllFileData()
-		for file in files:
-			file.update({
-				"refs": {
-					"resource": url_for(".readPrintFile", target=FileDestinations.LOCAL, filename=file["name"], _external=True),
-					"download": url_for("index", _external=True) + "downloads/files/" + FileDestinations.LOCAL + "/" + file["name"]
-				}
-			})
+		files = [_addLocalFileRefs(file) for file in printerManager().fileManager.getAllFileData()]
 	return files
 
 
@@ -308,10 +329,21 @@ def folderContents():
 	externalDriveMgr = externalDriveManager()
 
 	if location == '/':
-		return jsonify(externalDriveMgr.getRemovableDrives())
+		contents = externalDriveMgr.getRemovableDrives()
 
 	else:
-		return jsonify(externalDriveMgr.getFolderContents("%s/*" % location))
+		contents = externalDriveMgr.getFolderContents("%s/*" % location)
+
+	# Large folders can be requested in pages, the total number of entries goes in X-Total-Count
+	offset = request.args.get('offset', 0, type=int)
+	limit = request.args.get('limit', None, type=int)
+
+	if contents is None or (not offset and limit is None):
+		return jsonify(contents)
+
+	response = jsonify(contents[offset:offset + limit if limit is not None else None])
+	response.headers['X-Total-Count'] = str(len(contents))
+	return response
 
 @api.route("/files/file-browsing-extensions", methods=["GET"])
 @restricted_access
@@ -438,11 +438,13 @@ def _getTemperatureData(filter):
 		if "limit" in request.values.keys() and unicode(request.values["limit"]).isnumeric():
 			limit = int(request.values["limit"])
 
-		history = list(tempHistory)
-		limit = min(limit, len(history))
+		# secs between samples, the history is also kept averaged over longer periods
+		resolution = 0
+		if "resolution" in request.values.keys() and unicode(request.values["resolution"]).isnumeric():
+			resolution = int(request.values["resolution"])
 
 		tempData.update({
-			"history": map(lambda x: filter(x), history[-limit:])
+			"history": map(lambda x: filter(x), tempHistory.samples(limit, resolution))
 		})
 
 	return filter(tempData)
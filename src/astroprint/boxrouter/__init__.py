@@ -29,6 +29,7 @@ import weakref
 import uuid
 import sys
 
+from collections import deque
 from time import sleep, time
 from flask_login import current_user
 from ws4py.client.threadedclient import WebSocketClient
@@ -51,6 +52,9 @@ from .events import EventSender
 LINE_CHECK_STRING = 'box'
 
 class AstroprintBoxRouterClient(WebSocketClient):
+	MAX_QUEUED_BYTES = 512 * 1024 # Messages waiting to go out before new ones are dropped
+	MAX_BATCH_BYTES = 64 * 1024 # Messages written to the socket at once
+
 	def __init__(self, hostname, router):
 		self._systemListener = None
 		self._lastReceived = 0
@@ -61,19 +65,120 @@ class AstroprintBoxRouterClient(WebSocketClient):
 		self._weakRefRouter = weakref.ref(router)
 		self._logger = logging.getLogger(__name__)
 		self._condition = threading.Condition()
+		self._outbox = deque() # [key, payload]
+		self._outboxKeys = {} # key -> outbox entry waiting to be sent
+		self._outboxBytes = 0
+		self._heldStates = {} # key -> latest payload of the updates taken out of a congested outbox
+		self._outboxCondition = threading.Condition()
+		self._writerThread = None
 		self._messageHandler = BoxRouterMessageHandler(self._weakRefRouter, self)
 		super(AstroprintBoxRouterClient, self).__init__(hostname, headers=[('user-agent',softwareManager().userAgent)])
 
 	def __del__(self):
 		self.unregisterEvents()
 
-	def send(self, data):
+	def queue(self, payload, key=None):
+		"""
+		Queues an already serialized message to be sent by the writer thread, it never blocks.
+
+		Messages with a key only carry the latest state of something: if one with the same key is still waiting,
+		it's replaced. Those are also the first ones to give way when the link can't keep up: they're held aside
+		and the latest one of each key is queued again once the outbox is empty, so they still go out. Returns
+		False if the message was dropped.
+		"""
+		size = len(payload)
+
+		with self._outboxCondition:
+			if key is not None:
+				entry = self._outboxKeys.get(key)
+				if entry is not None:
+					self._outboxBytes += size - len(entry[1])
+					entry[1] = payload
+					return True
+
+				if key in self._heldStates or self._outboxBytes + size > self.MAX_QUEUED_BYTES:
+					self._heldStates[key] = payload
+					return True
+
+			elif self._outboxBytes + size > self.MAX_QUEUED_BYTES:
+				statesBytes = sum(len(e[1]) for e in self._outboxKeys.itervalues())
+				if self._outboxBytes - statesBytes + size > self.MAX_QUEUED_BYTES:
+					self._logger.warn('BoxRouter link is congested, dropping message of %d bytes' % size)
+					return False
+
+				self._holdQueuedStates()
+
+			entry = [key, payload]
+			self._outbox.append(entry)
+			self._outboxBytes += size
+			if key is not None:
+				self._outboxKeys[key] = entry
+
+			self._outboxCondition.notify()
+
+		return True
+
+	def _holdQueuedStates(self):
+		if self._outboxKeys:
+			self._logger.warn('BoxRouter link is congested, holding %d queued updates back' % len(self._outboxKeys))
+			for key, entry in self._outboxKeys.iteritems():
+				self._heldStates[key] = entry[1]
+
+			self._outbox = deque(e for e in self._outbox if e[0] is None)
+			self._outboxKeys = {}
+			self._outboxBytes = sum(len(e[1]) for e in self._outbox)
+
+	def _takeBatch(self):
+		# Payloads to write next, everything that piled up while the last write was going on goes out in one write.
+		# Must be called with the outbox condition held
+		batch = []
+		batchBytes = 0
+		while self._outbox and batchBytes < self.MAX_BATCH_BYTES:
+			key, payload = self._outbox.popleft()
+			if key is not None:
+				del self._outboxKeys[key]
+
+			batch.append(payload)
+			batchBytes += len(payload)
+
+		self._outboxBytes -= batchBytes
+
+		if not self._outbox and self._heldStates:
+			# the link caught up
+			for key, payload in self._heldStates.iteritems():
+				entry = [key, payload]
+				self._outbox.append(entry)
+				self._outboxKeys[key] = entry
+				self._outboxBytes += len(payload)
+
+			self._heldStates = {}
+
+		return batch
+
+	def _writeQueued(self):
+		while not self.terminated:
+			with self._outboxCondition:
+				while not self._outbox and not self.terminated:
+					self._outboxCondition.wait(1.0)
+
+				batch = self._takeBatch()
+
+			if batch:
+				self.send(''.join([self.stream.text_message(p).single(mask=self.stream.always_mask) for p in batch]), raw=True)
+
+		self._writerThread = None
+
+	def send(self, data, raw=False):
+		# raw is for data that's already framed
 		with self._condition:
 			if not self.terminated:
 				try:
-					super(AstroprintBoxRouterClient, self).send(data)
+					if raw:
+						self._write(data)
+					else:
+						super(AstroprintBoxRouterClient, self).send(data)
 
-				except socket.error as e:
+				except (socket.error, RuntimeError) as e:
 					self._logger.error('Error raised during send: %s' % e)
 
 					self._error = True
@@ -133,7 +238,18 @@ class AstroprintBoxRouterClient(WebSocketClient):
 		self._error = False
 		self._lineCheckThread.start()
 
+		self._writerThread = threading.Thread(target=self._writeQueued)
+		self._writerThread.daemon = True
+		self._writerThread.start()
+
 	def closed(self, code, reason=None):
+		with self._outboxCondition:
+			self._outbox.clear()
+			self._outboxKeys = {}
+			self._outboxBytes = 0
+			self._heldStates = {}
+			self._outboxCondition.notify()
+
 		if not self._closing:
 			self._closing = True
 			self._logger.info('BoxRouter socket closed event with [%d]: %s - server(%d) / client(%d)' % (code, reason, self.server_terminated, self.client_terminated))
@@ -153,7 +269,7 @@ class AstroprintBoxRouterClient(WebSocketClient):
 		if method:
 			response = method(msg)
 			if response is not None:
-				self.send(json.dumps(response))
+				self.queue(json.dumps(response))
 
 		else:
 			self._logger.warn('Unknown message type [%s] received' % msg['type'])
@@ -420,9 +536,15 @@ class AstroprintBoxRouter(object):
 		})
 
 	def send(self, data):
-		if self._ws and self.connected:
-			self._ws.send(json.dumps(data))
-			return True
+		return self.sendSerialized(json.dumps(data))
+
+	def sendSerialized(self, payload, key=None):
+		"""
+		Sends a message that's already serialized to JSON, see AstroprintBoxRouterClient.queue for the key
+		"""
+		ws = self._ws
+		if ws and self.connected:
+			return ws.queue(payload, key)
 
 		else:
 			self._logger.error('Unable to send data: Socket not active')
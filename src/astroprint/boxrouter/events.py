@@ -4,15 +4,19 @@ __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agp
 __copyright__ = "Copyright (C) 2016 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
 
 import json
+import hashlib
 import logging
 
-from copy import deepcopy
-
 class EventSender(object):
+	"""
+	Sends state updates to the cloud. Each update is serialized once: its hash tells if it changed since the last one
+	sent and the serialized message is kept to send it again with sendLastUpdate.
+	"""
+
 	def __init__(self, router):
 		self._logger = logging.getLogger(__name__)
 		self._router = router
-		self._lastSent = {
+		self._lastSent = { # event -> (hash, message) of the last update sent
 			'temp_update': None,
 			'status_update': None,
 			'printing_progress': None,
@@ -24,15 +28,28 @@ class EventSender(object):
 
 	def sendLastUpdate(self, event):
 		if event in self._lastSent:
-			self._send(event, self._lastSent[event])
+			lastSent = self._lastSent[event]
+			if lastSent:
+				self._send(event, lastSent[1])
+			else:
+				self._send(event, self._serialize(event, None))
 
 	def sendUpdate(self, event, data):
-		if self._lastSent[event] != data and self._send(event, data):
-			self._lastSent[event] = deepcopy(data) if data else None
+		message = self._serialize(event, data)
+		if message is None:
+			return
+
+		lastSent = self._lastSent[event]
+		if lastSent is None and data is None:
+			return
+
+		digest = hashlib.sha1(message).digest()
+		if (lastSent is None or lastSent[0] != digest) and self._send(event, message):
+			self._lastSent[event] = (digest, message)
 
-	def _send(self, event, data):
+	def _serialize(self, event, data):
 		try:
-			self._router.send({
+			return json.dumps({
 				'type': 'send_event',
 				'data': {
 					'eventType': event,
@@ -40,7 +57,14 @@ class EventSender(object):
 				}
 			})
 
-			return True
+		except Exception as e:
+			self._logger.error( 'Error serializing [%s] event: %s' % (event, e) )
+			return None
+
+	def _send(self, event, message):
+		try:
+			# only the latest update of each event needs to go out
+			return self._router.sendSerialized(message, event)
 
 		except Exception as e:
 			self._logger.error( 'Error sending [%s] event: %s' % (event, e) )
@@ -74,7 +74,7 @@ class BoxRouterMessageHandler(object):
 						if result is None:
 							result = {'success': True}
 
-						wsClient.send(json.dumps({
+						wsClient.queue(json.dumps({
 							'type': 'req_response',
 							'reqId': reqId,
 							'data': result
@@ -94,7 +94,7 @@ class BoxRouterMessageHandler(object):
 				response = {'error': True, 'message': message }
 
 			if response:
-				wsClient.send(json.dumps({
+				wsClient.queue(json.dumps({
 					'type': 'req_response',
 					'reqId': reqId,
 					'data': response
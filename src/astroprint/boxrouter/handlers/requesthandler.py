@@ -157,7 +157,7 @@ class RequestHandler(object):
 					'selected': False
 				}
 
-			self._wsClient.send(json.dumps({
+			self._wsClient.queue(json.dumps({
 				'type': 'send_event',
 				'data': {
 					'eventType': 'print_file_download',
@@ -0,0 +1,61 @@
+import json
+import unittest
+from mock import patch, MagicMock
+
+import octoprint.settings # loads the modules in the order the server does
+
+from astroprint.boxrouter import AstroprintBoxRouterClient
+from astroprint.boxrouter.events import EventSender
+
+class OutboxTestCase(unittest.TestCase):
+
+	def setUp(self):
+		with patch('astroprint.boxrouter.softwareManager'):
+			self.client = AstroprintBoxRouterClient('ws://localhost:1/', MagicMock())
+
+		router = MagicMock()
+		router.sendSerialized.side_effect = self.client.queue
+		self.sender = EventSender(router)
+
+	def drain(self):
+		# what the writer thread would write, in order
+		written = []
+		while True:
+			batch = self.client._takeBatch()
+			if not batch:
+				return written
+
+			written.extend(m for m in (json.loads(p) for p in batch) if isinstance(m, dict))
+
+	def fill(self, size):
+		# a message without a key of the given size
+		self.client.queue(json.dumps('x' * (size - 2)))
+
+	def statuses(self, written):
+		return [m['data']['eventData'] for m in written if m['type'] == 'send_event' and m['data']['eventType'] == 'status_update']
+
+	def test_latest_state_goes_out_after_congestion(self):
+		self.sender.sendUpdate('status_update', {'state': 'printing'})
+
+		# the outbox fills up, the queued status gives way to messages without a key
+		self.fill(AstroprintBoxRouterClient.MAX_QUEUED_BYTES - 10)
+		self.assertNotIn('status_update', self.client._outboxKeys)
+
+		# same state again, it's not sent twice by the event sender
+		self.sender.sendUpdate('status_update', {'state': 'printing'})
+
+		written = self.drain()
+		self.assertEqual([{'state': 'printing'}], self.statuses(written))
+		self.assertEqual('send_event', written[-1]['type'])
+
+	def test_state_queued_while_congested(self):
+		self.fill(AstroprintBoxRouterClient.MAX_QUEUED_BYTES - 10)
+		self.sender.sendUpdate('status_update', {'state': 'printing'})
+		self.sender.sendUpdate('status_update', {'state': 'paused'})
+
+		self.assertEqual([{'state': 'paused'}], self.statuses(self.drain()))
+
+		# nothing is held back anymore
+		self.assertEqual([], self.drain())
+		self.sender.sendUpdate('status_update', {'state': 'paused'})
+		self.assertEqual([], self.drain())
@@ -55,6 +55,7 @@ from sys import platform
 from octoprint.events import eventManager, Events
 from astroprint.cloud import astroprintCloud
 from astroprint.printer.manager import printerManager
+from astroprint.camera.uploads import TimelapseUploadQueue
 
 #
 # Thread to take timed timelapse pictures
@@ -161,6 +162,137 @@ class CameraInactivity(object):
 			if self._thread != threading.currentThread():
 				self._thread.join()
 
+#
+# Frames of the local video stream
+#
+
+class FrameBroadcaster(object):
+	"""
+	Hands the frames of the local video stream to all its clients. Each frame is published once with a sequence
+	number and clients ask for the frame after the last one they got, so a client that is slower than the camera
+	skips to the newest frame instead of taking frames away from the others.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._frame = None
+		self._sequence = 0
+		self._waiters = []
+
+	@property
+	def sequence(self):
+		return self._sequence
+
+	def publish(self, frame):
+		with self._lock:
+			self._frame = frame
+			self._sequence += 1
+			sequence = self._sequence
+			waiters = self._waiters
+			self._waiters = []
+
+		for callback in waiters:
+			callback(frame, sequence)
+
+	def nextFrame(self, sequence, callback):
+		"""
+		Calls callback(frame, sequence) with the newest frame published after sequence (None for any frame), right
+		away if there's one already or from the publishing thread when the next one arrives.
+		"""
+		with self._lock:
+			if self._frame is None or (sequence is not None and sequence >= self._sequence):
+				self._waiters.append(callback)
+				return
+
+			frame = self._frame
+			current = self._sequence
+
+		callback(frame, current)
+
+	def cancel(self, callback):
+		with self._lock:
+			try:
+				self._waiters.remove(callback)
+			except ValueError:
+				pass
+
+	def reset(self):
+		"""
+		Forgets the last frame so that new clients wait for a fresh one
+		"""
+		with self._lock:
+			self._frame = None
+
+#
+# Recent pictures
+#
+
+class SnapshotCache(object):
+	"""
+	Pictures taken in the last maxAge seconds, kept by the text they were watermarked with (None for the raw
+	ones) so that clients asking for a picture at about the same time get the same one instead of a capture each.
+	Requests that arrive while a capture for the same text is running wait for it.
+	"""
+
+	CAPTURE_TIMEOUT = 10.0 # A capture that hasn't finished by then is considered lost and a new one is started
+
+	def __init__(self, maxAge):
+		self._logger = logging.getLogger(__name__ + ':SnapshotCache')
+		self._lock = threading.Lock()
+		self._maxAge = maxAge
+		self._entries = {} # text -> (time taken, picture)
+		self._pending = {} # text -> (time started, [done callbacks])
+
+	def get(self, text, done, capture):
+		"""
+		Calls done(picture) with a recent picture for text. If there's none, capture(text, callback) is called to
+		take it unless a capture for the same text is already running.
+		"""
+		now = time.time()
+
+		with self._lock:
+			entry = self._entries.get(text)
+			if entry and now - entry[0] <= self._maxAge:
+				picture = entry[1]
+
+			else:
+				picture = None
+				pending = self._pending.get(text)
+				if pending and now - pending[0] < self.CAPTURE_TIMEOUT:
+					pending[1].append(done)
+					return
+
+				self._pending[text] = (now, [done] + (pending[1] if pending else []))
+
+		if picture:
+			done(picture)
+			return
+
+		def onCaptured(picture):
+			with self._lock:
+				pending = self._pending.pop(text, None)
+				if picture and self._maxAge > 0:
+					self._prune()
+					self._entries[text] = (time.time(), picture)
+
+			for callback in (pending[1] if pending else []):
+				try:
+					callback(picture)
+				except Exception:
+					self._logger.error('Error delivering picture', exc_info=True)
+
+		capture(text, onCaptured)
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+	def _prune(self):
+		now = time.time()
+		for text, entry in self._entries.items():
+			if now - entry[0] > self._maxAge:
+				del self._entries[text]
+
 #
 # Camera Manager base class
 #
@@ -185,6 +317,8 @@ class CameraManager(object):
 
 		self._eventManager = eventManager()
 		self._photos = {} # To hold sync photos
+		self._snapshots = SnapshotCache(s.getFloat(["camera", "snapshotMaxAge"]))
+		self._timelapseUploads = TimelapseUploadQueue(self._onTimelapsePhotoUploaded)
 		self._cameraInactivity = None
 
 		self.timelapseWorker = None
@@ -216,6 +350,7 @@ class CameraManager(object):
 	def shutdown(self):
 		self._logger.info('Shutting Down CameraManager')
 		self._photos = None
+		self._timelapseUploads.stop()
 		self.close_camera()
 		self._cameraInactivity = None
 
@@ -243,16 +378,8 @@ class CameraManager(object):
 			waitForPhoto = None
 
 		def onDone(picBuf):
-			result = False
-
-			if picBuf:
-				picData = astroprintCloud().uploadImageFile(timelapseId, picBuf)
-				#we need to check again as it's possible that this was the last
-				#pic and the timelapse is closed.
-				if picData and self.timelapseInfo:
-					self.timelapseInfo['last_photo'] = picData['url']
-					self._eventManager.fire(Events.CAPTURE_INFO_CHANGED, self.timelapseInfo)
-					result = True
+			# the upload happens in the background, the photo counts once it's queued
+			result = bool(picBuf) and self._timelapseUploads.add(timelapseId, picBuf)
 
 			if waitForPhoto and not waitForPhoto.isSet():
 				responseCont[0] = result
@@ -261,9 +388,16 @@ class CameraManager(object):
 		self.get_pic_async(onDone, text)
 
 		if waitForPhoto:
-			waitForPhoto.wait(7.0) # wait 7.0 secs for the capture of the photo and the upload, otherwise fail
+			waitForPhoto.wait(7.0) # wait 7.0 secs for the capture of the photo, otherwise fail
 			return responseCont[0]
 
+	def _onTimelapsePhotoUploaded(self, timelapseId, picData):
+		#we need to check again as it's possible that this was the last
+		#pic and the timelapse is closed.
+		if self.timelapseInfo and self.timelapseInfo['id'] == timelapseId:
+			self.timelapseInfo['last_photo'] = picData['url']
+			self._eventManager.fire(Events.CAPTURE_INFO_CHANGED, self.timelapseInfo)
+
 	def addPhotoToActiveTimelapse(self, async= True):
 		if self.timelapseInfo:
 			self.addPhotoToTimelapse(self.timelapseInfo['id'], async)
@@ -400,6 +534,7 @@ class CameraManager(object):
 
 	def settingsChanged(self, cameraSettings):
 		self._settings = cameraSettings
+		self._snapshots.clear()
 
 	# There are cases where we want the pic to be synchronous
 	# so we leave this version too
@@ -454,6 +589,8 @@ class CameraManager(object):
 		if self._cameraInactivity:
 			self._cameraInactivity.stop()
 
+		self._snapshots.clear()
+
 		if self._doCloseCamera():
 			return True
 
@@ -470,10 +607,16 @@ class CameraManager(object):
 	def stop_video_stream(self, doneCallback= None):
 		self._doStopVideoStream(doneCallback)
 
+	#
+	# Pictures taken less than camera.snapshotMaxAge secs ago for the same text are reused
+	#
 	def get_pic_async(self, done, text=None):
 		if self._cameraInactivity:
 			self._cameraInactivity.lastActivity = time.time()
 
+		self._snapshots.get(text, done, self._capturePic)
+
+	def _capturePic(self, text, done):
 		self._doGetPic(done, text)
 
 	# Implement these
@@ -3,11 +3,13 @@ import logging
 import tornado.ioloop
 import tornado.web
 import tornado.gen
-import datetime
+import tornado.concurrent
 
 from astroprint.camera import cameraManager
 
 class VideoStreamHandler(tornado.web.RequestHandler):
+	FRAME_TIMEOUT = 3.0 # secs without frames before the client is dropped
+
 	def initialize(self,access_validation):
 		self._logger = logging.getLogger(__name__)
 		self.cameraMgr = cameraManager()
@@ -22,6 +24,33 @@ class VideoStreamHandler(tornado.web.RequestHandler):
 
 		self.cameraMgr.removeLocalPeerReq(self.id)
 
+	#
+	# Future with the (frame, sequence) of the next frame after sequence, or (None, sequence) if no frame arrives
+	# in FRAME_TIMEOUT secs. Frames are handed to the IOLoop by the thread publishing them, so waiting for them
+	# doesn't block the other clients.
+	#
+	def _nextFrame(self, frames, sequence):
+		future = tornado.concurrent.Future()
+		ioLoop = tornado.ioloop.IOLoop.current()
+
+		def deliver(frame, frameSequence):
+			if not future.done():
+				ioLoop.remove_timeout(timeout)
+				future.set_result((frame, frameSequence))
+
+		def onFrame(frame, frameSequence):
+			ioLoop.add_callback(deliver, frame, frameSequence)
+
+		def onTimeout():
+			frames.cancel(onFrame)
+			if not future.done():
+				future.set_result((None, sequence))
+
+		timeout = ioLoop.call_later(self.FRAME_TIMEOUT, onTimeout)
+		frames.nextFrame(sequence, onFrame)
+
+		return future
+
 	@tornado.web.asynchronous
 	@tornado.gen.coroutine
 	def get(self):
@@ -36,24 +65,20 @@ class VideoStreamHandler(tornado.web.RequestHandler):
 
 			my_boundary = "--boundarydonotcross\n"
 
-			stillStreaming = True
-
-			self.sendNextFrame = True
-
-			while stillStreaming:
-
-				stillStreaming = self.cameraMgr.localSessionAlive(self.id)
+			frames = self.cameraMgr.localFrames
+			sequence = None
 
-				img = self.cameraMgr.getFrame(self.id)
+			while self.cameraMgr.localSessionAlive(self.id):
+				img, sequence = yield self._nextFrame(frames, sequence)
+				if img is None:
+					self.cameraMgr.onLocalFrameTimeout(self.id)
+					break
 
-				if img:
-					self.write(my_boundary)
-					self.write("Content-type: image/jpeg\r\n")
-					self.write("Content-length: %s\r\n\r\n" % len(img))
-					self.write(str(img))
-					yield tornado.gen.Task(self.flush)
-				else:
-					stillStreaming = None
+				self.write(my_boundary)
+				self.write("Content-type: image/jpeg\r\n")
+				self.write("Content-length: %s\r\n\r\n" % len(img))
+				self.write(str(img))
+				yield self.flush()
 
 			self.flush()
 			self.finish()
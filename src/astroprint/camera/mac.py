@@ -9,9 +9,8 @@ import threading
 import uuid
 import time
 
-from threading import Event
 from random import randrange
-from astroprint.camera import CameraManager
+from astroprint.camera import CameraManager, FrameBroadcaster
 
 class CameraMacManager(CameraManager):
 	name = 'mac'
@@ -23,17 +22,15 @@ class CameraMacManager(CameraManager):
 		self._files = [f for f in glob.glob(os.path.join(os.path.realpath(os.path.dirname(__file__)+'/../../../local'),"camera_test*.jpeg"))]
 		self.cameraName = 'Test Camera'
 		self._opened = False
-		self._localFrame = None
 		self._localPeers = []
-		self.waitForPhoto = Event()
+		self.localFrames = FrameBroadcaster()
 		self._logger.info('Mac Simulation Camera Manager initialized')
 
 	def shutdown(self):
 		self._logger.info('Shutting Down Mac Camera Manager')
 		self._opened = False
-		self._localFrame = None
 		self._localPeers = []
-		self.waitForPhoto = Event()
+		self.localFrames.reset()
 
 	def settingsStructure(self):
 		return {
@@ -128,19 +125,11 @@ class CameraMacManager(CameraManager):
 	def localSessionAlive(self,id):
 		return id in self._localPeers
 
-	def getFrame(self,id):
-		self.waitForPhoto.wait(2)
-		if self.waitForPhoto.isSet():
-			self.waitForPhoto.clear()
-			if id in self._localPeers:
-				return self._localFrame
-		else:#auto set after time
-			self.removeLocalPeerReq(id)
-			self.waitForPhoto.clear()
-			return None
-
-	def _responsePeersReq(self,photoData):
-		self._localFrame = photoData
+	#
+	# Called when a local video client didn't get any frame in a while
+	#
+	def onLocalFrameTimeout(self,id):
+		self.removeLocalPeerReq(id)
 
 	def _onFrameTakenCallback(self,photoData):
 
@@ -149,9 +138,7 @@ class CameraMacManager(CameraManager):
 			if not self._localPeers:
 				self.stop_local_video_stream()
 
-			self._responsePeersReq(photoData)
-
-			self.waitForPhoto.set()
+			self.localFrames.publish(photoData)
 
 	def start_local_video_stream(self):
 
@@ -180,3 +167,4 @@ class CameraMacManager(CameraManager):
 
 	def stop_local_video_stream(self):
 		self._localPeers = []
+		self.localFrames.reset()
@@ -0,0 +1,190 @@
+# coding=utf-8
+__author__ = "AstroPrint Product Team <product@astroprint.com>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016-2020 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
+
+import os
+import time
+import logging
+import threading
+
+from octoprint.settings import settings
+from octoprint.util import safeRename, silentRemove
+
+class TimelapseUploadQueue(object):
+	"""
+	Timelapse photos waiting to be uploaded to the cloud. Photos are written to the timelapseUploads folder as
+	soon as they're taken and a background thread uploads them in order, retrying with an increasing delay
+	while the cloud can't be reached, so that taking photos doesn't wait for the network and the ones taken
+	while offline are not lost (the queue survives restarts).
+
+	When the photos waiting take more than camera.timelapseUploads.maxBytes the oldest ones are dropped.
+
+	onUploaded(timelapseId, data) is called from the upload thread with the response of each upload.
+	"""
+
+	MIN_RETRY_DELAY = 2.0
+	MAX_RETRY_DELAY = 300.0
+	MAX_FAILURES = 3 # unexpected errors uploading a photo before it's dropped
+
+	def __init__(self, onUploaded):
+		self._logger = logging.getLogger(__name__)
+		self._onUploaded = onUploaded
+		self._folder = settings().getBaseFolder("timelapseUploads")
+		self._maxBytes = settings().getInt(["camera", "timelapseUploads", "maxBytes"])
+		self._condition = threading.Condition()
+		self._stopped = False
+		self._thread = None
+		self._lastName = None
+
+		# name -> size of the photos waiting, the name sorts them in the order they were taken
+		self._photos = {}
+		for f in os.listdir(self._folder):
+			if f.endswith(".jpg"):
+				self._photos[f] = os.path.getsize(os.path.join(self._folder, f))
+			elif f.endswith(".tmp"):
+				silentRemove(os.path.join(self._folder, f))
+
+		self._size = sum(self._photos.values())
+
+		if self._photos:
+			self._logger.info("%d timelapse photos left to upload" % len(self._photos))
+			self._startThread()
+
+	def __len__(self):
+		return len(self._photos)
+
+	def add(self, timelapseId, photo):
+		with self._condition:
+			name = "%015d_%s.jpg" % (int(time.time() * 1000), timelapseId)
+			if self._lastName and name <= self._lastName:
+				# more than one photo in the same millisecond (or the clock went back), keep them in order
+				name = "%015d_%s.jpg" % (int(self._lastName.split("_", 1)[0]) + 1, timelapseId)
+
+			self._lastName = name
+
+			path = os.path.join(self._folder, name)
+			try:
+				with open(path + ".tmp", "wb") as f:
+					f.write(photo)
+				safeRename(path + ".tmp", path)
+
+			except Exception:
+				self._logger.error("Unable to queue timelapse photo", exc_info=True)
+				silentRemove(path + ".tmp")
+				return False
+
+			self._photos[name] = len(photo)
+			self._size += len(photo)
+			self._dropOldest()
+
+			self._startThread()
+			self._condition.notify()
+
+			return True
+
+	def stop(self):
+		with self._condition:
+			self._stopped = True
+			self._condition.notify()
+
+	def _dropOldest(self):
+		if self._size > self._maxBytes:
+			for name in sorted(self._photos.keys()):
+				if self._size <= self._maxBytes or len(self._photos) <= 1:
+					break
+
+				self._logger.warn("Timelapse upload queue is full, dropping %s" % name)
+				self._remove(name)
+
+	def _remove(self, name):
+		size = self._photos.pop(name, None)
+		if size is not None:
+			self._size -= size
+			silentRemove(os.path.join(self._folder, name))
+
+	def _startThread(self):
+		if self._thread is None:
+			self._thread = threading.Thread(target=self._work, name="TimelapseUploads")
+			self._thread.daemon = True
+			self._thread.start()
+
+	def _work(self):
+		try:
+			self._upload()
+
+		except Exception:
+			self._logger.error("Timelapse upload thread failed", exc_info=True)
+
+		finally:
+			with self._condition:
+				self._thread = None
+
+	def _upload(self):
+		from astroprint.cloud import astroprintCloud, AstroPrintCloudNoConnectionException, AstroPrintCloudTemporaryErrorException
+
+		retryDelay = self.MIN_RETRY_DELAY
+		failures = 0
+
+		while True:
+			with self._condition:
+				while not self._photos and not self._stopped:
+					self._condition.wait()
+
+				if self._stopped:
+					return
+
+				name = min(self._photos.keys())
+
+			timelapseId = name[:-len(".jpg")].split("_", 1)[1]
+
+			try:
+				with open(os.path.join(self._folder, name), "rb") as f:
+					photo = f.read()
+
+			except IOError:
+				self._logger.error("Unable to read queued timelapse photo %s" % name, exc_info=True)
+				photo = None
+
+			data = None
+			if photo:
+				try:
+					data = astroprintCloud().uploadImageFile(timelapseId, photo)
+
+				except (AstroPrintCloudNoConnectionException, AstroPrintCloudTemporaryErrorException):
+					self._logger.info("Unable to upload timelapse photo, retrying in %.0f secs" % retryDelay)
+					retryDelay = self._backOff(retryDelay)
+					continue
+
+				except Exception:
+					failures += 1
+					if failures < self.MAX_FAILURES:
+						self._logger.error("Error uploading timelapse photo %s, retrying in %.0f secs" % (name, retryDelay), exc_info=True)
+						retryDelay = self._backOff(retryDelay)
+						continue
+
+					self._logger.error("Error uploading timelapse photo %s, dropping it" % name, exc_info=True)
+
+				else:
+					if data is None:
+						self._logger.warn("Timelapse photo %s was rejected, dropping it" % name)
+
+			retryDelay = self.MIN_RETRY_DELAY
+			failures = 0
+
+			with self._condition:
+				self._remove(name)
+
+			if data is not None:
+				try:
+					self._onUploaded(timelapseId, data)
+				except Exception:
+					self._logger.error("Error processing uploaded timelapse photo", exc_info=True)
+
+	def _backOff(self, retryDelay):
+		# waits before retrying an upload, returns the delay for the next retry
+		with self._condition:
+			if not self._stopped:
+				self._condition.wait(retryDelay)
+
+		return min(retryDelay * 2, self.MAX_RETRY_DELAY)
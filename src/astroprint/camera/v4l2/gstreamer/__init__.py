@@ -6,10 +6,11 @@ import logging
 import time
 import uuid
 
-from threading import Event, Condition, Lock
+from threading import Event, Condition
 
 from octoprint.events import eventManager, Events
 
+from astroprint.camera import FrameBroadcaster
 from astroprint.camera.v4l2 import V4L2Manager
 from astroprint.camera.v4l2.gstreamer.pipeline import AstroPrintPipeline
 from astroprint.webrtc import webRtcManager
@@ -33,9 +34,7 @@ class GStreamerManager(V4L2Manager):
 		super(GStreamerManager, self).__init__()
 
 		self._localPeers = []
-		self._localFrame = None
-		self._localPeersResponseWaiting = Lock()
-		self.waitForPhoto = Event()
+		self.localFrames = FrameBroadcaster()
 
 	@property
 	def _gstreamerProcessRunning(self):
@@ -124,20 +123,12 @@ class GStreamerManager(V4L2Manager):
 		self._logger.info('There are 0 local peers left')
 
 
-	def getFrame(self,id):
-		self.waitForPhoto.wait(3)
-		if self.waitForPhoto.isSet():
-			self.waitForPhoto.clear()
-			if id in self._localPeers:
-				return self._localFrame
-		else:#auto set after time
-			self.removeLocalPeerReq(id)
-			self.eventManager.fire(Events.LOCAL_VIDEO_STREAMING_STOPPED,None)
-			self.waitForPhoto.clear()
-			return None
-
-	def _responsePeersReq(self,photoData):
-		self._localFrame = photoData
+	#
+	# Called when a local video client didn't get any frame in a while
+	#
+	def onLocalFrameTimeout(self,id):
+		self.removeLocalPeerReq(id)
+		self.eventManager.fire(Events.LOCAL_VIDEO_STREAMING_STOPPED,None)
 
 	def _onFrameTakenCallback(self,photoData):
 
@@ -146,9 +137,7 @@ class GStreamerManager(V4L2Manager):
 			if not self._localPeers:
 				self.stop_local_video_stream()
 
-			self._responsePeersReq(photoData)
-
-			self.waitForPhoto.set()
+			self.localFrames.publish(photoData)
 
 	def start_local_video_stream(self):
 
@@ -169,6 +158,8 @@ class GStreamerManager(V4L2Manager):
 		if self._apPipeline:
 			self._apPipeline.stopLocalVideo()
 
+		self.localFrames.reset()
+
 	def localSessionAlive(self,id):
 		return id in self._localPeers
 
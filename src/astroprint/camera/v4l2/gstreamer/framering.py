@@ -0,0 +1,88 @@
+# coding=utf-8
+__author__ = "AstroPrint Product Team <product@astroprint.com>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016-2020 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
+
+import mmap
+import struct
+import threading
+
+class FrameRing(object):
+	"""
+	Shared memory used by the pipeline process to hand the JPEG frames (photos and local video) to AstroBox, so
+	that only the sequence number of each frame goes through the pipe.
+
+	It has to be created before the pipeline process is started: the process inherits the mapping. The frames are
+	written to a ring of fixed size slots, the process with write() and AstroBox with read(). A frame is lost if
+	it's overwritten before it's read, which read() detects. Frames that don't fit in a slot are not written.
+
+	Layout: the last sequence number written followed by the slots, each one a header (sequence, length) and the
+	frame. The sequence number is kept in the shared memory so that it keeps growing when the process is restarted.
+	"""
+
+	HEADER = struct.Struct("<Q") # last sequence number written
+	SLOT_HEADER = struct.Struct("<QI") # sequence number of the frame in the slot (0 while it's written), length
+
+	def __init__(self, slots, slotSize):
+		self.slots = slots
+		self.slotSize = slotSize
+		self._slotStride = self.SLOT_HEADER.size + slotSize
+		self._map = mmap.mmap(-1, self.HEADER.size + slots * self._slotStride)
+		self._writeLock = threading.Lock()
+
+	def close(self):
+		with self._writeLock:
+			if self._map is not None:
+				self._map.close()
+				self._map = None
+
+	def write(self, frame):
+		"""
+		Stores the frame and returns its sequence number, or None if it doesn't fit in a slot or the ring is closed
+		"""
+		length = len(frame)
+		if length > self.slotSize:
+			return None
+
+		with self._writeLock:
+			if self._map is None:
+				return None
+
+			sequence = self.HEADER.unpack_from(self._map, 0)[0] + 1
+			offset = self._slotOffset(sequence)
+
+			self.SLOT_HEADER.pack_into(self._map, offset, 0, 0)
+			start = offset + self.SLOT_HEADER.size
+			self._map[start:start + length] = frame
+			self.SLOT_HEADER.pack_into(self._map, offset, sequence, length)
+
+			self.HEADER.pack_into(self._map, 0, sequence)
+
+		return sequence
+
+	def read(self, sequence):
+		"""
+		Returns a copy of the frame with the given sequence number, or None if it has been overwritten or the ring
+		is closed
+		"""
+		m = self._map
+		if m is None:
+			return None
+
+		offset = self._slotOffset(sequence)
+
+		slotSequence, length = self.SLOT_HEADER.unpack_from(m, offset)
+		if slotSequence != sequence:
+			return None
+
+		start = offset + self.SLOT_HEADER.size
+		frame = m[start:start + length]
+
+		# the process could have started writing another frame in the slot while it was copied
+		if self.SLOT_HEADER.unpack_from(m, offset)[0] != sequence:
+			return None
+
+		return frame
+
+	def _slotOffset(self, sequence):
+		return self.HEADER.size + (sequence % self.slots) * self._slotStride
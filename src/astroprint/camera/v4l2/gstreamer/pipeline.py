@@ -19,6 +19,7 @@ from octoprint.events import eventManager, Events
 from octoprint.settings import settings
 
 from .process import startPipelineProcess
+from .framering import FrameRing
 
 class AstroPrintPipeline(object):
 	def __init__(self, device, size, rotation, source, encoding, onFatalError):
@@ -32,6 +33,7 @@ class AstroPrintPipeline(object):
 		self._source = source.lower()
 		self._encoding = encoding.lower()
 		self._size = tuple([int(x) for x in size.split('x')])
+		self._frameRing = FrameRing(settings().getInt(['camera', 'sharedFrames', 'slots']), settings().getInt(['camera', 'sharedFrames', 'slotSize']))
 		self._sendCondition = Condition()
 		self._onFatalError = onFatalError
 		self._responseListener = ProcessResponseListener(self._parentConn, self._onProcessResponse)
@@ -76,7 +78,8 @@ class AstroPrintPipeline(object):
 				onListeningEvent,
 				errorState,
 				( self._parentConn, self._processConn ),
-				settings().getInt(['camera', 'debug-level'])
+				settings().getInt(['camera', 'debug-level']),
+				self._frameRing
 			)
 		)
 		self._process.daemon = True
@@ -127,23 +130,16 @@ class AstroPrintPipeline(object):
 			self._responseListener.join()
 
 		self._responseListener = None
+		self._frameRing.close()
 
 	def startLocalVideo(self, onFrameTakenCallback):
 
 		def postprocesingLocalVideoFrame(resp):
-			if resp:
-				if isinstance(resp, dict) and 'error' in resp:
-					self._logger.error('Error during local video\'s frames capture: %s' % resp['error'])
-					onFrameTakenCallback(None)
-				else:
-					from base64 import b64decode
-					try:
-						onFrameTakenCallback(b64decode(resp))
-					except TypeError as e:
-						self._logger.error('Invalid returned local video\'s frame. Received. Error: %s' % e)
-						onFrameTakenCallback(None)
-			else:
+			if isinstance(resp, dict) and 'error' in resp:
+				self._logger.error('Error during local video\'s frames capture: %s' % resp['error'])
 				onFrameTakenCallback(None)
+			else:
+				onFrameTakenCallback(self._frameFromResponse(resp))
 
 		self._sendPreservativeReq({'action': 'startLocalVideo'}, postprocesingLocalVideoFrame)
 
@@ -167,26 +163,28 @@ class AstroPrintPipeline(object):
 
 	def takePhoto(self, doneCallback, text=None):
 		def postprocesing(resp):
-			if resp:
-				if isinstance(resp, dict) and 'error' in resp:
-					self._logger.error('Error during photo capture: %s' % resp['error'])
-					doneCallback(None)
-				else:
-					from base64 import b64decode
-					try:
-						doneCallback(b64decode(resp))
-					except TypeError as e:
-						self._logger.error('Invalid returned photo. Received. Error: %s' % e)
-						doneCallback(None)
-
-			else:
+			if isinstance(resp, dict) and 'error' in resp:
+				self._logger.error('Error during photo capture: %s' % resp['error'])
 				doneCallback(None)
+			else:
+				doneCallback(self._frameFromResponse(resp))
 
 		if text is not None:
 			self._sendReqToProcess({'action': 'takePhoto', 'data': {'text': text}}, postprocesing)
 		else:
 			self._sendReqToProcess({'action': 'takePhoto', 'data': None}, postprocesing)
 
+	def _frameFromResponse(self, resp):
+		# Frames come in the frame ring, only the ones that didn't fit in it come through the pipe
+		if isinstance(resp, dict) and 'frame' in resp:
+			frame = self._frameRing.read(resp['frame'])
+			if frame is None:
+				self._logger.warn('Frame %d was overwritten before it could be read' % resp['frame'])
+
+			return frame
+
+		return resp or None
+
 	def _onProcessResponse(self, id, data):
 		if id is 0: # this is a broadcast, likely an error. Inform all pending requests
 			self._logger.warn('Broadcasting error to ALL pending requests [ %s ]' % repr(data))
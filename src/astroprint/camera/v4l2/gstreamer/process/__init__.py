@@ -9,7 +9,7 @@ from threading import Thread, Event, Condition
 
 from .pipelines import pipelineFactory, InvalidGStreamerPipelineException
 
-def startPipelineProcess(device, size, rotation, source, encoding, onListeningEvent, errorState, procPipe, debugLevel=0):
+def startPipelineProcess(device, size, rotation, source, encoding, onListeningEvent, errorState, procPipe, debugLevel=0, frameRing=None):
 	from gi.repository import GObject
 
 	GObject.threads_init()
@@ -32,7 +32,7 @@ def startPipelineProcess(device, size, rotation, source, encoding, onListeningEv
 		logger.error(e)
 		raise SystemExit(-1)
 
-	interface = processInterface(pipeline, procPipe, mainLoop, onListeningEvent)
+	interface = processInterface(pipeline, procPipe, mainLoop, onListeningEvent, frameRing)
 
 	try:
 		interface.start()
@@ -63,8 +63,9 @@ class processInterface(Thread):
 	RESPONSE_EXIT = -1000
 	RESPONSE_ASYNC = -1001
 
-	def __init__(self, pipeline, procPipe, mainLoop, onListeningEvent):
+	def __init__(self, pipeline, procPipe, mainLoop, onListeningEvent, frameRing=None):
 		self._pipeline = pipeline
+		self._frameRing = frameRing
 		self._parentConn, self._processConn = procPipe
 		self._sendCondition = Condition()
 		self._onListeningEvent = onListeningEvent
@@ -143,7 +144,7 @@ class processInterface(Thread):
 			if not photo:
 				self.sendResponse(reqId, None)
 			else:
-				self.sendResponse(reqId, photo, raw= True, b64encode= True)
+				self.sendFrame(reqId, photo)
 
 		self._pipeline.playLocalVideo(reqId,doneCb)
 
@@ -190,7 +191,7 @@ class processInterface(Thread):
 			if not photo:
 				self.sendResponse(reqId, None)
 			else:
-				self.sendResponse(reqId, photo, raw= True, b64encode= True)
+				self.sendFrame(reqId, photo)
 
 		self._pipeline.takePhoto(doneCb, text)
 
@@ -217,5 +218,14 @@ class processInterface(Thread):
 
 				self._logger.debug('Sent: [ %s ]' % repr(dataStr) )
 
+	def sendFrame(self, reqId, frame):
+		sequence = self._frameRing.write(frame) if self._frameRing else None
+
+		if sequence is None:
+			# it doesn't fit in the frame ring
+			self.sendResponse(reqId, frame, raw= True)
+		else:
+			self.sendResponse(reqId, {'frame': sequence})
+
 	def stop(self):
 		self._stopped = True
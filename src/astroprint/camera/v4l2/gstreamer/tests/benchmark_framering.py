@@ -0,0 +1,111 @@
+# coding=utf-8
+__author__ = "AstroPrint Product Team <product@astroprint.com>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016-2020 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
+
+# Frames per second and CPU time (both processes) of handing local video frames from a forked process to AstroBox,
+# the way the pipeline process does:
+#
+#   - pipe + base64: the frame base64 encoded through the multiprocessing pipe, as it was before the frame ring.
+#   - pipe: the frame as it is through the pipe, what frames too big for a slot of the ring still do.
+#   - frame ring: the frame written to a FrameRing, only its sequence number through the pipe.
+#
+# The frames are random data of the size of a 720p JPEG (200KB by default). With fps 0 they're sent as fast as
+# possible, otherwise at that rate, like a camera, and the CPU usage is the one of streaming local video.
+#
+# Run from the src folder:
+#
+#   PYTHONPATH=. python astroprint/camera/v4l2/gstreamer/tests/benchmark_framering.py [frames] [frame KB] [fps]
+
+import os
+import sys
+import time
+import resource
+
+from base64 import b64encode, b64decode
+from multiprocessing import Process, Pipe
+
+import octoprint.settings # loads the modules in the order the server does
+
+from astroprint.camera.v4l2.gstreamer.framering import FrameRing
+
+SLOTS = 4
+SLOT_SIZE = 1024 * 1024
+
+def produce(conn, ring, mode, frames, frameSize, fps):
+	frame = os.urandom(frameSize)
+	start = time.time()
+
+	for i in xrange(frames):
+		if fps:
+			delay = start + float(i) / fps - time.time()
+			if delay > 0:
+				time.sleep(delay)
+
+		if mode == 'pipe + base64':
+			conn.send((1, b64encode(frame)))
+		elif mode == 'pipe':
+			conn.send((1, frame))
+		else:
+			conn.send((1, {'frame': ring.write(frame)}))
+
+		# wait for the frames to be read before the ring is lapped, like a camera that's slower than the reader
+		if i % SLOTS == SLOTS - 1:
+			conn.recv()
+
+	conn.send(None)
+
+def cpuTime():
+	usage = resource.getrusage(resource.RUSAGE_SELF)
+	children = resource.getrusage(resource.RUSAGE_CHILDREN)
+	return usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime
+
+def measure(mode, frames, frameSize, fps):
+	parentConn, processConn = Pipe(True)
+	ring = FrameRing(SLOTS, SLOT_SIZE)
+
+	try:
+		startCpu = cpuTime()
+		start = time.time()
+
+		process = Process(target=produce, args=(processConn, ring, mode, frames, frameSize, fps))
+		process.start()
+
+		received = 0
+		lost = 0
+		while True:
+			response = parentConn.recv()
+			if response is None:
+				break
+
+			reqId, resp = response
+			if mode == 'pipe + base64':
+				frame = b64decode(resp)
+			elif mode == 'pipe':
+				frame = resp
+			else:
+				frame = ring.read(resp['frame'])
+
+			if frame is None:
+				lost += 1
+
+			received += 1
+			if received % SLOTS == 0:
+				parentConn.send(True)
+
+		process.join()
+		elapsed = time.time() - start
+		cpu = cpuTime() - startCpu
+
+		return received / elapsed, cpu * 1000.0 / received, cpu * 100.0 / elapsed, lost
+
+	finally:
+		ring.close()
+
+def main(frames=2000, frameKB=200, fps=0):
+	for mode in ('pipe + base64', 'pipe', 'frame ring'):
+		framesPerSecond, cpuPerFrame, cpuPercent, lost = measure(mode, frames, frameKB * 1024, fps)
+		print "%-14s %7.0f fps %6.2f ms CPU/frame %5.1f%% CPU %d lost" % (mode, framesPerSecond, cpuPerFrame, cpuPercent, lost)
+
+if __name__ == "__main__":
+	main(*[int(arg) for arg in sys.argv[1:4]])
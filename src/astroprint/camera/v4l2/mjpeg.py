@@ -201,10 +201,17 @@ class MJPEGStreamer(object):
 
 		self._watermarkShape = watermark.shape
 
-		watermarkMask = cv2.cvtColor(watermark, cv2.COLOR_BGR2GRAY) / 255.0
-		watermarkMask = np.repeat( watermarkMask, 3).reshape( (self._watermarkShape[0],self._watermarkShape[1],3) )
-		self._watermakMaskWeighted = watermarkMask * watermark
-		self._watermarkInverted = 1.0 - watermarkMask
+		# The logo is blended with integer lookups instead of float math on every photo:
+		#
+		#   pixel = _imageBlend[alpha * 256 + pixel] + _watermarkBlended
+		#
+		# where alpha is the gray level of the logo. The image term is rounded and the logo term truncated so
+		# their sum never goes over 255. The table is flat, take() on it is faster than indexing it by row and column
+		watermarkAlpha = np.repeat( cv2.cvtColor(watermark, cv2.COLOR_BGR2GRAY), 3).reshape( self._watermarkShape )
+		levels = np.arange(256, dtype=np.uint32)
+		self._imageBlend = ((levels[np.newaxis, :] * (255 - levels[:, np.newaxis]) + 127) // 255).astype(np.uint8).ravel()
+		self._watermarkAlpha = watermarkAlpha.astype(np.intp) * 256
+		self._watermarkBlended = (watermarkAlpha.astype(np.uint16) * watermark // 255).astype(np.uint8)
 
 	def startStreamer(self):
 		if not self._process:
@@ -288,16 +295,17 @@ class MJPEGStreamer(object):
 			self._logger.error(e)
 
 		if image and text:
-			decodedImage = cv2.imdecode(np.fromstring(image, np.uint8), cv2.CV_LOAD_IMAGE_COLOR)
-			self._apply_watermark(decodedImage, text)
-			image = cv2.cv.EncodeImage('.jpeg', cv2.cv.fromarray(decodedImage), [cv2.cv.CV_IMWRITE_JPEG_QUALITY, 80]).tostring()
+			decodedImage = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.CV_LOAD_IMAGE_COLOR)
+			if self._apply_watermark(decodedImage, text):
+				encoded, buf = cv2.imencode('.jpeg', decodedImage, [cv2.cv.CV_IMWRITE_JPEG_QUALITY, 80])
+				if encoded:
+					image = buf.tostring()
 
 		doneCb(image)
 
 	def _apply_watermark(self, img, text):
-		if text and img != None:
-			imgPortion = img[-(self._watermarkShape[0]+5):-5, -(self._watermarkShape[1]+5):-5]
-			img[-(self._watermarkShape[0]+5):-5, -(self._watermarkShape[1]+5):-5] = (self._watermarkInverted * imgPortion) + self._watermakMaskWeighted
+		if text and img is not None:
+			self._blendWatermark(img)
 
 			img[:self._infoAreaShape[0], :self._infoAreaShape[1]] = self._infoArea
 			cv2.putText(img, text, (30,17), cv2.FONT_HERSHEY_PLAIN, 1.0, (81,82,241), thickness=1)
@@ -306,3 +314,7 @@ class MJPEGStreamer(object):
 
 		return False
 
+	def _blendWatermark(self, img):
+		imgPortion = img[-(self._watermarkShape[0]+5):-5, -(self._watermarkShape[1]+5):-5]
+		np.add(self._imageBlend.take(self._watermarkAlpha + imgPortion), self._watermarkBlended, out=imgPortion)
+
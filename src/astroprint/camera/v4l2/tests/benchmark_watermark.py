@@ -0,0 +1,88 @@
+# coding=utf-8
+__author__ = "AstroPrint Product Team <product@astroprint.com>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016-2020 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
+
+# Time that watermarking a photo of the MJPEG streamer takes at 720p and 1080p: blending the logo with float math,
+# the way it was done before, and with the lookup tables of MJPEGStreamer. The whole photo (decode, watermark and
+# encode) is timed with each blend too, and the largest difference between both blends is shown.
+#
+# It needs numpy and OpenCV, like the streamer. Run from the src folder:
+#
+#   PYTHONPATH=. python astroprint/camera/v4l2/tests/benchmark_watermark.py [photos]
+
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from octoprint.server import app
+
+from astroprint.camera.v4l2.mjpeg import MJPEGStreamer
+
+class FloatBlend(object):
+	# the blend as it was before the lookup tables
+	def __init__(self):
+		watermark = cv2.imread(os.path.join(app.static_folder, 'img', 'astroprint_logo.png'))
+		watermark = cv2.resize( watermark, ( 100, 100 * watermark.shape[0]/watermark.shape[1] ) )
+
+		self._watermarkShape = watermark.shape
+
+		watermarkMask = cv2.cvtColor(watermark, cv2.COLOR_BGR2GRAY) / 255.0
+		watermarkMask = np.repeat( watermarkMask, 3).reshape( (self._watermarkShape[0],self._watermarkShape[1],3) )
+		self._watermakMaskWeighted = watermarkMask * watermark
+		self._watermarkInverted = 1.0 - watermarkMask
+
+	def __call__(self, img):
+		imgPortion = img[-(self._watermarkShape[0]+5):-5, -(self._watermarkShape[1]+5):-5]
+		img[-(self._watermarkShape[0]+5):-5, -(self._watermarkShape[1]+5):-5] = (self._watermarkInverted * imgPortion) + self._watermakMaskWeighted
+
+def photo(width, height):
+	# a JPEG like the ones of a camera: smooth areas with some noise
+	x = np.linspace(0, 255, width)[np.newaxis, :, np.newaxis]
+	y = np.linspace(0, 255, height)[:, np.newaxis, np.newaxis]
+	img = (x * 0.6 + y * 0.4) * np.array([1.0, 0.8, 0.6]) + np.random.RandomState(1).normal(0, 8, (height, width, 3))
+	img = np.clip(img, 0, 255).astype(np.uint8)
+
+	encoded, buf = cv2.imencode('.jpeg', img, [cv2.cv.CV_IMWRITE_JPEG_QUALITY, 80])
+	return buf.tostring()
+
+def timeBlend(blend, image, photos):
+	decodedImage = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.CV_LOAD_IMAGE_COLOR)
+	images = [decodedImage.copy() for i in xrange(photos)]
+
+	start = time.time()
+	for img in images:
+		blend(img)
+
+	return (time.time() - start) * 1000.0 / photos, images[0]
+
+def timePhoto(blend, streamer, image, photos):
+	start = time.time()
+	for i in xrange(photos):
+		decodedImage = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.CV_LOAD_IMAGE_COLOR)
+		blend(decodedImage)
+		decodedImage[:streamer._infoAreaShape[0], :streamer._infoAreaShape[1]] = streamer._infoArea
+		cv2.putText(decodedImage, "Benchmark", (30,17), cv2.FONT_HERSHEY_PLAIN, 1.0, (81,82,241), thickness=1)
+		cv2.imencode('.jpeg', decodedImage, [cv2.cv.CV_IMWRITE_JPEG_QUALITY, 80])
+
+	return (time.time() - start) * 1000.0 / photos
+
+def main(photos=200):
+	for width, height in ((1280, 720), (1920, 1080)):
+		streamer = MJPEGStreamer(0, '%dx%d' % (width, height), 30, 'mjpeg')
+		blends = (("float", FloatBlend()), ("lookup", streamer._blendWatermark))
+		image = photo(width, height)
+
+		results = {}
+		for name, blend in blends:
+			blendTime, results[name] = timeBlend(blend, image, photos)
+			photoTime = timePhoto(blend, streamer, image, photos)
+			print "%dp %-7s blend %6.3f ms, whole photo %6.1f ms" % (height, name, blendTime, photoTime)
+
+		print "%dp largest difference: %d levels" % (height, np.abs(results["float"].astype(np.int16) - results["lookup"]).max())
+
+if __name__ == "__main__":
+	main(*[int(arg) for arg in sys.argv[1:2]])
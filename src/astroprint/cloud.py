@@ -99,6 +99,7 @@ class AstroPrintCloud(object):
 
 		self.apiHost = roConfig('cloud.apiHost')
 		self._print_file_store = None
+		self._uploadSession = None
 		self._sm = softwareManager()
 		self._logger = logging.getLogger(__name__)
 
@@ -753,23 +754,37 @@ class AstroPrintCloud(object):
 			except requests.exceptions.RequestException as e:
 				self._logger.error(e)
 
+	#
+	# Uploads a timelapse photo. Returns the data of the uploaded image or None if it was rejected.
+	# Raises AstroPrintCloudNoConnectionException or AstroPrintCloudTemporaryErrorException if it
+	# should be retried later.
+	#
+	# Uploads go through their own session so that the connection is kept open between photos
+	#
 	def uploadImageFile(self, print_id, imageBuf):
+		if self._uploadSession is None:
+			self._uploadSession = requests.Session()
+
 		try:
 			m = MultipartEncoder(fields=[('file',('snapshot.jpg', imageBuf))])
-			r = requests.post(
+			r = self._uploadSession.post(
 				"%s/prints/%s/image" % (self.apiHost, print_id),
 				data= m,
 				headers= {'Content-Type': m.content_type},
-				auth= self.hmacAuth
+				auth= self.hmacAuth,
+				timeout= 30
 			)
 			m = None #Free the memory?
-			status_code = r.status_code
-		except:
-			status_code = 500
 
-		if status_code == 201:
-			data = r.json()
-			return data
+		except requests.exceptions.RequestException as e:
+			self._logger.debug('Unable to upload image: %s' % e)
+			raise AstroPrintCloudNoConnectionException()
+
+		if r.status_code == 201:
+			return r.json()
+
+		elif r.status_code >= 500 or r.status_code == 429:
+			raise AstroPrintCloudTemporaryErrorException(r.status_code)
 
 		else:
 			return None
@@ -3,8 +3,24 @@ __license__ = "GNU Affero General Public License http://www.gnu.org/licenses/agp
 __copyright__ = "Copyright (C) 2018 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
 
 import os
+import re
+import time
+import mmap
+import errno
+import ctypes
+import ctypes.util
+import threading
 
 from glob import glob
+from collections import OrderedDict
+
+try:
+	from os import scandir
+except ImportError:
+	try:
+		from scandir import scandir
+	except ImportError:
+		scandir = None
 
 from werkzeug.utils import secure_filename
 
@@ -13,15 +29,124 @@ from octoprint.settings import settings
 
 
 from astroprint.printer.manager import printerManager
+from astroprint.printfiles.analysiscache import contentHasher
+
+try:
+	_libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+	_sendfile = _libc.sendfile
+	_sendfile.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p, ctypes.c_size_t]
+	_sendfile.restype = ctypes.c_ssize_t
+
+except (OSError, AttributeError, TypeError):
+	_sendfile = None
+
+_globMagic = re.compile('[*?[]')
+
+COPY_STEP = 8 * 1048576 # 8MiB
+
+def copyFileData(src, dst, total, contentHash):
+	"""
+	Copies total bytes from the src file object into dst, feeding them to contentHash. Yields the number of
+	bytes copied so far after each step.
+
+	The copy is done by the kernel with sendfile() when possible. The hash is then computed from a memory map
+	of the source, which reads the data that sendfile() just brought into the page cache, so the drive is only
+	read once. Otherwise the data is read and written in blocks.
+	"""
+	copied = 0
+
+	if _sendfile is not None and total > 0:
+		srcMap = mmap.mmap(src.fileno(), total, access=mmap.ACCESS_READ)
+		try:
+			dst.flush()
+			srcFd = src.fileno()
+			dstFd = dst.fileno()
+
+			while copied < total:
+				sent = _sendfile(dstFd, srcFd, None, min(COPY_STEP, total - copied))
+				if sent < 0:
+					err = ctypes.get_errno()
+					if copied == 0 and err in (errno.EINVAL, errno.ENOSYS):
+						break # not supported for these files, copy them by hand
+
+					raise OSError(err, os.strerror(err))
+
+				elif sent == 0:
+					raise IOError("%s ended before expected" % src.name)
+
+				contentHash.update(buffer(srcMap, copied, sent))
+				copied += sent
+				yield copied
+
+		finally:
+			srcMap.close()
+
+	blksize = 1048576 # 1MiB
+	while copied < total:
+		buf = src.read(blksize)
+		if not buf:
+			raise IOError("%s ended before expected" % src.name)
+
+		dst.write(buf)
+		contentHash.update(buf)
+		copied += len(buf)
+		yield copied
+
+class DirectoryListings(object):
+	"""
+	Contents of the last directories browsed in the external drives, as returned by getDirContents. A listing
+	is built again when the modification time of its directory changes or when invalidate() is called for it
+	(drives mounted or removed).
+	"""
+
+	MAX_LISTINGS = 32
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._listings = OrderedDict() # (path, icon, extensions) -> (mtime, contents), least recently used first
+
+	def get(self, path, icon, extensions, build):
+		mtime = os.stat(path).st_mtime
+		key = (path, icon, tuple(extensions))
+
+		with self._lock:
+			listing = self._listings.pop(key, None)
+			if listing and listing[0] == mtime:
+				self._listings[key] = listing
+				return listing[1]
+
+		contents = build(path, icon, extensions)
+
+		with self._lock:
+			self._listings[key] = (mtime, contents)
+			while len(self._listings) > self.MAX_LISTINGS:
+				self._listings.popitem(last=False)
+
+		return contents
+
+	def invalidate(self, pathPrefix=None):
+		with self._lock:
+			for key in self._listings.keys():
+				if pathPrefix is None or key[0].startswith(pathPrefix):
+					del self._listings[key]
 
 class ExternalDriveBase(object):
 	def __init__(self):
 		self._eventManager = eventManager()
+		self._dirListings = DirectoryListings()
 
 	def getDirContents(self, globPattern, icon='folder', extensions=None):
 		if extensions is None:
 			extensions = self.getFileBrowsingExtensions()
 
+		if globPattern.endswith('/*') and not _globMagic.search(globPattern[:-2]):
+			# the contents of a directory, those are cached
+			path = globPattern[:-2] or '/'
+			if not os.path.isdir(path):
+				return []
+
+			return self._dirListings.get(path, icon, extensions, self._listDir)
+
 		files = []
 		folders = []
 
@@ -44,6 +169,43 @@ class ExternalDriveBase(object):
 
 		return sorted(folders, key=lambda f: f['name'].lower()) + sorted(files, key=lambda f: f['name'].lower())
 
+	def _listDir(self, path, icon, extensions):
+		files = []
+		folders = []
+
+		if scandir:
+			entries = ((e.name, e.path, e.is_dir, e.stat) for e in scandir(path))
+		else:
+			entries = ((n, os.path.join(path, n), None, None) for n in os.listdir(path))
+
+		for name, item, isDir, stat in entries:
+			if name.startswith('.'):
+				continue # glob doesn't return hidden files either
+
+			if isDir() if isDir else os.path.isdir(item):
+				folders.append({
+					'name': item,
+					'icon': icon})
+
+			else:
+				f, ext = os.path.splitext(name)
+				ext = ext[1:]
+
+				if ext in extensions:
+					files.append({
+						"name": item,
+						"size": (stat() if stat else os.stat(item)).st_size,
+						"icon": ext
+					})
+
+		return sorted(folders, key=lambda f: f['name'].lower()) + sorted(files, key=lambda f: f['name'].lower())
+
+	#
+	# Forget the directory listings of a drive, or all of them if mountPath is None
+	#
+	def invalidateDirContents(self, mountPath=None):
+		self._dirListings.invalidate(mountPath)
+
 	def getFolderContents(self, folder):
 		try:
 			return self.getDirContents(self._cleanFileLocation(folder))
@@ -68,8 +230,9 @@ class ExternalDriveBase(object):
 		s.close()
 		return True
 
+	PROGRESS_INTERVAL = 0.5 # secs between progress reports while copying
+
 	def copy(self, src, dst, progressCb, observerId):
-		blksize = 1048576 # 1MiB
 		s = None
 		d = None
 
@@ -77,18 +240,17 @@ class ExternalDriveBase(object):
 			s = open(src, 'rb')
 			d = open(dst, 'wb')
 
-			sizeWritten = 0.0
-			total = float( os.stat(src).st_size )
-
-			while sizeWritten < total:
-				buf = s.read(blksize)
-				d.write(buf)
-
-				sizeWritten += len(buf)
+			total = os.fstat(s.fileno()).st_size
+			contentHash = contentHasher()
+			lastReport = time.time()
 
-				progressCb((sizeWritten / total)*100, dst, observerId)
+			for sizeWritten in copyFileData(s, d, total, contentHash):
+				now = time.time()
+				if now - lastReport >= self.PROGRESS_INTERVAL:
+					progressCb((float(sizeWritten) / total)*100, dst, observerId)
+					lastReport = now
 
-			printerManager().fileManager._metadataAnalyzer.addFileToQueue(dst)
+			printerManager().fileManager._metadataAnalyzer.addFileToQueue(dst, contentHash.hexdigest())
 			progressCb(100.0,dst,observerId)
 
 		except (KeyboardInterrupt, Exception) as e:
@@ -82,6 +82,9 @@ class ExternalDriveManager(ExternalDriveBase):
 					devName = device.device_node
 					self._logger.info('%s pluged in' % devName)
 					mountPath = self._getDeviceMountDirectory(device)
+					if mountPath:
+						self.invalidateDirContents(mountPath)
+
 					if self._mountPartition(devName, mountPath):
 						self._eventManager.fire( Events.EXTERNAL_DRIVE_MOUNTED, {
 							"mount_path": mountPath,
@@ -92,6 +95,9 @@ class ExternalDriveManager(ExternalDriveBase):
 					devName = device.device_node
 					mountPath = self._getDeviceMountDirectory(device)
 					self._logger.info('%s removed' % devName)
+					if mountPath:
+						self.invalidateDirContents(mountPath)
+
 					if self._umountPartition(self._getDeviceMountDirectory(device)):
 						self._eventManager.fire( Events.EXTERNAL_DRIVE_PHISICALLY_REMOVED, {
 							"device_node": devName,
@@ -205,6 +211,8 @@ class ExternalDriveManager(ExternalDriveBase):
 			else:
 				time.sleep(timeout)
 
+		self.invalidateDirContents(mountPath)
+
 		if ejected:
 			self._eventManager.fire( Events.EXTERNAL_DRIVE_EJECTED, {
 				"mount_path": mountPath
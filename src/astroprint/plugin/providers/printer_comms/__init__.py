@@ -397,12 +397,8 @@ class PrinterCommsService(CommandPluginInterface):
 		self._printerManager._state = newState
 		self._logger.info('Changing printer state from [%s] to [%s]' % (oldState, self.printerState))
 
-		# forward relevant state changes to gcode manager
-		if self.connected and oldState == PrinterState.STATE_PRINTING:
-			self._printerManager.fileManager.resumeAnalysis() # printing done, put those cpu cycles to good use
-		elif self.connected and newState == PrinterState.STATE_PRINTING:
-			self._printerManager.fileManager.pauseAnalysis() # do not analyze gcode while printing
-		elif self.connected and newState in [PrinterState.STATE_OPERATIONAL, PrinterState.STATE_NOT_READY_TO_PRINT]:
+		# the end of a print is not a connection
+		if self.connected and oldState != PrinterState.STATE_PRINTING and newState in [PrinterState.STATE_OPERATIONAL, PrinterState.STATE_NOT_READY_TO_PRINT]:
 			eventManager().fire(SystemEvent.CONNECTED)
 		elif newState == PrinterState.STATE_CONNECTING:
 			eventManager().fire(SystemEvent.CONNECTING)
@@ -8,6 +8,7 @@ import threading
 import os
 import time
 import json
+import mmap
 
 from sys import platform
 
@@ -560,9 +561,12 @@ class CommandsComms(TransportEvents):
 	#
 	# - count: Number of commands to read
 	#
+	# The transport can ask to keep more commands than that in the queue (readAhead) so that the link doesn't
+	# go idle while the next ones are read
+	#
 	def readCommandsFromFile(self, count):
 		if self._printJob:
-			self._printJob.read(count)
+			self._printJob.read(max(count, self._transport.readAhead - self.commandsInQueue))
 
 	#
 	# Stops current print
@@ -638,8 +642,48 @@ class CommandsComms(TransportEvents):
 
 #~~~~~~ Worker to read commands from file
 
+class FileLineReader(object):
+	"""
+	Reads the lines of a print file from a memory map of it, several at a time, instead of a readline() call for
+	each one. The lines keep their line ending like the ones returned by readline().
+	"""
+
+	def __init__(self, filename):
+		self._file = open(filename, 'rb')
+		self.size = os.fstat(self._file.fileno()).st_size
+		self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+		self.pos = 0
+
+	def readLines(self, count):
+		"""
+		Returns a list with up to count lines, empty at the end of the file
+		"""
+		lines = []
+		if self._map is None:
+			return lines
+
+		m = self._map
+		pos = self.pos
+		size = self.size
+		while count > 0 and pos < size:
+			end = m.find('\n', pos) + 1 or size
+			lines.append(m[pos:end])
+			pos = end
+			count -= 1
+
+		self.pos = pos
+		return lines
+
+	def close(self):
+		if self._map is not None:
+			self._map.close()
+			self._map = None
+
+		self._file.close()
+
 class JobWorker(threading.Thread):
 	_reportProgressInterval = 1.0
+	_maxLinesPerBatch = 64
 
 	def __init__(self, filename, comm, eventListener): #eventListener is object of interface CommsListener
 		super(JobWorker, self).__init__()
@@ -648,56 +692,72 @@ class JobWorker(threading.Thread):
 		self._comm = comm
 		self._eventListener = eventListener
 		self._stopped = False
-		self._fileHandler = None
+		self._reader = None
 		self._fileSize = None
 		self._readEvent = threading.Event()
 		self._lastReport = None
 
 	def run(self):
-		while not self._stopped:
-			if ( time.time() - self._lastReport ) >= self._reportProgressInterval:
-				filePos = self.filePos
-				percent = filePos / self._fileSize
-				self._eventListener.onPrintJobProgress( percent, filePos )
-				self._lastReport = time.time()
-
-			self._readEvent.wait()
-			addedCommands = 0
+		try:
 			while not self._stopped:
-				line = self._fileHandler.readline()
-				if line == '':
-					# end of file reached
-					self.stop()
-					self._comm.onEndOfFle()
+				if ( time.time() - self._lastReport ) >= self._reportProgressInterval:
+					filePos = self.filePos
+					percent = filePos / self._fileSize if self._fileSize else 1.0
+					self._eventListener.onPrintJobProgress( percent, filePos )
+					self._lastReport = time.time()
+
+				self._readEvent.wait()
+				addedCommands = 0
+				while not self._stopped:
+					# Never read more lines than commands are still needed: each line makes at least one command or none
+					remaining = self._maxCommands - addedCommands
+					if remaining <= 0:
+						# nothing requested, or read() lowered the number of commands wanted meanwhile
+						self._readEvent.clear()
+						break
 
-				else:
-					try:
-						commandObjs = self._eventListener.onFileLineRead(line)
-					except:
-						commandObjs = None
-						self._logger.error('Error processing job command', exc_info= True)
-						self._eventListener.onJobError("error_processing_command")
+					lines = self._reader.readLines(min(remaining, self._maxLinesPerBatch))
+					if not lines and self._reader.pos >= self._reader.size:
+						# end of file reached
+						self.stop()
+						self._comm.onEndOfFle()
+						break
+
+					batch = []
+					for line in lines:
+						try:
+							commandObjs = self._eventListener.onFileLineRead(line)
+						except:
+							commandObjs = None
+							self._logger.error('Error processing job command', exc_info= True)
+							self._eventListener.onJobError("error_processing_command")
 
-					if commandObjs is not None:
-						self._comm.queueCommands( commandObjs )
-						addedCommands += len(commandObjs)
+						if commandObjs:
+							batch.extend(commandObjs)
 
-						if addedCommands >= self._maxCommands:
-							self._readEvent.clear()
-							break
+					if batch:
+						self._comm.queueCommands( batch )
+						addedCommands += len(batch)
+
+					if addedCommands >= self._maxCommands:
+						self._readEvent.clear()
+						break
+
+		finally:
+			reader = self._reader
+			self._reader = None
+			reader.close()
 
 	def stop(self):
 		if not self._stopped:
 			self._stopped = True
 			self._readEvent.set()
-			self._fileHandler.close()
-			self._fileHandler = None
 
 	def start(self):
 		#open the file
-		self._fileHandler = open(self._filename, 'r')
+		self._reader = FileLineReader(self._filename)
 		self._readEvent.clear()
-		self._fileSize = float(os.stat(self._filename).st_size)
+		self._fileSize = float(self._reader.size)
 		self._eventListener.onPrintJobProgress(0.0, 0)
 		self._lastReport = time.time()
 
@@ -709,8 +769,9 @@ class JobWorker(threading.Thread):
 
 	@property
 	def filePos(self):
-		if self._fileHandler:
-			return self._fileHandler.tell()
+		reader = self._reader
+		if reader:
+			return reader.pos
 		else:
 			return None
 
@@ -748,6 +809,88 @@ class StatusPoller(threading.Thread):
 		else:
 			self._pauseEvent.set()
 
+#~~~~~~ Commands sent to the printer waiting for their responses
+
+class PendingCommands(object):
+	"""
+	Commands sent to the printer that are waiting for responses. They are kept in a linked list, in the order they
+	were sent, and indexed by the sequence number they get when added, so that removing a command and checking if any
+	queued command is pending don't need to go through all of them.
+	"""
+
+	# fields of the list links
+	PREV, NEXT, SEQUENCE, COMMAND = 0, 1, 2, 3
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._root = [] # before the oldest and after the last sent command
+		self._root[:] = [self._root, self._root, None, None]
+		self._links = {} # sequence -> (link, queued)
+		self._nextSequence = 0
+		self._queuedCount = 0
+
+	def __len__(self):
+		return len(self._links)
+
+	def add(self, command):
+		with self._lock:
+			sequence = self._nextSequence
+			self._nextSequence += 1
+
+			root = self._root
+			last = root[self.PREV]
+			link = [last, root, sequence, command]
+			last[self.NEXT] = root[self.PREV] = link
+
+			queued = command.isQueued
+			self._links[sequence] = (link, queued)
+			if queued:
+				self._queuedCount += 1
+
+			return sequence
+
+	def remove(self, sequence):
+		with self._lock:
+			entry = self._links.pop(sequence, None)
+			if entry is None:
+				return
+
+			link, queued = entry
+			if queued:
+				self._queuedCount -= 1
+
+			# the removed link keeps pointing to the previous one, for candidates() that may be going through it
+			prev, next = link[self.PREV], link[self.NEXT]
+			prev[self.NEXT] = next
+			next[self.PREV] = prev
+
+	def candidates(self):
+		"""
+		(sequence, command) of the pending commands to offer a response to, the last sent first. They're taken from
+		the list as they're needed, most responses are for one of the last commands sent.
+		"""
+		# No lock needed: links are only read here and a removed one still leads to the commands sent before it
+		root = self._root
+		links = self._links
+		link = root[self.PREV]
+
+		while link is not root:
+			sequence = link[self.SEQUENCE]
+			if sequence in links: # not removed since
+				yield sequence, link[self.COMMAND]
+
+			link = link[self.PREV]
+
+	@property
+	def hasQueuedCommands(self):
+		return self._queuedCount > 0
+
+	def clear(self):
+		with self._lock:
+			self._root[:] = [self._root, self._root, None, None]
+			self._links.clear()
+			self._queuedCount = 0
+
 #~~~~~~ Worker to empty the command queue
 
 #class CommandSender(threading.Thread):
@@ -760,8 +903,7 @@ class CommandSender(object):
 		self._commandQ = deque()
 		self._readyToSend = True
 		self._storedCommands = None
-		self._pendingCommands = deque()
-		self._pendingCommmandsLock = threading.RLock()
+		self._pendingCommands = PendingCommands()
 
 	def fireNextCommand(self):
 		self._readyToSend = False
@@ -790,8 +932,7 @@ class CommandSender(object):
 		if command.onBeforeCommandSend() is not False:
 			try:
 				self._comms.writeOnLink(command.encodedCommand, command.onCommandSent)
-				with self._pendingCommmandsLock:
-					self._pendingCommands.appendleft(command)
+				self._pendingCommands.add(command)
 
 			except Exception as e:
 				self._eventListener.onLinkError('unable_to_send', "Error: %s, command: %s" % (e, command.command))
@@ -808,13 +949,10 @@ class CommandSender(object):
 				sendNext = False
 				handled = False
 
-				with self._pendingCommmandsLock:
-					pc = list(self._pendingCommands)
-
-				for c in pc:
+				for sequence, c in self._pendingCommands.candidates():
 					if c.onResponse(data):
 						if c.completed:
-							toBeRemoved = c
+							toBeRemoved = sequence
 
 							if c.isQueued:
 								sendNext = True
@@ -825,9 +963,8 @@ class CommandSender(object):
 				if not handled:
 					self._eventListener.onUnhandledResponse(data)
 
-				if toBeRemoved:
-					with self._pendingCommmandsLock:
-						self._pendingCommands.remove(toBeRemoved)
+				if toBeRemoved is not None:
+					self._pendingCommands.remove(toBeRemoved)
 
 				if sendNext:
 					self.sendNext()
@@ -848,8 +985,7 @@ class CommandSender(object):
 		if self._readyToSend:
 			sendAllowed = True
 		else:
-			with self._pendingCommmandsLock:
-				sendAllowed = all([( not c.isQueued ) for c in self._pendingCommands])
+			sendAllowed = not self._pendingCommands.hasQueuedCommands
 
 		if sendAllowed:
 			self.fireNextCommand()
@@ -859,15 +995,7 @@ class CommandSender(object):
 
 	def addCommands(self, commands, sendNext= False):
 		if commands:
-			toBeDeleted = []
-
-			for c in commands:
-				if not c.onBeforeCommandAddToQueue():
-					toBeDeleted.append(c)
-
-				for c in toBeDeleted:
-					commands.remove(c)
-
+			commands = [c for c in commands if c.onBeforeCommandAddToQueue()]
 			commandCount = len(commands)
 
 			if commandCount:
@@ -890,8 +1018,7 @@ class CommandSender(object):
 
 	def clearCommandQueue(self):
 		self._commandQ.clear()
-		with self._pendingCommmandsLock:
-			self._pendingCommands.clear()
+		self._pendingCommands.clear()
 
 	@property
 	def commandsInQueue(self):
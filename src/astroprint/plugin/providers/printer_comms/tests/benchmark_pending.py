@@ -0,0 +1,75 @@
+# coding=utf-8
+__author__ = "AstroPrint Product Team <product@astroprint.com>"
+__license__ = "GNU Affero General Public License http://www.gnu.org/licenses/agpl.html"
+__copyright__ = "Copyright (C) 2017 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
+
+# Responses per second that CommandSender.onCommandResponse matches to the pending commands waiting for them, with
+# 1 to 64 commands outstanding. Each response completes one command, which is replaced by a new one so that the
+# number outstanding stays the same.
+#
+# The response is for the command sent last, the first one the pending commands offer it to, or for the oldest one,
+# the order a printer answers in, which offers it to all the others first.
+#
+# Run from the src folder:
+#
+#   PYTHONPATH=. python astroprint/plugin/providers/printer_comms/tests/benchmark_pending.py [responses] [runs]
+#
+# The best of the runs is shown.
+
+import sys
+import time
+
+from collections import deque
+
+import octoprint.settings # loads the modules in the order the server does
+
+from astroprint.plugin.providers.printer_comms.commands import Command, CommandSender
+
+class NumberedCommand(Command):
+	def __init__(self, number):
+		super(NumberedCommand, self).__init__('M105 N%d' % number)
+		self._response = 'ok N%d' % number
+
+	def onResponse(self, response):
+		if response == self._response:
+			self._completed = True
+			return True
+
+		return False
+
+class Link(object):
+	def writeOnLink(self, data, onSent):
+		onSent()
+
+class Listener(object):
+	def onUnhandledResponse(self, data):
+		raise ValueError("Unhandled response: %s" % data)
+
+def responsesPerSecond(outstanding, responses, oldestFirst):
+	sender = CommandSender(Link(), Listener())
+	waiting = deque() # responses expected, oldest first
+
+	number = 0
+	for number in xrange(outstanding):
+		sender.sendCommand(NumberedCommand(number))
+		waiting.append('ok N%d' % number)
+
+	start = time.time()
+	for i in xrange(responses):
+		sender.onCommandResponse(waiting.popleft() if oldestFirst else waiting.pop())
+
+		number += 1
+		sender.sendCommand(NumberedCommand(number))
+		waiting.append('ok N%d' % number)
+
+	return responses / (time.time() - start)
+
+def main(responses=20000, runs=3):
+	print "%-12s %18s %18s" % ("outstanding", "last sent", "oldest")
+	for outstanding in (1, 4, 16, 64):
+		lastSent = max(responsesPerSecond(outstanding, responses, False) for i in xrange(runs))
+		oldest = max(responsesPerSecond(outstanding, responses, True) for i in xrange(runs))
+		print "%-12d %12.0f resp/s %12.0f resp/s" % (outstanding, lastSent, oldest)
+
+if __name__ == "__main__":
+	main(*[int(arg) for arg in sys.argv[1:3]])
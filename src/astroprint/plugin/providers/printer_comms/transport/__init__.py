@@ -62,6 +62,14 @@ class PrinterCommTransport(object):
 	def connSettings(self):
 		raise NotImplementedError()
 
+	#
+	# Number of commands that should be kept in the send queue while printing so that the link is never
+	# waiting for the next command to be read from the file. 0 to read only what the plugin asks for
+	#
+	@property
+	def readAhead(self):
+		return 0
+
 
 #
 # Interface class for transport events
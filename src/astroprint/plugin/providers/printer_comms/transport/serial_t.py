@@ -158,6 +158,10 @@ class SerialCommTransport(PrinterCommTransport):
 	def connSettings(self):
 		return self._port, self._baudrate
 
+	@property
+	def readAhead(self):
+		return self._settings.getInt(["serial", "readAhead", "serial"])
+
 #
 # Class to read from serial port
 #
@@ -11,6 +11,8 @@ import time
 
 from collections import deque
 
+from octoprint.settings import settings
+
 from . import PrinterCommTransport
 
 class UsbCommTransport(PrinterCommTransport):
@@ -174,6 +176,10 @@ class UsbCommTransport(PrinterCommTransport):
 	def connSettings(self):
 		return self._port_id, None
 
+	@property
+	def readAhead(self):
+		return settings().getInt(["serial", "readAhead", "usb"])
+
 	#
 	# private
 	#
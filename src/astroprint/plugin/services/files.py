@@ -94,13 +94,34 @@ class FilesService(PluginService):
 	def getFileBrowsingExtensions(self, sendResponse):
 		sendResponse({ 'fileBrowsingExtensions' : externalDriveManager().getFileBrowsingExtensions() })
 
-	def getFolderContents(self, folder, sendResponse):
+	#
+	# data is the folder or a dict with folder, offset and limit to get a page of it along with the total
+	# number of entries
+	#
+	def getFolderContents(self, data, sendResponse):
+		if isinstance(data, dict):
+			folder = data.get('folder')
+			offset = data.get('offset') or 0
+			limit = data.get('limit')
+		else:
+			folder = data
+			offset = limit = None
+
 		if folder == '/':
-			sendResponse( { 'folderContents': externalDriveManager().getRemovableDrives() })
+			contents = externalDriveManager().getRemovableDrives()
 
 		else:
 			folderSearchStr = "%s/*" % folder
-			sendResponse( { 'folderContents': externalDriveManager().getFolderContents(folderSearchStr.replace('//','/')) })
+			contents = externalDriveManager().getFolderContents(folderSearchStr.replace('//','/'))
+
+		if contents is None or (not offset and limit is None):
+			sendResponse( { 'folderContents': contents })
+
+		else:
+			sendResponse( {
+				'folderContents': contents[offset:offset + limit if limit is not None else None],
+				'total': len(contents)
+			})
 
 	def getBaseFolder(self, key, sendResponse):
 		sendResponse({ 'baseFolder' : externalDriveManager().getBaseFolder(key) })
@@ -12,13 +12,14 @@ import logging
 from collections import deque
 
 from octoprint.settings import settings
-from octoprint.events import eventManager, Events
+from octoprint.events import eventManager, Events, Throttle
 
 from astroprint.cloud import astroprintCloud
 from astroprint.printerprofile import printerProfileManager
 from astroprint.camera import cameraManager
 from astroprint.printfiles.map import printFileManagerMap
 from astroprint.printfiles import FileDestinations
+from astroprint.printer.temperatures import TemperatureHistory
 from astroprint.manufacturerpkg import manufacturerPkgManager
 from astroprint.data_store import dataStore
 
@@ -69,9 +70,13 @@ class Printer(object):
 
 		self._temp = {}
 		self._bedTemp = None
-		self._temps = deque([], 300)
+		self._temps = TemperatureHistory()
 		self._shutdown = False
 
+		# progress and temperatures are reported much more often than anyone needs them
+		self._progressThrottle = Throttle(Throttle.intervalForEvent(Events.PRINTING_PROGRESS), self._updateProgressIfPrinting)
+		self._temperatureThrottle = Throttle(Throttle.intervalForEvent(Events.TEMPERATURE_CHANGE), self._fireTemperatureChange)
+
 		self._messages = deque([], 300)
 
 		self.printedLayersCounter = 0
@@ -153,6 +158,7 @@ class Printer(object):
 		self._logger.info('Ramping down Printer Manager')
 		self._shutdown = True
 		self.disconnect()
+		self._cancelThrottledUpdates()
 		eventManager().unsubscribe(Events.METADATA_ANALYSIS_FINISHED, self.onMetadataAnalysisFinished)
 		self._callbacks = []
 		self._stateMonitor.stop()
@@ -226,12 +232,19 @@ class Printer(object):
 		return False
 
 	def disconnect(self):
+		self._cancelThrottledUpdates()
+
 		if not self.isConnected() and not self.isConnecting():
 			return True
 
 		self.doDisconnect()
 		# the driver is responsible for issuing the CLOSED event
 
+	def _cancelThrottledUpdates(self):
+		# updates still waiting for their interval would report a printer that's gone
+		self._progressThrottle.cancel()
+		self._temperatureThrottle.cancel()
+
 	def reConnect(self, port=None, baudrate=None):
 		if self.isConnecting() or self.isConnected():
 			self.disconnect()
@@ -293,7 +306,7 @@ class Printer(object):
 		try:
 			data = self._stateMonitor.getCurrentData()
 			data.update({
-				"temps": list(self._temps)
+				"temps": self._temps.samples()
 			})
 
 			if 'state' in data and 'flags' in data['state']:
@@ -307,8 +320,10 @@ class Printer(object):
 			pass
 
 	def _sendCurrentDataCallbacks(self, data):
+		# one copy shared by all the callbacks, they only read it
+		data = copy.deepcopy(data)
 		for callback in self._callbacks:
-			try: callback.sendCurrentData(copy.deepcopy(data))
+			try: callback.sendCurrentData(data)
 			except: pass
 
 	def _sendAddTemperatureCallbacks(self, data):
@@ -650,6 +665,17 @@ class Printer(object):
 	def mcProgress(self):
 		"""
 		 Callback method for the comm object, called upon any change in progress of the printjob.
+		 The progress is updated at most at the rate set for the PRINTING_PROGRESS event.
+		"""
+		self._progressThrottle()
+
+	def _updateProgressIfPrinting(self):
+		# a delayed update could come after the print is over
+		if self.isPrinting():
+			self._updateProgress()
+
+	def _updateProgress(self):
+		"""
 		 Triggers storage of new values for printTime, printTimeLeft and the current progress.
 		"""
 
@@ -671,11 +697,12 @@ class Printer(object):
 			else:
 				estimatedTimeLeft = self._estimatedPrintTime / 60
 
-		value = self._formatPrintingProgressData(progress, self.getPrintFilepos(), printTime, estimatedTimeLeft, self.getCurrentLayer())
-		eventManager().fire(Events.PRINTING_PROGRESS, value)
-
 		self._setProgressData(progress, self.getPrintFilepos(), printTime, estimatedTimeLeft, self.getCurrentLayer())
 
+		em = eventManager()
+		if em.hasSubscribers(Events.PRINTING_PROGRESS):
+			em.fire(Events.PRINTING_PROGRESS, self._formatPrintingProgressData(progress, self.getPrintFilepos(), printTime, estimatedTimeLeft, self.getCurrentLayer()))
+
 	def mcHeatingUpUpdate(self, value):
 		self._stateMonitor._state['flags']['heatingUp'] = value
 		eventManager().fire(Events.HEATING_UP, value)
@@ -702,30 +729,21 @@ class Printer(object):
 	#~~~ Data processing functions ~~~
 
 	def _addTemperatureData(self, temp, bedTemp):
-		data = {
-			"time": int(time.time())
-		}
-
-		if temp is not None:
-			for tool in temp.keys():
-				data["tool%d" % tool] = {
-					"actual": temp[tool][0],
-					"target": temp[tool][1]
-				}
-
-		if bedTemp is not None and isinstance(bedTemp, tuple):
-			data["bed"] = {
-				"actual": bedTemp[0],
-				"target": bedTemp[1]
-			}
-
-		self._temps.append(data)
+		self._temps.add(time.time(), temp, bedTemp)
 
 		self._temp = temp
 		self._bedTemp = bedTemp
 
-		eventManager().fire(Events.TEMPERATURE_CHANGE, data)
-		self._stateMonitor.addTemperature(data)
+		self._temperatureThrottle()
+		self._stateMonitor.addTemperature(self._temps.latest())
+
+	def _fireTemperatureChange(self):
+		em = eventManager()
+		if len(self._temps) and em.hasSubscribers(Events.TEMPERATURE_CHANGE):
+			em.fire(Events.TEMPERATURE_CHANGE, self._temps.latest())
+
+	def getTemperatureHistory(self):
+		return self._temps
 
 	#~~ callback from metadata analysis event
 
@@ -270,12 +270,12 @@ class PrinterMarlin(Printer):
 	def analyzedInfoDecider(self, timePerLayers, totalPrintTime):
 		if timePerLayers and totalPrintTime:
 			self.mcLayerChange = self.mcLayerChangeImproved
-			self.mcProgress = self.mcProgressImproved
+			self._updateProgress = self._updateProgressImproved
 			self.originalTotalPrintTime = totalPrintTime
 
 		else:
 			self.mcLayerChange = lambda layer: super(PrinterMarlin, self).mcLayerChange(layer)
-			self.mcProgress = lambda: super(PrinterMarlin, self).mcProgress()
+			self._updateProgress = lambda: super(PrinterMarlin, self)._updateProgress()
 
 	def executeCancelCommands(self, disableMotorsAndHeater):
 		"""
@@ -362,11 +362,7 @@ class PrinterMarlin(Printer):
 					elif state == self._comm.STATE_CLOSED or state == self._comm.STATE_ERROR or state == self._comm.STATE_CLOSED_WITH_ERROR:
 						self._fileManager.printFailed(self._selectedFile["filename"], self._comm.getPrintTime())
 
-				self._fileManager.resumeAnalysis() # printing done, put those cpu cycles to good use
-
-			if state == self._comm.STATE_PRINTING:
-				self._fileManager.pauseAnalysis() # do not analyse gcode while printing
-			elif state == self._comm.STATE_CONNECTING:
+			if state == self._comm.STATE_CONNECTING:
 				eventManager().fire(Events.CONNECTING)
 			elif state == self._comm.STATE_CLOSED:
 				eventManager().fire(Events.DISCONNECTED)
@@ -437,10 +433,10 @@ class PrinterMarlin(Printer):
 			else:
 				return timeCalculatingValue
 
-	def mcProgressImproved(self):
+	def _updateProgressImproved(self):
 		"""
-		 Callback method for the comm object, called upon any change in progress of the printjob.
-		 Triggers storage of new values for printTime, printTimeLeft and the current progress.
+		 Triggers storage of new values for printTime, printTimeLeft and the current progress using the time of
+		 each layer from the analysis.
 		"""
 		try:
 			layerFileUpperPercent = self._comm.timePerLayers[self._currentLayer-1]['upperPercent']
@@ -479,11 +475,12 @@ class PrinterMarlin(Printer):
 
 			self._setProgressData(self.getPrintProgress(), self.getPrintFilepos(), elapsedTime, estimatedTimeLeft, self._currentLayer)
 
-			value = self._formatPrintingProgressData(self.getPrintProgress(), self.getPrintFilepos(), elapsedTime, estimatedTimeLeft, self._currentLayer)
-			eventManager().fire(Events.PRINTING_PROGRESS, value)
+			em = eventManager()
+			if em.hasSubscribers(Events.PRINTING_PROGRESS):
+				em.fire(Events.PRINTING_PROGRESS, self._formatPrintingProgressData(self.getPrintProgress(), self.getPrintFilepos(), elapsedTime, estimatedTimeLeft, self._currentLayer))
 
 		except Exception:
-			super(PrinterMarlin, self).mcProgress()
+			super(PrinterMarlin, self)._updateProgress()
 
 	def mcMessage(self, message):
 		"""
@@ -603,9 +600,6 @@ class PrinterMarlin(Printer):
 		else:
 			return self._comm.getStateString()
 
-	def getTemperatureHistory(self):
-		return self._temps
-
 	def getCurrentConnection(self):
 		if self._comm is None:
 			return "Closed", None, None
@@ -19,6 +19,7 @@ from octoprint.settings import settings
 from octoprint.events import eventManager, Events
 from octoprint.util import getExceptionString, getNewTimeout, sanitizeAscii, filterNonAscii
 from astroprint.util.gCodeAnalyzer import GCodeAnalyzer
+from astroprint.printer.marlin.spool import GcodeSpool, gcodeChecksum
 
 from astroprint.printfiles import FileDestinations
 
@@ -104,6 +105,15 @@ class MachineCom(object):
 		self._resendDelta = None
 		self._lastLines = deque([], 100)
 
+		# windowed streaming: lines sent to the printer that haven't been acknowledged yet
+		self._streamingEnabled = self._settings.getBoolean(["serial", "streaming", "enabled"])
+		self._streamingMaxLines = max(1, min(self._settings.getInt(["serial", "streaming", "maxLines"]) or 1, self._lastLines.maxlen // 2))
+		self._streamingRxBufferSize = self._settings.getInt(["serial", "streaming", "rxBufferSize"]) or 0
+		self._linesInFlight = deque()
+		self._bytesInFlight = 0
+		self._lastResendRequest = None
+		self._inFlightLock = threading.Lock()
+
 		# SD status data
 		self._sdAvailable = False
 		self._sdFileList = False
@@ -132,6 +142,9 @@ class MachineCom(object):
 		self._regex_M114Response = re.compile(r"X:\s*(%s)\s?Y:\s*(%s)\s?Z:\s*(%s)\s?E:\s*(%s)" % (floatPattern, floatPattern, floatPattern, floatPattern))
 		self._regex_hostCommand = re.compile(r"^//\s?([\w_]+):([\w_]+)(?:\s(.+))?$")
 
+		# gcode -> handler method (or None), filled as commands are sent
+		self._gcodeHandlers = {}
+
 		# Regex matching temperature entries in line. Groups will be as follows:
 		# - 1: whole tool designator incl. optional toolNumber ("T", "Tn", "B")
 		# - 2: toolNumber, if given ("", "n", "")
@@ -397,6 +410,9 @@ class MachineCom(object):
 			# 	self.sendCommand("M24")
 			# else:
 
+			#nothing sent before the print counts towards the streaming window
+			self._resetLinesInFlight()
+
 			#reset line counter
 			self._sendCommand("M110 N0")
 
@@ -437,14 +453,23 @@ class MachineCom(object):
 				return False
 			self.sendCommand("M23 %s" % filename)
 		else:
+			if self._currentFile is not None:
+				self._currentFile.close()
+
 			self._currentFile = PrintingGcodeFileInformation(filename)
 
+			if self._settings.getBoolean(["feature", "spoolGcode"]):
+				self._currentFile.spool()
+
 		return True
 
 	def unselectFile(self):
 		if self.isBusy():
 			return False
 
+		if self._currentFile is not None:
+			self._currentFile.close()
+
 		self._currentFile = None
 		return True
 
@@ -689,6 +714,23 @@ class MachineCom(object):
 		self.total_filament = None
 		self.timerCalculator = None
 
+	def _startTimerCalculator(self):
+		filename = self._currentFile.getFilename()
+		fileManager = printerManager().fileManager
+
+		# The layers found when the file was analyzed save running the analyzer again
+		layerIndex = fileManager.getLayerIndex(filename)
+		if layerIndex is not None and len(layerIndex) > 0:
+			fileData = fileManager.getFileData(filename)
+			gcodeAnalysis = fileData and fileData.get('gcodeAnalysis')
+			if gcodeAnalysis:
+				self.timerCalculator = layerIndex
+				self.cbGCodeAnalyzerReady(layerIndex.timePerLayers(), layerIndex.printTime, gcodeAnalysis.get('layer_count'), gcodeAnalysis.get('size'), gcodeAnalysis.get('layer_height'), None, self)
+				return
+
+		self.timerCalculator = GCodeAnalyzer(self._currentFile._filename,True,self.cbGCodeAnalyzerReady,self.cbGCodeAnalyzerException,self)
+		self.timerCalculator.makeCalcs()
+
 	def cbGCodeAnalyzerReady(self,timePerLayers,totalPrintTime,layerCount,size,layer_height,total_filament,parent):
 
 		self.timePerLayers =  timePerLayers
@@ -921,8 +963,7 @@ class MachineCom(object):
 						self._oksAfterHeatingUp -= 1
 
 						if not self.timerCalculator and self._currentFile: # It's possible that we just cancelled the print
-							self.timerCalculator = GCodeAnalyzer(self._currentFile._filename,True,self.cbGCodeAnalyzerReady,self.cbGCodeAnalyzerException,self)
-							self.timerCalculator.makeCalcs()
+							self._startTimerCalculator()
 
 				### Baudrate detection
 				# if self._state == self.STATE_DETECT_BAUDRATE:
@@ -969,6 +1010,9 @@ class MachineCom(object):
 				# 	else:
 				# 		self._testingBaudrate = False
 
+				if self._streamingEnabled and "ok" in lineLower:
+					self._acknowledgeLineInFlight()
+
 				### Connection attempt
 				if self._state == self.STATE_CONNECTING:
 					if line == "" or "wait" in lineLower:
@@ -1046,12 +1090,10 @@ class MachineCom(object):
 						tempRequestTimeout = getNewTimeout("temperature")
 
 					if "ok" in lineLower:
-						if self._resendDelta is not None:
-							self._resendNextCommand()
-						elif len(self._commandQueue) > 0:
-							self._sendCommand(self._commandQueue.pop(), True)
-						elif self.isPrinting():
-							self._sendNextFileCommand()
+						if self._streamingEnabled:
+							self._fillStreamingWindow()
+						else:
+							self._sendNextPrintingCommand()
 
 					elif lineLower.startswith("resend") or lineLower.startswith("rs"):
 						self._handleResendRequest(line)
@@ -1223,10 +1265,67 @@ class MachineCom(object):
 
 		return ret
 
+	def _sendNextPrintingCommand(self):
+		if self._resendDelta is not None:
+			self._resendNextCommand()
+		elif len(self._commandQueue) > 0:
+			self._sendCommand(self._commandQueue.pop(), True)
+		elif self.isPrinting():
+			self._sendNextFileCommand()
+
+	def _fillStreamingWindow(self):
+		# Keep sending until the window is full. Resends go out one line per ok, the same as in non streaming mode
+		while self._state == self.STATE_PRINTING and self._serial is not None:
+			if self._resendDelta is not None:
+				self._resendNextCommand()
+				return
+
+			if self._linesInFlight:
+				if len(self._linesInFlight) >= self._streamingMaxLines:
+					return
+
+				if self._streamingRxBufferSize > 0:
+					if len(self._commandQueue) > 0:
+						nextCmd = self._commandQueue[-1]
+					elif self.isPrinting():
+						# the line stays in the file until it's sent, a pause or cancel in between doesn't send it
+						nextCmd = self._currentFile.peekNext()
+					else:
+						return
+
+					# line number and checksum add roughly 12 bytes to the line. At the end of the file there's
+					# nothing to measure, sending ends the print
+					if nextCmd is not None and self._bytesInFlight + len(nextCmd) + 12 > self._streamingRxBufferSize:
+						return
+
+			sentBefore = self._currentLine
+			self._sendNextPrintingCommand()
+
+			if self._currentLine == sentBefore:
+				# nothing went out (end of file, paused or a command swallowed by its handler)
+				return
+
+	def _trackLineInFlight(self, cmd):
+		with self._inFlightLock:
+			size = len(cmd) + 1
+			self._linesInFlight.append(size)
+			self._bytesInFlight += size
+
+	def _acknowledgeLineInFlight(self):
+		with self._inFlightLock:
+			if self._linesInFlight:
+				self._bytesInFlight -= self._linesInFlight.popleft()
+
+	def _resetLinesInFlight(self):
+		with self._inFlightLock:
+			self._linesInFlight.clear()
+			self._bytesInFlight = 0
+
 	def _sendNextFileCommand(self):
 		line = self._getNextFileCommand()
 		if line:
-			self._sendCommand(line, True)
+			gcode, cmdChecksum = self._currentFile.getLastCommandInfo()
+			self._sendCommand(line, True, gcode, cmdChecksum)
 			self._callback.mcProgress()
 
 	def _getNextFileCommand(self):
@@ -1272,6 +1371,16 @@ class MachineCom(object):
 				lineToResend = int(line.split()[1])
 
 		if lineToResend is not None:
+			if self._streamingEnabled:
+				if self._resendDelta is not None and lineToResend == self._lastResendRequest:
+					# the lines that were still in flight when the error happened trigger the same request again
+					self._logger.debug("Ignoring repeated resend request for line %d" % lineToResend)
+					return
+
+				# the firmware flushed its buffer so nothing we sent after that line will be acknowledged
+				self._lastResendRequest = lineToResend
+				self._resetLinesInFlight()
+
 			linesStored = len(self._lastLines)
 
 			if linesStored == 1 and "M110 N0" in self._lastLines[0]:
@@ -1304,21 +1413,32 @@ class MachineCom(object):
 		if self._resendDelta <= 0:
 			self._resendDelta = None
 
-	def _sendCommand(self, cmd, sendChecksum=False):
+	def _sendCommand(self, cmd, sendChecksum=False, gcode=None, cmdChecksum=None):
+		# gcode and cmdChecksum can be passed when they're already known (spooled files)
 		if self._serial is None:
 			return
 
 		#if not self.isStreaming():
-		gcode = self._regex_command.search(cmd)
-		if gcode:
-			gcode = gcode.group(1)
+		if gcode is None:
+			gcode = self._regex_command.search(cmd)
+			if gcode:
+				gcode = gcode.group(1)
 
+		if gcode:
 			if gcode in gcodeToEvent:
 				eventManager().fire(gcodeToEvent[gcode])
 
-			gcodeHandler = "_gcode_" + gcode
-			if hasattr(self, gcodeHandler):
-				cmd = getattr(self, gcodeHandler)(cmd)
+			try:
+				gcodeHandler = self._gcodeHandlers[gcode]
+			except KeyError:
+				# unbound, a bound method would keep a reference cycle with this object
+				gcodeHandler = self._gcodeHandlers[gcode] = getattr(self.__class__, "_gcode_" + gcode, None)
+
+			if gcodeHandler:
+				originalCmd = cmd
+				cmd = gcodeHandler(self, cmd)
+				if cmd is not originalCmd:
+					cmdChecksum = None
 
 		elif cmd.startswith('_apCommand_'):
 			#see if it's an AstroPrint Command
@@ -1328,7 +1448,7 @@ class MachineCom(object):
 		if cmd is not None:
 			if sendChecksum: # or self._alwaysSendChecksum:
 				self._addToLastLines(cmd)
-				self._doSendWithChecksum(cmd, self._getNewLineNumber())
+				self._doSendWithChecksum(cmd, self._getNewLineNumber(), cmdChecksum)
 			else:
 				self._doSend(cmd)
 
@@ -1342,12 +1462,15 @@ class MachineCom(object):
 		with self._newLineNumberLock:
 			self._currentLine = new
 
-	def _doSendWithChecksum(self, cmd, lineNumber):
-		self._logger.debug("Sending cmd '%s' with lineNumber %r" % (cmd, lineNumber))
+	def _doSendWithChecksum(self, cmd, lineNumber, cmdChecksum=None):
+		self._logger.debug("Sending cmd '%s' with lineNumber %r", cmd, lineNumber)
 
-		commandToSend = "N%d %s" % (lineNumber, cmd)
-		checksum = reduce(lambda x,y:x^y, map(ord, commandToSend))
-		commandToSend = "%s*%d" % (commandToSend, checksum)
+		prefix = "N%d " % lineNumber
+		if cmdChecksum is None:
+			cmdChecksum = gcodeChecksum(cmd)
+
+		# XOR is associative so the checksum of the command can be calculated beforehand
+		commandToSend = "%s%s*%d" % (prefix, cmd, gcodeChecksum(prefix, cmdChecksum))
 		self._doSend(commandToSend)
 
 	def _doSend(self, cmd):
@@ -1359,6 +1482,9 @@ class MachineCom(object):
 				try:
 					self._serial.write(cmd + '\n')
 
+					if self._streamingEnabled:
+						self._trackLineInFlight(cmd)
+
 					if self._callback.broadcastTraffic > 0:
 						self._callback.doTrafficBroadcast('s', cmd)
 
@@ -1680,6 +1806,12 @@ class PrintingFileInformation(object):
 		"""
 		self._filepos = 0
 
+	def close(self):
+		"""
+		Releases any resources held for the file.
+		"""
+		pass
+
 	def start(self):
 		"""
 		Marks the print job as started and remembers the start time.
@@ -1714,6 +1846,10 @@ class PrintingGcodeFileInformation(PrintingFileInformation):
 		PrintingFileInformation.__init__(self, filename)
 
 		self._filehandle = None
+		self._spool = None
+		self._spoolReader = None
+		self._lastCommandInfo = (None, None)
+		self._peeked = None # (line, filepos, command info, tool) read by peekNext and not taken yet
 
 		self._filesetMenuModehandle = None
 		self._currentTool = 0
@@ -1723,17 +1859,87 @@ class PrintingGcodeFileInformation(PrintingFileInformation):
 			raise IOError("File %s does not exist" % self._filename)
 		self._filesize = os.stat(self._filename).st_size
 
+	def spool(self):
+		"""
+		Starts pre-processing the file into a spool. If it's not finished by the time the print starts, the
+		original file is used instead.
+		"""
+		self._spool = GcodeSpool(self._filename)
+		self._spool.prepare()
+
+	def close(self):
+		"""
+		Releases the spool and any open file handles.
+		"""
+		if self._spool is not None:
+			self._spool.abort()
+			self._spool = None
+
+		if self._spoolReader is not None:
+			self._spoolReader.close()
+			self._spoolReader = None
+
+		if self._filehandle is not None:
+			self._filehandle.close()
+			self._filehandle = None
+
+		self._peeked = None
+
 	def start(self):
 		"""
-		Opens the file for reading and determines the file size. Start time won't be recorded until 100 lines in
+		Opens the file (or its spool) for reading and records the start time.
 		"""
-		self._filehandle = open(self._filename, "r")
+		if self._spoolReader is not None:
+			self._spoolReader.close()
+			self._spoolReader = None
+
+		self._peeked = None
+
+		if self._spool is not None and self._spool.isReady():
+			self._spoolReader = self._spool.open()
+		else:
+			if self._spool is not None:
+				self._spool.abort()
+
+			self._filehandle = open(self._filename, "r")
+
 		self._startTime = time.time()
 
+	def getLastCommandInfo(self):
+		"""
+		Returns a (gcode, checksum) tuple for the last line returned by getNext. Both are None unless the
+		file is printed from its spool.
+		"""
+		return self._lastCommandInfo
+
+	def peekNext(self):
+		"""
+		Returns the line getNext will return next without taking it, or None at the end of the file. The file
+		position and the command info stay at the last line taken until then.
+		"""
+		if self._peeked is None:
+			state = (self._filepos, self._lastCommandInfo, self._currentTool)
+			line = self._readNext()
+			self._peeked = (line, self._filepos, self._lastCommandInfo, self._currentTool)
+			self._filepos, self._lastCommandInfo, self._currentTool = state
+
+		return self._peeked[0]
+
 	def getNext(self):
 		"""
 		Retrieves the next line for printing.
 		"""
+		if self._peeked is not None:
+			line, self._filepos, self._lastCommandInfo, self._currentTool = self._peeked
+			self._peeked = None
+			return line
+
+		return self._readNext()
+
+	def _readNext(self):
+		if self._spoolReader is not None:
+			return self._getNextSpooled()
+
 		if self._filehandle is None:
 			raise ValueError("File %s is not open for reading" % self._filename)
 
@@ -1757,6 +1963,25 @@ class PrintingGcodeFileInformation(PrintingFileInformation):
 				self._filehandle = None
 			raise e
 
+	def _getNextSpooled(self):
+		command = self._spoolReader.readNext()
+		if command is None:
+			self._spoolReader.close()
+			self._spoolReader = None
+			self._lastCommandInfo = (None, None)
+			return None
+
+		line, gcode, checksum, self._filepos = command
+		self._lastCommandInfo = (gcode, checksum)
+
+		if gcode == "T":
+			toolMatch = self._regex_toolCommand.match(line)
+			if toolMatch is not None:
+				# track tool changes
+				self._currentTool = int(toolMatch.group(1))
+
+		return line
+
 	def _processLine(self, line):
 		commentPos = line.find(";")
 
@@ -0,0 +1,102 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+__author__ = "AstroPrint Product Team <product@astroprint.com>"
+__license__ = "GNU Affero General Public License http://www.gnu.org/licenses/agpl.html"
+__copyright__ = "Copyright (C) 2016-2019 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
+
+import re
+import struct
+import operator
+
+from astroprint.printer.spool import PrintFileSpool, SpoolAborted
+
+def gcodeChecksum(data, initial=0):
+	"""
+	XOR of all the bytes in data, as used by the line checksum of the gcode protocol
+	"""
+	return reduce(operator.xor, bytearray(data), initial)
+
+class GcodeSpool(PrintFileSpool):
+	"""
+	Pre-processed copy of a gcode file, made when the file is selected so that printing it only
+	takes buffered reads.
+
+	Two side files are written to the spool folder:
+
+	  - <name>.cmd: the commands to send, comments and blank lines removed, one per line.
+	  - <name>.idx: a header followed by one fixed size record per command with the offset in the original
+	    file right after the command, the checksum of the command and the length of its G/M/T code.
+	"""
+
+	MAGIC = "APSP"
+	VERSION = 1
+	RECORD = struct.Struct("<QBB") # source offset, checksum, code length
+
+	DATA_EXTENSION = ".cmd"
+	INDEX_EXTENSION = ".idx"
+
+	def __init__(self, filename):
+		super(GcodeSpool, self).__init__(filename)
+		self._regex_command = re.compile(r"^\s*([GM]\d+|T)")
+
+	def _createReader(self, dataFile, indexFile):
+		return GcodeSpoolReader(dataFile, indexFile, self.recordCount)
+
+	def _writeRecords(self, commands, index):
+		count = 0
+		filepos = 0
+		packRecord = self.RECORD.pack
+		matchCommand = self._regex_command.match
+
+		with open(self.filename, "rb") as source:
+			for line in source:
+				if self._abort:
+					raise SpoolAborted()
+
+				filepos += len(line)
+
+				commentPos = line.find(";")
+				if commentPos >= 0:
+					line = line[0:commentPos]
+
+				line = line.strip()
+				if not line:
+					continue
+
+				codeMatch = matchCommand(line)
+				commands.write(line + "\n")
+				index.write(packRecord(filepos, gcodeChecksum(line), codeMatch.end(1) if codeMatch else 0))
+				count += 1
+
+		return count
+
+class GcodeSpoolReader(object):
+	def __init__(self, commandsFile, indexFile, commandCount):
+		self._commands = open(commandsFile, "rb")
+		self._index = open(indexFile, "rb")
+		self._index.seek(GcodeSpool.HEADER.size)
+		self._unpackRecord = GcodeSpool.RECORD.unpack
+		self._recordSize = GcodeSpool.RECORD.size
+
+		self.commandCount = commandCount
+		self.commandNumber = 0
+
+	def readNext(self):
+		"""
+		Returns a (command, code, checksum, filepos) tuple for the next command or None at the end of the spool
+		"""
+		record = self._index.read(self._recordSize)
+		if len(record) < self._recordSize:
+			return None
+
+		filepos, checksum, codeLength = self._unpackRecord(record)
+		command = self._commands.readline()[:-1]
+		self.commandNumber += 1
+
+		return command, command[:codeLength] if codeLength else None, checksum, filepos
+
+	def close(self):
+		self._commands.close()
+		self._index.close()
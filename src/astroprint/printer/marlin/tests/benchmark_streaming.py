@@ -0,0 +1,126 @@
+# coding=utf-8
+__author__ = "AstroPrint Product Team <product@astroprint.com>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016-2020 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
+
+# Lines per second that MachineCom sends to the virtual printer of octoprint/util/virtual.py, waiting for an ok after
+# each line and with streaming (serial.streaming) enabled.
+#
+# The virtual printer answers as soon as a line is written to it, so the one used here holds each ok back for a round
+# trip, the time a real serial link and firmware take to acknowledge a line.
+#
+# Run from the src folder:
+#
+#   PYTHONPATH=. python astroprint/printer/marlin/tests/benchmark_streaming.py [lines] [round trip in ms]
+
+import os
+import sys
+import time
+import tempfile
+import threading
+
+from collections import deque
+from mock import patch, MagicMock
+
+from octoprint.settings import settings
+from octoprint.util.virtual import VirtualPrinter
+
+from astroprint.printer.marlin.comm import MachineCom, MachineComPrintCallback
+
+class RoundTripVirtualPrinter(VirtualPrinter):
+	roundTrip = 0.004
+
+	def __init__(self):
+		self._delayedOks = deque() # time each ok is due
+		VirtualPrinter.__init__(self)
+
+	def _sendOk(self):
+		self._delayedOks.append(time.time() + self.roundTrip)
+
+	def readline(self):
+		# the same 2 seconds timeout as the virtual printer, but the oks held back count as something to read
+		timeout = time.time() + 2.0
+		while self.readList is not None and not self.readList:
+			if self._delayedOks:
+				time.sleep(max(0.0, self._delayedOks.popleft() - time.time()))
+				self.readList.append("ok")
+			elif time.time() > timeout:
+				return ""
+			else:
+				time.sleep(0.0005)
+
+		return VirtualPrinter.readline(self)
+
+class BenchmarkCallback(MachineComPrintCallback):
+	isBedClear = True
+	doIdleTempReports = False
+	broadcastTraffic = 0
+	analyzedInfoDecider = None
+
+	def __init__(self):
+		self.printDone = threading.Event()
+
+	def baudrateList(self):
+		return [115200]
+
+	def set_bed_clear(self, clear):
+		pass
+
+	def mcPrintjobDone(self):
+		self.printDone.set()
+
+def writeGcode(lines):
+	# short segments, like the ones of a curved surface
+	fd, filename = tempfile.mkstemp(suffix=".gcode")
+	with os.fdopen(fd, "w") as f:
+		f.write("G28\nG1 Z0.2 F3000\n")
+		for i in xrange(lines):
+			f.write("G1 X%.3f Y%.3f E%.5f F1800\n" % (100 + (i % 200) * 0.05, 100 + (i % 50) * 0.05, i * 0.002))
+
+	return filename
+
+def linesPerSecond(filename, lines, streaming):
+	settings().set(["serial", "streaming", "enabled"], streaming)
+
+	callback = BenchmarkCallback()
+	comm = MachineCom("VIRTUAL", 115200, callback)
+	try:
+		while not comm.isOperational():
+			if comm.isError() or comm.isClosedOrError():
+				raise RuntimeError(comm.getErrorString())
+
+			time.sleep(0.05)
+
+		comm.selectFile(filename, False)
+
+		start = time.time()
+		comm.startPrint()
+		callback.printDone.wait()
+		return lines / (time.time() - start)
+
+	finally:
+		comm.close()
+
+def main(lines=5000, roundTripMs=4.0):
+	s = settings(init=True, basedir=tempfile.mkdtemp())
+	# like Marlin, the virtual printer's resend request at line 100 is followed by an ok
+	s.set(["devel", "virtualPrinter", "okAfterResend"], True)
+
+	RoundTripVirtualPrinter.roundTrip = roundTripMs / 1000.0
+	filename = writeGcode(lines)
+
+	printerManager = MagicMock()
+	printerManager.return_value.fileManager.getLayerIndex.return_value = None
+
+	try:
+		with patch("octoprint.util.virtual.VirtualPrinter", RoundTripVirtualPrinter), \
+				patch("astroprint.printer.marlin.comm.printerManager", printerManager), \
+				patch("astroprint.printer.marlin.comm.GCodeAnalyzer"):
+			for streaming in (False, True):
+				print "%-10s %8.0f lines/sec" % ("streaming" if streaming else "one by one", linesPerSecond(filename, lines, streaming))
+
+	finally:
+		os.remove(filename)
+
+if __name__ == "__main__":
+	main(*[float(arg) if i else int(arg) for i, arg in enumerate(sys.argv[1:3])])
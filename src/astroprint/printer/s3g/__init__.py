@@ -20,6 +20,7 @@ from octoprint.util import getExceptionString
 
 from astroprint.printer import Printer
 from astroprint.printer.s3g.printjob import PrintJobS3G
+from astroprint.printer.s3g.spool import X3gSpool
 from astroprint.printfiles.x3g import PrintFileManagerX3g
 from astroprint.printfiles import FileDestinations
 from astroprint.printer.manager import printerManager
@@ -41,6 +42,7 @@ class PrinterS3g(Printer):
 		self._errorValue = ''
 		self._botThread = None
 		self._printJob = None
+		self._spool = None
 		self._heatingUp = False
 		self._firmwareVersion = None
 		self._selectedTool = 0
@@ -119,18 +121,7 @@ class PrinterS3g(Printer):
 		self._state = newState
 		self._logger.info('Changing printer state from [%s] to [%s]' % (oldState, self.getStateString()))
 
-		# forward relevant state changes to gcode manager
-		if oldState == self.STATE_PRINTING:
-			#if self._currentFile is not None:
-			#	if state == self.STATE_OPERATIONAL:
-			#		self._fileManager.printSucceeded(self._currentFile["filename"], self._comm.getPrintTime())
-			#	elif state == self.STATE_CLOSED or state == self.STATE_ERROR or state == self.STATE_CLOSED_WITH_ERROR:
-			#		self._fileManager.printFailed(self._currentFile["filename"], self._comm.getPrintTime())
-			self._fileManager.resumeAnalysis() # printing done, put those cpu cycles to good use
-
-		if newState == self.STATE_PRINTING:
-			self._fileManager.pauseAnalysis() # do not analyse gcode while printing
-		elif newState == self.STATE_CLOSED:
+		if newState == self.STATE_CLOSED:
 			eventManager().fire(Events.DISCONNECTED)
 		elif newState == self.STATE_ERROR:
 			eventManager().fire(Events.DISCONNECTED)
@@ -497,6 +488,15 @@ class PrinterS3g(Printer):
 		if sd:
 			raise('Printing from SD card is not supported for the S3G Driver')
 
+		if self._spool is not None:
+			self._spool.abort()
+			self._spool = None
+
+		# the packets are prepared in the background, the print job uses them if they're ready when it starts
+		if settings().getBoolean(["feature", "spoolX3g"]) and os.path.isfile(filename):
+			self._spool = X3gSpool(filename)
+			self._spool.prepare()
+
 		return super(PrinterS3g, self).selectFile(filename, sd, printAfterSelect, printJobId)
 
 	def getPrintTime(self):
@@ -12,9 +12,93 @@ from octoprint.events import eventManager, Events
 from octoprint.util import getExceptionString
 
 from makerbot_driver import GcodeAssembler
-from makerbot_driver.errors import BuildCancelledError, ProtocolError, ExternalStopError, PacketTooBigError, BufferOverflowError, PacketLengthError
+from makerbot_driver.errors import BuildCancelledError, ProtocolError, ExternalStopError, PacketTooBigError, BufferOverflowError, CommandNotSupportedError
 from makerbot_driver.Gcode.errors import UnrecognizedCommandError
 
+from astroprint.printer.s3g.spool import X3gReader
+
+class BufferSpaceSender(object):
+	"""
+	Sends action packets without overflowing the command buffer of the printer.
+
+	The free space of the buffer is asked to the printer (get_available_buffer_size) and counted down as packets
+	are sent, it's only asked again when a packet doesn't fit. While the buffer is full the printer is asked again
+	after a wait that starts short and doubles up to MAX_WAIT, so packets go out as soon as there's room instead of
+	failing with a BufferOverflowError and waiting a fixed time.
+
+	If the printer doesn't support the query, overflows are waited out as before.
+	"""
+
+	MIN_WAIT = 0.01
+	MAX_WAIT = 0.2
+
+	def __init__(self, comm):
+		self._logger = logging.getLogger(__name__)
+		self._comm = comm
+		self._available = 0
+		self._tracking = True
+
+		# statistics
+		self.packets = 0
+		self.bytes = 0
+		self.overflows = 0
+		self.queries = 0
+		self.idleTime = 0.0
+
+	def send(self, packet):
+		size = len(packet) - 3 # only the payload takes space in the printer's buffer
+
+		if self._tracking:
+			self._waitForSpace(size)
+
+		while True:
+			try:
+				self._comm.writer.send_packet(packet)
+				break
+
+			except BufferOverflowError:
+				self.overflows += 1
+				self._available = 0
+
+				if self._tracking:
+					self._waitForSpace(size)
+				else:
+					self._idle(self.MAX_WAIT)
+
+		self._available = max(0, self._available - size)
+		self.packets += 1
+		self.bytes += size
+
+	def invalidate(self):
+		"""
+		Call it when other commands have been sent to the printer, the free space is asked again before the next packet
+		"""
+		self._available = 0
+
+	def summary(self):
+		return "%d packets (%d bytes) sent, %d buffer overflows, %d buffer queries, %.1f secs waiting for buffer space" % (self.packets, self.bytes, self.overflows, self.queries, self.idleTime)
+
+	def _waitForSpace(self, size):
+		wait = self.MIN_WAIT
+
+		while self._available < size:
+			try:
+				self._available = self._comm.get_available_buffer_size()
+				self.queries += 1
+
+			except CommandNotSupportedError:
+				self._logger.warn("The printer doesn't report the free space of its buffer, waiting on overflows instead")
+				self._tracking = False
+				return
+
+			if self._available < size:
+				self._idle(wait)
+				wait = min(wait * 2, self.MAX_WAIT)
+
+	def _idle(self, secs):
+		time.sleep(secs)
+		self.idleTime += secs
+
 class PrintJobS3G(threading.Thread):
 	UPDATE_INTERVAL_SECS = 2
 
@@ -33,60 +117,11 @@ class PrintJobS3G(threading.Thread):
 		self._currentZ = None
 		self._lastLayerHeight = None
 		self._currentLayer = None
+		self._sender = BufferSpaceSender(printer._comm)
 		self.daemon = True
 
-
-		# ~~~ From https://github.com/jetty840/ReplicatorG/blob/master/scripts/s3g-decompiler.py
-
-		# Command table entries consist of:
-		# * The key: the integer command code
-		# * A tuple:
-		#   * idx 0: the python struct description of the rest of the data,
-		#            of a function that unpacks the remaining data from the
-		#            stream
-		#   * idx 1: either a format string that will take the tuple of unpacked
-		#            data, or a function that takes the tuple as input and returns
-		#            a string
-		# REMINDER: all values are little-endian. Struct strings with multibyte
-		# types should begin with "<".
-		# For a refresher on Python struct syntax, see here:
-		# http://docs.python.org/library/struct.html
-		self.commandTable = {
-			129: "<iiiI",
-			130: "<iii",
-			131: "<BIH",
-			132: "<BIH",
-			133: "<I",
-			#134: "<B",
-			134: self.parseChangeTool,
-			135: self.parseWaitForToolAction,
-			136: self.parseToolAction,
-			137: "<B",
-			138: "<H",
-			#139: "<iiiiiI",
-			139: self.parseQueueExtendedPoint,
-			140: "<iiiii",
-			141: self.parseWaitForPlatformAction,
-			#142: "<iiiiiIB",
-			142: self.parseQueueExtendedPointNew,
-			143: "<b",
-			144: "<b",
-			145: "<BB",
-			146: "<BBBBB",
-			147: "<HHB",
-			148: "<BHB",
-			149: self.parseDisplayMessageAction,
-			150: "<BB",
-			151: "<B",
-			152: "<B",
-			153: self.parseBuildStartNotificationAction,
-			154: "<B",
-			#155: "<iiiiiIBfh",
-			155: self.parseQueueExtendedPointX3g,
-			156: "<B",
-			157: "<BBBIHHIIB",
-			158: "<f"
-		}
+		self._movementCommands = (139, 142, 155) # queue extended point, new and x3g versions
+		self._movementFormat = struct.Struct("<iiiii") # x, y, z, a, b at the start of all of them
 
 	def cancel(self):
 		self._canceled = True
@@ -114,43 +149,25 @@ class PrintJobS3G(threading.Thread):
 			#Now we assume that the bed won't be clear from this point on
 			self._printer.set_bed_clear(False)
 
-			with open(self._file['filename'], 'rb') as f:
+			packets = self._openPackets()
+			try:
 				while True:
-					packet = bytearray()
-
 					try:
-						command = f.read(1)
-
-						if self._canceled or len(command) == 0:
+						if self._canceled:
 							break
 
-						packet.append(ord(command))
-
-						command = struct.unpack("B",command)
-
-						try:
-							parse = self.commandTable[command[0]]
-
-						except KeyError:
-							raise Exception("Unexpected packet type: 0x%x" % command[0])
-
-						if type(parse) == type(""):
-							packetLen = struct.calcsize(parse)
-							packetData = f.read(packetLen)
-							if len(packetData) != packetLen:
-								raise Exception("Packet incomplete when reading command 0x%x from file" % command[0])
-						else:
-							packetData = parse(f)
+						packet = packets.readPacket()
+						if packet is None:
+							break
 
-						for c in packetData:
-							packet.append(ord(c))
+						packet, position = packet
+						self._processPacket(packet)
 
 						if self.send_packet(packet):
 							self._serialLoggerEnabled and self._serialLogger.debug('{"event":"packet_sent", "data": "%s"}' % ' '.join('0x{:02x}'.format(x) for x in packet) )
 
 							now = time.time()
 							if now - lastProgressReport > self.UPDATE_INTERVAL_SECS:
-								position = f.tell()
 								self._file['position'] = position
 								self._file['progress'] = float(position) / float(self._file['size'])
 								self._printer.mcProgress()
@@ -166,6 +183,8 @@ class PrintJobS3G(threading.Thread):
 									except BufferOverflowError:
 										time.sleep(.2)
 
+									self._sender.invalidate()
+
 							if self._printer._heatingUp and now - lastHeatingCheck > self.UPDATE_INTERVAL_SECS:
 								lastHeatingCheck = now
 
@@ -183,6 +202,10 @@ class PrintJobS3G(threading.Thread):
 					except ProtocolError as e:
 						self._logger.warn('ProtocolError: %s' % e)
 
+			finally:
+				packets.close()
+				self._logger.info(self._sender.summary())
+
 			self._printer._comm.build_end_notification()
 
 			if self._canceled:
@@ -270,142 +293,61 @@ class PrintJobS3G(threading.Thread):
 			eventManager().fire(Events.ERROR, {"error": self._errorValue })
 			self._logger.error(self._errorValue)
 
-	def send_packet(self, data):
-		while True:
-			try:
-				self._printer._comm.writer.send_action_payload(data)
-				return True
-
-			except BufferOverflowError:
-				time.sleep(.2)
+	def _openPackets(self):
+		# The spool has the packets ready to send, the x3g file is read if it's not there yet
+		spool = self._printer._spool
+		if spool and spool.filename == self._file['filename'] and spool.isReady():
+			self._logger.info('Printing from the spool of %s' % os.path.basename(self._file['filename']))
+			return spool.open()
 
-			except PacketTooBigError:
-				self._logger.warn('Printer responded with PacketTooBigError to (%s)' % ' '.join('0x{:02x}'.format(x) for x in data))
-				return False
+		return X3gReader(self._file['filename'])
 
-			except UnrecognizedCommandError:
-				self._logger.warn('The following command was ignored: %s' % ' '.join('0x{:02x}'.format(x) for x in data))
-				return False
+	def _processPacket(self, packet):
+		# packet[2] is the command, its data follows
+		command = packet[2]
 
-			except PacketLengthError as e:
-				import makerbot_driver
+		if command in self._movementCommands:
+			self._onMovement(self._movementFormat.unpack_from(buffer(packet), 3))
 
-				if data[0] == makerbot_driver.constants.host_action_command_dict['BUILD_START_NOTIFICATION']:
-					#we put out a warning here and ignore. There's a bug in the version of GPX that ships with Simplify 3D that allows
-					#this command to go over the 32 bytes of max package
-					self._logger.warn('Build name too long. Skipping Build Start Notification -  "%s"' % data[3:])
-					return False
+		elif command == 135: # wait for tool
+			self._onHeatingWait()
+			self._heatingTool = True
 
-				raise e
+		elif command == 141: # wait for platform
+			self._onHeatingWait()
+			self._heatingPlatform = True
 
-	# ~~~ Slightly modified code for parsing from https://github.com/jetty840/ReplicatorG/blob/master/scripts/s3g-decompiler.py
+		elif command == 134: # change tool
+			self._printer.changeTool(packet[3])
 
-	def parseToolAction(self, s3gFile):
-		packetStr = s3gFile.read(3)
-		if len(packetStr) != 3:
-			raise Exception("Incomplete s3g file during tool command parse")
-		(index,command,payload) = struct.unpack("<BBB",packetStr)
+	def send_packet(self, data):
+		try:
+			self._sender.send(data)
+			return True
 
-		contents = s3gFile.read(payload)
-		if len(contents) != payload:
-			raise Exception("Incomplete s3g file: tool packet truncated")
-		return packetStr + contents
+		except PacketTooBigError:
+			self._logger.warn('Printer responded with PacketTooBigError to (%s)' % ' '.join('0x{:02x}'.format(x) for x in data))
+			return False
 
-	def parseWaitForToolAction(self, s3gFile):
-		packetLen = struct.calcsize("<BHH")
-		packetData = s3gFile.read(packetLen)
-		if len(packetData) != packetLen:
-			raise Exception("Packet incomplete")
+		except UnrecognizedCommandError:
+			self._logger.warn('The following command was ignored: %s' % ' '.join('0x{:02x}'.format(x) for x in data))
+			return False
 
+	def _onHeatingWait(self):
 		if not self._printer._heatingUp:
 			self._printer._heatingUp = True
 			self._printer.mcHeatingUpUpdate(True)
 			self._heatupWaitStartTime = time.time()
 
-		self._heatingTool = True
-		return packetData
-
-	def parseWaitForPlatformAction(self, s3gFile):
-		packetLen = struct.calcsize("<BHH")
-		packetData = s3gFile.read(packetLen)
-		if len(packetData) != packetLen:
-			raise Exception("Packet incomplete")
-
-		if not self._printer._heatingUp:
-			self._printer._heatingUp = True
-			self._printer.mcHeatingUpUpdate(True)
-			self._heatupWaitStartTime = time.time()
-
-		self._heatingPlatform = True
-		return packetData
-
-	def parseDisplayMessageAction(self, s3gFile):
-		packetStr = s3gFile.read(4)
-		if len(packetStr) < 4:
-			raise Exception("Incomplete s3g file during tool command parse")
-		message = ""
-		while True:
-		   	c = s3gFile.read(1)
-			message += c
-			if c == '\0':
-			  	break
-
-		return packetStr + message
-
-	def parseBuildStartNotificationAction(self, s3gFile):
-		packetStr = s3gFile.read(4)
-		if len(packetStr) < 4:
-			raise Exception("Incomplete s3g file during tool command parse")
-		buildName = ""
-		while True:
-			c = s3gFile.read(1)
-			buildName += c
-			if c == '\0':
-				break
-
-		return packetStr + buildName
-
-	def parseMovement(self, s3gFile, format):
-		packetLen = struct.calcsize(format)
-		packetData = s3gFile.read(packetLen)
-		if len(packetData) != packetLen:
-			raise Exception("Packet incomplete")
-
-		unpacked = struct.unpack(format, buffer(packetData))
-
-		if unpacked[2] != self._currentZ:
-			self._currentZ = unpacked[2]
-			self._printer.mcZChange(float(unpacked[2])/float(self._printer._profile.values['axes']['Z']['steps_per_mm']))
+	def _onMovement(self, position):
+		if position[2] != self._currentZ:
+			self._currentZ = position[2]
+			self._printer.mcZChange(float(position[2])/float(self._printer._profile.values['axes']['Z']['steps_per_mm']))
 		elif self._currentZ != self._lastLayerHeight \
-			and (unpacked[3] < 0 or unpacked[4] < 0): #add check for extrusion to avoid counting visited layers
+			and (position[3] < 0 or position[4] < 0): #add check for extrusion to avoid counting visited layers
 
 			if self._currentZ > self._lastLayerHeight:
 				self._currentLayer += 1
 				self._printer.mcLayerChange(self._currentLayer)
 
 			self._lastLayerHeight = self._currentZ
-
-		return packetData, unpacked
-
-	def parseQueueExtendedPoint(self, s3gFile):
-		raw, unpacked = self.parseMovement(s3gFile, "<iiiiiI")
-		return raw
-
-	def parseQueueExtendedPointNew(self, s3gFile):
-		raw, unpacked = self.parseMovement(s3gFile, "<iiiiiIB")
-		return raw
-
-	def parseQueueExtendedPointX3g(self, s3gFile):
-		raw, unpacked = self.parseMovement(s3gFile, "<iiiiiIBfh")
-		return raw
-
-	def parseChangeTool(self, s3gFile):
-		packetLen = struct.calcsize("<B")
-		packetData = s3gFile.read(packetLen)
-		if len(packetData) != packetLen:
-			raise Exception("Packet incomplete")
-
-		toolId = struct.unpack("<B", buffer(packetData))[0]
-		self._printer.changeTool(toolId)
-
-		return packetData
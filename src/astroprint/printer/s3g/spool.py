@@ -0,0 +1,227 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+__author__ = "AstroPrint Product Team <product@astroprint.com>"
+__license__ = "GNU Affero General Public License http://www.gnu.org/licenses/agpl.html"
+__copyright__ = "Copyright (C) 2016-2020 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
+
+import os
+import mmap
+import struct
+import logging
+
+import makerbot_driver
+
+from astroprint.printer.spool import PrintFileSpool, SpoolAborted
+
+# ~~~ From https://github.com/jetty840/ReplicatorG/blob/master/scripts/s3g-decompiler.py
+
+# Size of the payload of each command after the command byte: the python struct description of its data or,
+# for the commands of variable size, the name of the X3gReader method that finds it.
+# REMINDER: all values are little-endian.
+COMMAND_FORMATS = {
+	129: "<iiiI",
+	130: "<iii",
+	131: "<BIH",
+	132: "<BIH",
+	133: "<I",
+	134: "<B", # change tool
+	135: "<BHH", # wait for tool
+	136: "_toolActionLength",
+	137: "<B",
+	138: "<H",
+	139: "<iiiiiI", # queue extended point
+	140: "<iiiii",
+	141: "<BHH", # wait for platform
+	142: "<iiiiiIB", # queue extended point new
+	143: "<b",
+	144: "<b",
+	145: "<BB",
+	146: "<BBBBB",
+	147: "<HHB",
+	148: "<BHB",
+	149: "_displayMessageLength",
+	150: "<BB",
+	151: "<B",
+	152: "<B",
+	153: "_buildStartNotificationLength",
+	154: "<B",
+	155: "<iiiiiIBfh", # queue extended point x3g
+	156: "<B",
+	157: "<BBBIHHIIB",
+	158: "<f"
+}
+
+class X3gFormatError(Exception):
+	pass
+
+def framePacket(payload):
+	"""
+	The packet to send the given payload to the printer (header, length, payload and CRC) as a bytearray
+	"""
+	return makerbot_driver.Encoder.encode_payload(payload)
+
+class X3gReader(object):
+	"""
+	Splits an x3g file in the payloads of its commands. The file is memory mapped and each command is found with
+	the size of its data instead of reading it byte by byte.
+	"""
+
+	def __init__(self, filename):
+		self._logger = logging.getLogger(__name__)
+		self._file = open(filename, "rb")
+		self.size = os.fstat(self._file.fileno()).st_size
+		self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else ""
+		self._lengths = {}
+		for command, format in COMMAND_FORMATS.iteritems():
+			self._lengths[command] = getattr(self, format) if format.startswith("_") else struct.calcsize(format)
+
+		self.pos = 0
+
+	def close(self):
+		if self._map:
+			self._map.close()
+			self._map = ""
+
+		self._file.close()
+
+	def readPayload(self):
+		"""
+		Returns the payload of the next command, or None at the end of the file
+		"""
+		pos = self.pos
+		if pos >= self.size:
+			return None
+
+		command = ord(self._map[pos])
+
+		try:
+			length = self._lengths[command]
+		except KeyError:
+			raise X3gFormatError("Unexpected packet type: 0x%x" % command)
+
+		if not isinstance(length, int):
+			length = length(pos + 1)
+
+		end = pos + 1 + length
+		if end > self.size:
+			raise X3gFormatError("Packet incomplete when reading command 0x%x from file" % command)
+
+		self.pos = end
+		return self._map[pos:end]
+
+	def readPacket(self):
+		"""
+		Returns the next command as a packet ready to send and the position in the file after it, or None at
+		the end of the file
+		"""
+		while True:
+			payload = self.readPayload()
+			if payload is None:
+				return None
+
+			try:
+				return framePacket(payload), self.pos
+
+			except makerbot_driver.errors.PacketLengthError:
+				if ord(payload[0]) == makerbot_driver.constants.host_action_command_dict['BUILD_START_NOTIFICATION']:
+					#we put out a warning here and ignore. There's a bug in the version of GPX that ships with Simplify 3D that allows
+					#this command to go over the 32 bytes of max package
+					self._logger.warn('Build name too long. Skipping Build Start Notification -  "%s"' % payload[5:])
+					continue
+
+				raise
+
+	def _toolActionLength(self, pos):
+		if pos + 3 > self.size:
+			raise X3gFormatError("Incomplete s3g file during tool command parse")
+
+		return 3 + ord(self._map[pos + 2])
+
+	def _nullTerminatedLength(self, pos, headerLength):
+		if pos + headerLength > self.size:
+			raise X3gFormatError("Incomplete s3g file during tool command parse")
+
+		end = self._map.find("\0", pos + headerLength)
+		if end < 0:
+			raise X3gFormatError("Incomplete s3g file: unterminated string")
+
+		return end + 1 - pos
+
+	def _displayMessageLength(self, pos):
+		return self._nullTerminatedLength(pos, 4)
+
+	def _buildStartNotificationLength(self, pos):
+		return self._nullTerminatedLength(pos, 4)
+
+class X3gSpool(PrintFileSpool):
+	"""
+	The commands of an x3g file already framed as packets (header, length, payload and CRC), made when the file is
+	selected so that printing it only takes reading each packet and writing it to the printer.
+
+	Two side files are written to the spool folder:
+
+	  - <name>.pkt: the packets one after the other.
+	  - <name>.pdx: a header followed by one record per packet with its length and the offset in the x3g file right
+	    after it.
+	"""
+
+	MAGIC = "APXP"
+	VERSION = 1
+	RECORD = struct.Struct("<QB") # source offset, packet length
+
+	DATA_EXTENSION = ".pkt"
+	INDEX_EXTENSION = ".pdx"
+
+	def _createReader(self, dataFile, indexFile):
+		return X3gSpoolReader(dataFile, indexFile, self.recordCount)
+
+	def _writeRecords(self, packets, index):
+		count = 0
+		packRecord = self.RECORD.pack
+		reader = X3gReader(self.filename)
+
+		try:
+			while True:
+				if self._abort:
+					raise SpoolAborted()
+
+				packet = reader.readPacket()
+				if packet is None:
+					break
+
+				packet, filepos = packet
+				packets.write(packet)
+				index.write(packRecord(filepos, len(packet)))
+				count += 1
+
+		finally:
+			reader.close()
+
+		return count
+
+class X3gSpoolReader(object):
+	def __init__(self, packetsFile, indexFile, packetCount):
+		self._packets = open(packetsFile, "rb")
+		self._index = open(indexFile, "rb")
+		self._index.seek(X3gSpool.HEADER.size)
+		self._unpackRecord = X3gSpool.RECORD.unpack
+		self._recordSize = X3gSpool.RECORD.size
+
+		self.packetCount = packetCount
+
+	def readPacket(self):
+		"""
+		Returns the next packet and the position in the x3g file after it, or None at the end of the spool
+		"""
+		record = self._index.read(self._recordSize)
+		if len(record) < self._recordSize:
+			return None
+
+		filepos, length = self._unpackRecord(record)
+		return bytearray(self._packets.read(length)), filepos
+
+	def close(self):
+		self._packets.close()
+		self._index.close()
@@ -0,0 +1,131 @@
+# coding=utf-8
+__author__ = "AstroPrint Product Team <product@astroprint.com>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016-2020 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
+
+# Packets per second, and CPU time per packet, that an x3g file is sent at through the StreamWriter of
+# makerbot_driver: framing each command while printing, the way a print starts when its spool isn't ready, and
+# reading the packets already framed from the spool.
+#
+# The printer is a stand-in port that answers every packet with SUCCESS right away, so the numbers are the cost of
+# sending on the AstroBox side only.
+#
+# Run from the src folder:
+#
+#   PYTHONPATH=.:ext python astroprint/printer/s3g/tests/benchmark_spool.py [commands]
+
+import os
+import sys
+import time
+import random
+import struct
+import tempfile
+import threading
+
+import makerbot_driver
+
+from makerbot_driver.Writer.StreamWriter import StreamWriter
+
+from octoprint.settings import settings
+
+from astroprint.printer.s3g.spool import X3gReader, X3gSpool
+
+class LoopbackPort(object):
+	def __init__(self):
+		self._response = str(makerbot_driver.Encoder.encode_payload(bytearray([makerbot_driver.constants.response_code_dict['SUCCESS']])))
+		self._buffer = ''
+
+	def write(self, data):
+		self._buffer += self._response
+
+	def read(self, size=1):
+		data = self._buffer[:size]
+		self._buffer = self._buffer[size:]
+		return data
+
+	def flush(self):
+		pass
+
+	def flushInput(self):
+		self._buffer = ''
+
+def writeX3g(commands):
+	# mostly moves, like a sliced file, with some tool actions, messages and tool changes
+	random.seed(1)
+	fd, filename = tempfile.mkstemp(suffix=".x3g")
+	with os.fdopen(fd, "wb") as f:
+		for i in xrange(commands):
+			r = random.random()
+			if r < 0.85:
+				f.write(chr(155) + struct.pack('<iiiiiIBfh', i, i, i // 100, -i, 0, 100, 1, 1.0, 5))
+			elif r < 0.9:
+				f.write(chr(139) + struct.pack('<iiiiiI', i, i, i // 100, 0, 0, 100))
+			elif r < 0.95:
+				f.write(chr(136) + struct.pack('<BBBh', 0, 3, 2, 220))
+			elif r < 0.97:
+				f.write(chr(149) + struct.pack('<BBBB', 0, 0, 0, 0) + 'Layer %d\0' % (i // 100))
+			else:
+				f.write(chr(134) + chr(i % 2))
+
+	return filename
+
+def framedPackets(filename):
+	# the packets as the print job frames them when there's no spool
+	reader = X3gReader(filename)
+	try:
+		while True:
+			packet = reader.readPacket()
+			if packet is None:
+				return
+
+			yield packet
+
+	finally:
+		reader.close()
+
+def spooledPackets(spool):
+	reader = spool.open()
+	try:
+		while True:
+			packet = reader.readPacket()
+			if packet is None:
+				return
+
+			yield packet
+
+	finally:
+		reader.close()
+
+def measure(packets):
+	writer = StreamWriter(LoopbackPort(), threading.Condition())
+	count = 0
+
+	start = time.time()
+	startCpu = time.clock()
+	for packet, filepos in packets:
+		writer.send_packet(packet)
+		count += 1
+
+	elapsed = time.time() - start
+	return count / elapsed, (time.clock() - startCpu) * 1000000.0 / count
+
+def main(commands=200000):
+	settings(init=True, basedir=tempfile.mkdtemp())
+	filename = writeX3g(commands)
+
+	try:
+		start = time.time()
+		spool = X3gSpool(filename)
+		spool.prepare()
+		spool._worker.join()
+		print "spooled %d packets in %.1f secs" % (spool.recordCount, time.time() - start)
+
+		for name, packets in (("framed", framedPackets(filename)), ("spooled", spooledPackets(spool))):
+			packetsPerSecond, cpuPerPacket = measure(packets)
+			print "%-10s %8.0f packets/sec %6.1f us CPU/packet" % (name, packetsPerSecond, cpuPerPacket)
+
+	finally:
+		os.remove(filename)
+
+if __name__ == "__main__":
+	main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,187 @@
+# coding=utf-8
+
+from __future__ import absolute_import
+
+__author__ = "AstroPrint Product Team <product@astroprint.com>"
+__license__ = "GNU Affero General Public License http://www.gnu.org/licenses/agpl.html"
+__copyright__ = "Copyright (C) 2016-2020 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
+
+import os
+import struct
+import logging
+import tempfile
+import threading
+
+from octoprint.settings import settings
+from octoprint.util import safeRename, silentRemove
+
+class SpoolAborted(Exception):
+	pass
+
+class PrintFileSpool(object):
+	"""
+	Pre-processed copy of a print file, made in the background when the file is selected so that printing it only
+	takes buffered reads.
+
+	Two side files are written to the spool folder, named after the print file with the extensions of the class:
+
+	  - DATA_EXTENSION: what is sent to the printer, written by _writeRecords().
+	  - INDEX_EXTENSION: a header followed by one RECORD per command, also written by _writeRecords().
+
+	The header has the size and modification time of the print file, the spool is built again when they change.
+	"""
+
+	MAGIC = None
+	VERSION = 1
+	HEADER = struct.Struct("<4sBQdQ") # magic, version, source size, source mtime, number of records
+	RECORD = None
+
+	DATA_EXTENSION = None
+	INDEX_EXTENSION = None
+
+	KEEP_SPOOLS = 3 # Spools of previously selected files to keep around
+
+	def __init__(self, filename):
+		self._logger = logging.getLogger(__name__)
+		self.filename = filename
+
+		spoolFolder = settings().getBaseFolder("spool")
+		spoolBase = os.path.join(spoolFolder, os.path.basename(filename))
+		self._dataFile = spoolBase + self.DATA_EXTENSION
+		self._indexFile = spoolBase + self.INDEX_EXTENSION
+
+		self._ready = threading.Event()
+		self._abort = False
+		self._worker = None
+		self.recordCount = None
+
+	def prepare(self):
+		"""
+		Makes sure there's an up to date spool for the file, building it in the background if needed.
+		"""
+		if self._loadHeader():
+			self._ready.set()
+			return
+
+		self._worker = threading.Thread(target=self._work)
+		self._worker.daemon = True
+		self._worker.start()
+
+	def isReady(self):
+		return self._ready.is_set()
+
+	def abort(self):
+		self._abort = True
+
+	def open(self):
+		if not self.isReady():
+			raise ValueError("Spool for %s is not ready" % self.filename)
+
+		return self._createReader(self._dataFile, self._indexFile)
+
+	# Implement these in the children classes
+
+	#
+	# Writes the data and the index records of the print file to the given open files, raising SpoolAborted as soon
+	# as _abort is set
+	#
+	# Returns: the number of records written
+	#
+	def _writeRecords(self, dataFile, indexFile):
+		raise NotImplementedError()
+
+	#
+	# Returns: the reader of a spool that's ready
+	#
+	def _createReader(self, dataFile, indexFile):
+		raise NotImplementedError()
+
+	def _sourceStat(self):
+		statResult = os.stat(self.filename)
+		return statResult.st_size, statResult.st_mtime
+
+	def _loadHeader(self):
+		if not os.path.isfile(self._indexFile) or not os.path.isfile(self._dataFile):
+			return False
+
+		try:
+			with open(self._indexFile, "rb") as f:
+				magic, version, size, mtime, count = self.HEADER.unpack(f.read(self.HEADER.size))
+
+		except (IOError, struct.error):
+			return False
+
+		if magic != self.MAGIC or version != self.VERSION or (size, mtime) != self._sourceStat():
+			return False
+
+		self.recordCount = count
+		return True
+
+	def _work(self):
+		try:
+			self._build()
+			self._removeOldSpools()
+			self._ready.set()
+
+		except SpoolAborted:
+			self._logger.debug("Spooling of %s aborted" % self.filename)
+
+		except Exception:
+			self._logger.error("Unable to spool %s, it will be printed from the original file" % self.filename, exc_info=True)
+
+	def _build(self):
+		self._logger.debug("Spooling %s" % self.filename)
+
+		size, mtime = self._sourceStat()
+
+		# a spool of the same file can be building in the background when it's selected again, each one writes
+		# its own files
+		dataTmp = indexTmp = None
+
+		try:
+			dataTmp = self._tempFile(self._dataFile)
+			indexTmp = self._tempFile(self._indexFile)
+
+			with open(dataTmp, "wb") as data, open(indexTmp, "wb") as index:
+				index.write(self.HEADER.pack(self.MAGIC, self.VERSION, size, mtime, 0))
+
+				count = self._writeRecords(data, index)
+
+				index.seek(0)
+				index.write(self.HEADER.pack(self.MAGIC, self.VERSION, size, mtime, count))
+
+			if self._abort:
+				raise SpoolAborted()
+
+			# the index goes last, a valid index means the data file is complete
+			safeRename(dataTmp, self._dataFile)
+			safeRename(indexTmp, self._indexFile)
+
+		except:
+			for tmp in (dataTmp, indexTmp):
+				if tmp is not None:
+					silentRemove(tmp)
+
+			raise
+
+		self.recordCount = count
+		self._logger.debug("Spooled %d records from %s" % (count, self.filename))
+
+	def _tempFile(self, path):
+		fd, tmp = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=os.path.dirname(path))
+		os.close(fd)
+		return tmp
+
+	def _removeOldSpools(self):
+		folder = os.path.dirname(self._indexFile)
+		spools = []
+		for f in os.listdir(folder):
+			if f.endswith(self.INDEX_EXTENSION):
+				path = os.path.join(folder, f)
+				if path != self._indexFile:
+					spools.append((os.stat(path).st_mtime, path[:-len(self.INDEX_EXTENSION)]))
+
+		spools.sort(reverse=True)
+		for mtime, base in spools[self.KEEP_SPOOLS - 1:]:
+			silentRemove(base + self.INDEX_EXTENSION)
+			silentRemove(base + self.DATA_EXTENSION)
@@ -0,0 +1,196 @@
+# coding=utf-8
+__author__ = "AstroPrint Product Team <product@astroprint.com>"
+__license__ = "GNU Affero General Public License http://www.gnu.org/licenses/agpl.html"
+__copyright__ = "Copyright (C) 2016-2019 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
+
+import threading
+
+from array import array
+
+NAN = float('nan')
+
+class TemperatureHistory(object):
+	"""
+	Temperature reports kept in fixed size numeric columns (time and actual/target of each tool and the bed) instead
+	of a dict per sample.
+
+	The reports are kept at several resolutions (tiers): the first one keeps every report and the others the
+	average of the reports in each period, so that a long print fits in a small amount of memory. Samples are
+	only turned into dicts when they're read.
+	"""
+
+	TIERS = (
+		(0, 300), # every report
+		(10, 360), # 10 secs, 1 hour
+		(60, 1440) # 1 min, 24 hours
+	)
+
+	def __init__(self, tiers=TIERS):
+		self._lock = threading.Lock()
+		self._rings = [_Ring(resolution, capacity) for resolution, capacity in tiers]
+		self._columns = [] # heater names ("tool0", "bed"...) in the order they were first reported
+		self._latest = None
+
+	def __len__(self):
+		return len(self._rings[0])
+
+	@property
+	def sequence(self):
+		"""
+		Number of reports added so far, pass it to samplesSince() to get the reports added after this point
+		"""
+		return self._rings[0].total
+
+	@property
+	def resolutions(self):
+		return [r.resolution for r in self._rings]
+
+	def add(self, timestamp, temp, bedTemp):
+		"""
+		Adds a report: temp is a dict of tool number -> (actual, target) and bedTemp an (actual, target) tuple, any
+		of them can be None
+		"""
+		values = {}
+		if temp is not None:
+			for tool in temp.keys():
+				values["tool%d" % tool] = temp[tool]
+
+		if bedTemp is not None and isinstance(bedTemp, tuple):
+			values["bed"] = bedTemp
+
+		with self._lock:
+			for name in values.keys():
+				if name not in self._columns:
+					self._columns.append(name)
+					for ring in self._rings:
+						ring.addColumn(name)
+
+			for ring in self._rings:
+				ring.add(timestamp, values)
+
+			self._latest = None
+
+	def latest(self):
+		"""
+		The last report as a dict or None if there are no reports
+		"""
+		with self._lock:
+			if self._latest is None:
+				ring = self._rings[0]
+				if len(ring):
+					self._latest = ring.sample(len(ring) - 1, self._columns)
+
+			return self._latest
+
+	def samples(self, limit=None, resolution=0):
+		"""
+		The last limit samples, oldest first, from the tier with the given resolution in seconds (0 for every report)
+		"""
+		with self._lock:
+			ring = self._ringFor(resolution)
+			count = len(ring) if limit is None else max(0, min(limit, len(ring)))
+			return [ring.sample(i, self._columns) for i in xrange(len(ring) - count, len(ring))]
+
+	def samplesSince(self, sequence):
+		"""
+		The reports added since the given sequence (None for all the ones kept) and the sequence to use next time
+		"""
+		with self._lock:
+			ring = self._rings[0]
+			count = len(ring) if sequence is None else max(0, min(ring.total - sequence, len(ring)))
+			return [ring.sample(i, self._columns) for i in xrange(len(ring) - count, len(ring))], ring.total
+
+	def _ringFor(self, resolution):
+		for ring in self._rings:
+			if ring.resolution >= resolution:
+				return ring
+
+		return self._rings[-1]
+
+class _Ring(object):
+	def __init__(self, resolution, capacity):
+		self.resolution = resolution
+		self.capacity = capacity
+		self.total = 0 # samples ever added
+
+		self._times = array('d', [0.0] * capacity)
+		self._actual = {}
+		self._target = {}
+
+		# average of the period being collected
+		self._bucket = None
+		self._bucketTime = None
+		self._bucketCount = 0
+		self._bucketSums = {}
+		self._bucketTargets = {}
+
+	def __len__(self):
+		return min(self.total, self.capacity)
+
+	def addColumn(self, name):
+		self._actual[name] = array('d', [NAN] * self.capacity)
+		self._target[name] = array('d', [NAN] * self.capacity)
+
+	def add(self, timestamp, values):
+		if not self.resolution:
+			self._push(timestamp, values)
+			return
+
+		bucket = int(timestamp // self.resolution)
+		if bucket != self._bucket:
+			self._flushBucket()
+			self._bucket = bucket
+
+		self._bucketTime = timestamp
+		self._bucketCount += 1
+		for name, (actual, target) in values.iteritems():
+			count, total = self._bucketSums.get(name, (0, 0.0))
+			if actual is not None:
+				self._bucketSums[name] = (count + 1, total + actual)
+
+			if target is not None or name not in self._bucketTargets:
+				self._bucketTargets[name] = target
+
+	def _flushBucket(self):
+		if self._bucketCount:
+			# a heater that only reported its target in the period is kept, without an actual
+			values = {}
+			for name, target in self._bucketTargets.iteritems():
+				count, total = self._bucketSums.get(name, (0, 0.0))
+				values[name] = (total / count if count else None, target)
+
+			self._push(self._bucketTime, values)
+
+		self._bucketCount = 0
+		self._bucketSums = {}
+		self._bucketTargets = {}
+
+	def _push(self, timestamp, values):
+		i = self.total % self.capacity
+		self._times[i] = timestamp
+		for name in self._actual.keys():
+			actual, target = values.get(name, (None, None))
+			self._actual[name][i] = NAN if actual is None else actual
+			self._target[name][i] = NAN if target is None else target
+
+		self.total += 1
+
+	def sample(self, n, columns):
+		"""
+		The n-th of the samples kept (0 is the oldest) as a dict like the temperature reports
+		"""
+		i = (self.total - len(self) + n) % self.capacity
+		data = {
+			"time": int(self._times[i])
+		}
+
+		for name in columns:
+			actual = self._actual[name][i]
+			target = self._target[name][i]
+			if actual == actual or target == target: # not both NaN
+				data[name] = {
+					"actual": actual if actual == actual else None,
+					"target": target if target == target else None
+				}
+
+		return data
@@ -0,0 +1,39 @@
+import unittest
+
+from astroprint.printer.temperatures import TemperatureHistory
+
+class TemperatureHistoryTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.history = TemperatureHistory(((0, 10), (10, 10)))
+
+	def test_heater_with_only_a_target_is_reported(self):
+		self.history.add(100, {0: (None, 210.0)}, (60.5, None))
+
+		self.assertEqual(self.history.latest(), {
+			"time": 100,
+			"tool0": {"actual": None, "target": 210.0},
+			"bed": {"actual": 60.5, "target": None}
+		})
+
+	def test_heater_without_actual_or_target_is_left_out(self):
+		self.history.add(100, {0: (None, None)}, (60.5, 70.0))
+
+		self.assertEqual(self.history.latest(), {
+			"time": 100,
+			"bed": {"actual": 60.5, "target": 70.0}
+		})
+
+	def test_averaged_tier_keeps_the_target_without_actual(self):
+		self.history.add(100, {0: (None, 210.0)}, (50.0, 70.0))
+		self.history.add(105, {0: (None, None)}, (60.0, 70.0))
+		self.history.add(110, {0: (200.0, 215.0)}, (65.0, 70.0)) # next period, flushes the first one
+
+		self.assertEqual(self.history.samples(resolution=10), [{
+			"time": 105,
+			"tool0": {"actual": None, "target": 210.0},
+			"bed": {"actual": 55.0, "target": 70.0}
+		}])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -3,17 +3,22 @@ __author__ = "AstroPrint Product Team <product@astroprint.com> based on work by
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 import os
-import Queue
 import threading
 import yaml
 import time
+import copy
 import octoprint.util as util
 
+from collections import deque
+
 from octoprint.settings import settings
 from octoprint.events import eventManager, Events
 
 from werkzeug.utils import secure_filename
 
+from astroprint.printfiles.analysiscache import AnalysisCache, contentHasher, fileContentHash
+from astroprint.printfiles.catalog import FileCatalog
+
 class FileDestinations(object):
 	SDCARD = "sdcard"
 	LOCAL = "local"
@@ -44,13 +49,20 @@ class PrintFilesManager(object):
 		self._metadataTempFile = os.path.join(self._uploadFolder, "metadata.yaml.tmp")
 		self._metadataFileAccessMutex = threading.Lock()
 
+		self._analysisCache = AnalysisCache(self._settings.getBaseFolder("analysis"), self._settings.getInt(["analysisCache", "maxEntries"]))
+		self._analysisHashes = {} # basename -> content hash of the files being analyzed
+
+		self._catalog = FileCatalog()
+
 		self._loadMetadata(migrate=True)
+		self._loadCatalog()
 		self._processAnalysisBacklog()
 
 	def rampdown(self):
 		del self._callbacks
 		self._metadataAnalyzer.stop()
-		self._metadataAnalyzer._worker.join()
+		self._metadataAnalyzer.join()
+		self._analysisCache.flush()
 
 	def isValidFilename(self, filename):
 		return "." in filename and filename.rsplit(".", 1)[1].lower() in self.SUPPORTED_EXTENSIONS
@@ -59,20 +71,81 @@ class PrintFilesManager(object):
 		return "." in filename and filename.rsplit(".", 1)[1].lower() in self.SUPPORTED_DESIGN_EXTENSIONS
 
 	def _processAnalysisBacklog(self):
-		for osFile in os.listdir(self._uploadFolder):
-			filename = self._getBasicFilename(osFile)
+		backlog = []
+		for filename in self._catalog.names():
 			if not self.isValidFilename(filename):
 				continue
 
-			absolutePath = self.getAbsolutePath(filename)
-			if absolutePath is None:
-				continue
-
-			fileData = self.getFileData(filename)
+			fileData = self._catalog.get(filename)
 			if fileData is not None and "gcodeAnalysis" in fileData:
 				continue
 
-			self._metadataAnalyzer.addFileToBacklog(filename)
+			backlog.append(filename)
+
+		if backlog:
+			self._metadataAnalyzer.addFilesToBacklog(backlog)
+
+	def _loadCatalog(self):
+		self._catalog.clear()
+		for osFile in os.listdir(self._uploadFolder):
+			self._updateCatalog(osFile)
+
+		self._logger.info("%d print files found" % len(self._catalog))
+
+	def _updateCatalog(self, filename):
+		"""
+		Reads the data of the given file again and stores it in the catalog, removing it if it's no longer there.
+		Returns the new file data or None
+		"""
+		filename = self._getBasicFilename(filename)
+		fileData = self._readFileData(filename)
+
+		if fileData is None:
+			self._catalog.remove(filename)
+		else:
+			self._catalog.set(filename, fileData)
+
+		return fileData
+
+	def _applyCachedAnalysis(self, filename, contentHash=None):
+		"""
+		Called by the analyzer before analyzing a file. If a file with the same content was analyzed before, its
+		results are used and True is returned.
+		"""
+		basename = os.path.basename(filename)
+
+		absolutePath = self.getAbsolutePath(basename)
+		if absolutePath is None:
+			return False
+
+		if contentHash is None:
+			contentHash = self._analysisHashes.get(basename)
+
+			if contentHash is None:
+				try:
+					contentHash = fileContentHash(absolutePath)
+				except IOError:
+					self._logger.warn("Unable to hash %s, it will be analyzed" % basename, exc_info=True)
+					return False
+
+		analysisResult = self._analysisCache.get(contentHash)
+		if analysisResult is None:
+			self._analysisHashes[basename] = contentHash
+			return False
+
+		self._logger.debug("Analysis of %s found in cache" % basename)
+
+		analysisResult = copy.deepcopy(analysisResult)
+		metadata = self.getFileMetadata(basename)
+		metadata["gcodeAnalysis"] = analysisResult
+		metadata["contentHash"] = contentHash
+		self._metadata[basename] = metadata
+		self._metadataDirty = True
+		self._saveMetadata()
+		self._updateCatalog(basename)
+
+		eventManager().fire(Events.METADATA_ANALYSIS_FINISHED, {"file": basename, "result": analysisResult})
+		return True
 
 	def _onMetadataAnalysisFinished(self, filename, results):
 
@@ -80,6 +153,7 @@ class PrintFilesManager(object):
 			return
 
 		basename = os.path.basename(filename)
+		contentHash = self._analysisHashes.pop(basename, None)
 
 		absolutePath = self.getAbsolutePath(basename)
 		if absolutePath is None:
@@ -141,9 +215,14 @@ class PrintFilesManager(object):
 		if dirty:
 			metadata = self.getFileMetadata(basename)
 			metadata["gcodeAnalysis"] = analysisResult
+			if contentHash:
+				metadata["contentHash"] = contentHash
+				self._analysisCache.set(contentHash, copy.deepcopy(analysisResult), getattr(results, "layerIndex", None))
+
 			self._metadata[basename] = metadata
 			self._metadataDirty = True
 			self._saveMetadata()
+			self._updateCatalog(basename)
 
 		eventManager().fire(Events.METADATA_ANALYSIS_FINISHED, {"file": basename, "result": analysisResult})
 
@@ -231,10 +310,15 @@ class PrintFilesManager(object):
 		if absolutePath is None or (not slicerEnabled and not valid):
 			return None, True
 
-		file.save(absolutePath)
+		# hash it as it's written so that the analysis doesn't need to read it again to look it up in the cache
+		contentHash = contentHasher()
+		with open(absolutePath, "wb") as dst:
+			for chunk in iter(lambda: file.stream.read(1048576), ""):
+				contentHash.update(chunk)
+				dst.write(chunk)
 
 		if valid:
-			return self.processPrintFile(absolutePath, destination, uploadCallback), True
+			return self.processPrintFile(absolutePath, destination, uploadCallback, contentHash.hexdigest()), True
 		else:
 			return filename, False
 
@@ -260,7 +344,7 @@ class PrintFilesManager(object):
 
 		return self._getBasicFilename(absolutePath)
 
-	def processPrintFile(self, absolutePath, destination, uploadCallback=None):
+	def processPrintFile(self, absolutePath, destination, uploadCallback=None, contentHash=None):
 		if absolutePath is None:
 			return None
 
@@ -272,7 +356,9 @@ class PrintFilesManager(object):
 			self._metadataDirty = True
 			self._saveMetadata()
 
-		self._metadataAnalyzer.addFileToQueue(os.path.basename(absolutePath))
+		self._updateCatalog(filename)
+
+		self._metadataAnalyzer.addFileToQueue(os.path.basename(absolutePath), contentHash)
 
 		if uploadCallback is not None:
 			return uploadCallback(filename, absolutePath, destination)
@@ -307,6 +393,7 @@ class PrintFilesManager(object):
 		}
 
 		self._saveMetadata()
+		self._updateCatalog(filename)
 
 		if uploadCallback is not None:
 			return uploadCallback(filename, absolutePath, destination)
@@ -342,11 +429,20 @@ class PrintFilesManager(object):
 		eventManager().fire(Events.FILE_DELETED, {"filename": filename})
 
 	def removeFileFromMetadata(self, filename):
+		self._catalog.remove(filename)
+
 		if filename in self._metadata:
 			del self._metadata[filename]
 			self._metadataDirty = True
 			self._saveMetadata()
 
+	def refreshFileData(self, filename):
+		"""
+		Called when a file in the uploads folder was created or changed by someone else than this manager (the
+		uploads folder watchdog) so that its data is read again
+		"""
+		self._updateCatalog(filename)
+
 	def getAbsolutePath(self, filename, mustExist=True):
 		"""
 		Returns the absolute path of the given filename in the correct upload folder.
@@ -374,16 +470,16 @@ class PrintFilesManager(object):
 		return secure
 
 	def getAllFilenames(self):
-		return [x["name"] for x in self.getAllFileData()]
+		return self._catalog.names()
 
 	def getAllFileData(self):
-		files = []
-		for osFile in os.listdir(self._uploadFolder):
-			fileData = self.getFileData(osFile)
-			if fileData is not None:
-				files.append(fileData)
+		return self._catalog.query()[1]
 
-		return files
+	def queryFileData(self, sortBy="date", reverse=False, offset=0, limit=None):
+		"""
+		Returns the total number of files and the data of the ones in the requested page, sorted by "date" or "name"
+		"""
+		return self._catalog.query(sortBy, reverse, offset, limit)
 
 	def getFileData(self, filename):
 		if not filename:
@@ -391,10 +487,24 @@ class PrintFilesManager(object):
 
 		filename = self._getBasicFilename(filename)
 
+		fileData = self._catalog.get(filename)
+		if fileData is None:
+			# it might not have been reported by the watchdog yet
+			fileData = self._updateCatalog(filename)
+			if fileData is not None:
+				fileData = dict(fileData)
+
+		return fileData
+
+	def _readFileData(self, filename):
 		# TODO: Make this more robust when STLs will be viewable from the client
 		if self.isDesignFileName(filename):
 			return
 
+		# only the names the files are saved with, getAbsolutePath would find another file otherwise
+		if secure_filename(filename) != filename:
+			return None
+
 		absolutePath = self.getAbsolutePath(filename)
 		if absolutePath is None:
 			return None
@@ -433,6 +543,37 @@ class PrintFilesManager(object):
 
 		return fileData
 
+	def getLayerIndex(self, filename):
+		"""
+		Returns the LayerIndex built when the file was analyzed or None if there isn't one
+		"""
+		from astroprint.printfiles.layers import LayerIndex
+
+		fmd = self._metadata.get(self._getBasicFilename(filename))
+		contentHash = fmd and fmd.get("contentHash")
+		if not contentHash:
+			return None
+
+		layersFile = self._analysisCache.layerIndexFile(contentHash)
+		if not os.path.isfile(layersFile):
+			return None
+
+		absolutePath = self.getAbsolutePath(filename)
+		if absolutePath is None:
+			return None
+
+		try:
+			layerIndex = LayerIndex.load(layersFile)
+
+		except Exception:
+			self._logger.warn("Unable to load the layer index of %s" % filename, exc_info=True)
+			return None
+
+		if layerIndex.fileSize != os.stat(absolutePath).st_size:
+			return None
+
+		return layerIndex
+
 	def getFileCloudId(self, filename):
 		if filename:
 			filename = self._getBasicFilename(filename)
@@ -445,10 +586,7 @@ class PrintFilesManager(object):
 
 	def getFileByCloudId(self, cloudId):
 		if cloudId:
-			for f in self._metadata:
-				fCloudId = self._metadata[f].get('cloud_id')
-				if fCloudId == cloudId:
-					return f
+			return self._catalog.getByCloudId(cloudId)
 
 		return None
 
@@ -470,6 +608,7 @@ class PrintFilesManager(object):
 		filename = self._getBasicFilename(filename)
 		self._metadata[filename] = metadata
 		self._metadataDirty = True
+		self._updateCatalog(filename)
 
 	def getPrintFileName(self, filename):
 		filename = self._getBasicFilename(filename)
@@ -555,94 +694,278 @@ class PrintFilesManager(object):
 
 	#~~ Child API ~~~
 
+class AnalysisJob(object):
+	"""
+	A file being analyzed by one of the MetadataAnalyzer workers. _analyzeFile passes the object doing the analysis to
+	start() so that the job can be aborted.
+	"""
+
+	def __init__(self, filename, lane):
+		self.filename = filename
+		self.lane = lane
+		self.progress = 0
+		self.aborted = False
+		self._interpreter = None
+
+	def start(self, interpreter):
+		self._interpreter = interpreter
+		if self.aborted:
+			raise AnalysisAborted()
+
+	def abort(self):
+		self.aborted = True
+		if self._interpreter is not None:
+			self._interpreter.abort()
+
+	def onProgress(self, progress):
+		self.progress = progress
+
 class MetadataAnalyzer(object):
-	def __init__(self, getPathCallback, loadedCallback):
-		self._getPathCallback = getPathCallback
-		self._loadedCallback = loadedCallback
+	"""
+	Analyzes the print files in the background. analysis.workers threads take the files from three lanes, always from
+	the first one that has files:
+
+	  - LANE_SELECTED: the file selected to print, moved here if it was waiting in another lane. When all the workers
+	    are busy the analysis of a backlog file is aborted to make room for it.
+	  - LANE_NEW: files uploaded, downloaded or copied from an external drive.
+	  - LANE_BACKLOG: files found without analysis when the manager starts.
+
+	Files are not analyzed while the printer is printing: the running analyses are aborted and their files put back at
+	the front of their lanes. The printer is checked when a print starts, pauses or ends and every PRINTER_CHECK_INTERVAL
+	seconds while there are files to analyze, which covers the drivers that don't fire all the print events.
 
-		self._active = threading.Event()
-		self._active.set()
+	Files are known by their name in the uploads folder, the paths given to the analyzer are reduced to it.
+	"""
 
-		self._currentFile = None
-		self._currentProgress = None
+	LANE_SELECTED = 0
+	LANE_NEW = 1
+	LANE_BACKLOG = 2
+
+	PRINTER_CHECK_INTERVAL = 5.0
+	PRINT_EVENTS = (Events.PRINT_STARTED, Events.PRINT_DONE, Events.PRINT_FAILED, Events.PRINT_CANCELLED, Events.PRINT_PAUSED, Events.PRINT_RESUMED)
+
+	def __init__(self, getPathCallback, loadedCallback, cachedResultCallback=None):
+		self._getPathCallback = getPathCallback
+		self._loadedCallback = loadedCallback
+		self._cachedResultCallback = cachedResultCallback
+		self._contentHashes = {}
+
+		self._condition = threading.Condition()
+		self._lanes = (deque(), deque(), deque())
+		self._queued = {} # filename -> lane of the files waiting
+		self._running = {} # filename -> AnalysisJob
+		self._paused = False
+		self._printing = False
 		self._stop = False
 
-		self._queue = Queue.PriorityQueue()
+		em = eventManager()
+		em.subscribe(Events.FILE_SELECTED, self._onFileSelected)
+		for event in self.PRINT_EVENTS:
+			em.subscribe(event, self._onPrintEvent)
 
-		self._worker = threading.Thread(target=self._work)
-		self._worker.daemon = True
-		self._worker.start()
+		self._workers = []
+		for i in range(max(1, settings().getInt(["analysis", "workers"]) or 1)):
+			worker = threading.Thread(target=self._work, name="MetadataAnalyzer-%d" % i)
+			worker.daemon = True
+			worker.start()
+			self._workers.append(worker)
 
-	def addFileToQueue(self, filename):
+		self._printerWatcher = threading.Thread(target=self._watchPrinter, name="MetadataAnalyzerPrinterWatcher")
+		self._printerWatcher.daemon = True
+		self._printerWatcher.start()
+
+	def addFileToQueue(self, filename, contentHash=None):
+		filename = os.path.basename(filename)
 		self._logger.debug("Adding file %s to analysis queue (high priority)" % filename)
-		self._queue.put((0, filename))
+		if contentHash:
+			self._contentHashes[filename] = contentHash
+
+		with self._condition:
+			self._enqueue(filename, self.LANE_NEW)
 
 	def addFileToBacklog(self, filename):
-		self._logger.debug("Adding file %s to analysis backlog (low priority)" % filename)
-		self._queue.put((100, filename))
+		self.addFilesToBacklog([filename])
+
+	def addFilesToBacklog(self, filenames):
+		with self._condition:
+			for filename in filenames:
+				self._enqueue(os.path.basename(filename), self.LANE_BACKLOG)
+
+		self._logger.debug("Added %d files to analysis backlog (low priority)" % len(filenames))
+
+	def prioritizeFile(self, filename):
+		"""
+		Moves a file waiting to be analyzed to the front of the selected file lane
+		"""
+		filename = os.path.basename(filename)
+
+		with self._condition:
+			if filename not in self._queued or self._queued[filename] == self.LANE_SELECTED:
+				return
+
+			self._logger.debug("Prioritizing analysis of file %s" % filename)
+			self._enqueue(filename, self.LANE_SELECTED, front=True)
+
+			if self._isActive() and len(self._running) >= len(self._workers):
+				# make room for it, the backlog file will be analyzed again later
+				backlog = [job for job in self._running.itervalues() if job.lane == self.LANE_BACKLOG]
+				if backlog:
+					self._logger.debug("Aborting analysis of file %s to analyze %s first" % (backlog[0].filename, filename))
+					backlog[0].abort()
 
 	def working(self):
-		return self.isActive() and not (self._queue.empty() and self._currentFile is None)
+		with self._condition:
+			return self._isActive() and bool(self._queued or self._running)
 
 	def isActive(self):
-		return self._active.is_set()
+		with self._condition:
+			return self._isActive()
 
 	def pause(self):
 		self._logger.debug("Pausing Print File analyzer")
-		self._active.clear()
+		with self._condition:
+			self._paused = True
+			self._abortRunning()
 
 	def resume(self):
 		self._logger.debug("Resuming Print File analyzer")
-		self._active.set()
+		with self._condition:
+			self._paused = False
+			self._condition.notify_all()
 
 	def stop(self):
-		self._stop = True
+		em = eventManager()
+		em.unsubscribe(Events.FILE_SELECTED, self._onFileSelected)
+		for event in self.PRINT_EVENTS:
+			em.unsubscribe(event, self._onPrintEvent)
 
-		#We might be waiting on a _queue.get()
-		#We add a fake item so that _queue.get returns and we can kill the thread
-		self._queue.put((0, None))
+		with self._condition:
+			self._stop = True
+			self._abortRunning()
+			self._condition.notify_all()
 
-		if not self._active.isSet():
-			#It's waiting on a _active.wait()
-			self._active.set()
+	def join(self):
+		for worker in self._workers:
+			worker.join()
+
+		self._printerWatcher.join()
+
+	def _isActive(self):
+		return not (self._paused or self._printing)
+
+	def _enqueue(self, filename, lane, front=False):
+		queuedLane = self._queued.get(filename)
+		if queuedLane is not None:
+			if queuedLane <= lane and not front:
+				return
+
+			self._lanes[queuedLane].remove(filename)
+
+		if front:
+			self._lanes[lane].appendleft(filename)
+		else:
+			self._lanes[lane].append(filename)
+
+		self._queued[filename] = lane
+		self._condition.notify_all()
+
+	def _abortRunning(self):
+		for job in self._running.itervalues():
+			job.abort()
+
+	def _nextJob(self):
+		# called with the condition held. A new version of a file being analyzed waits for the current analysis to finish
+		for lane, files in enumerate(self._lanes):
+			for filename in files:
+				if filename not in self._running:
+					files.remove(filename)
+					del self._queued[filename]
+					return AnalysisJob(filename, lane)
+
+		return None
 
 	def _work(self):
-		aborted = None
-		while not self._stop:
-			if aborted is not None:
-				filename = aborted
-				aborted = None
-				self._logger.debug("Got an aborted analysis job for file %s, processing this instead of first item in queue" % filename)
-			else:
-				(priority, filename) = self._queue.get()
-				if filename is None:
-					self._queue.task_done()
-					if self._stop:
-						break
-					else:
-						continue
-
-				self._logger.debug("Processing file %s from queue (priority %d)" % (filename, priority))
-
-			self._active.wait()
-
-			if self._stop:
-				break
+		while True:
+			with self._condition:
+				job = None
+				while not self._stop:
+					if self._isActive():
+						job = self._nextJob()
+						if job is not None:
+							break
+
+					self._condition.wait()
+
+				if self._stop:
+					break
+
+				self._running[job.filename] = job
+
+			self._logger.debug("Processing file %s from analysis lane %d" % (job.filename, job.lane))
 
 			try:
-				self._analyzeFile(filename)
-				self._queue.task_done()
+				if not self._useCachedResult(job.filename):
+					self._analyzeFile(job)
+
 			except AnalysisAborted:
-				aborted = filename
-				self._logger.debug("Running analysis of file %s aborted" % filename)
+				self._logger.debug("Running analysis of file %s aborted" % job.filename)
+				with self._condition:
+					if not self._stop:
+						self._enqueue(job.filename, job.lane, front=True)
+
+			except Exception:
+				self._logger.error("Unable to analyze %s" % job.filename, exc_info=True)
+
+			finally:
+				with self._condition:
+					del self._running[job.filename]
+					self._condition.notify_all()
+
+	def _watchPrinter(self):
+		while True:
+			self._checkPrinter()
+
+			with self._condition:
+				if self._stop:
+					break
+
+				if self._queued or self._running:
+					self._condition.wait(self.PRINTER_CHECK_INTERVAL)
+				else:
+					self._condition.wait()
+
+	def _checkPrinter(self):
+		# imported here, the printer manager imports this module
+		from astroprint.printer.manager import printerManager
+
+		with self._condition:
+			pm = printerManager()
+			printing = pm is not None and pm.isPrinting()
+
+			if printing != self._printing:
+				self._printing = printing
+
+				if printing:
+					self._logger.debug("Printer is printing, pausing Print File analyzer")
+					self._abortRunning()
+				else:
+					self._logger.debug("Printer is not printing, resuming Print File analyzer")
+					self._condition.notify_all()
+
+	def _onPrintEvent(self, event, payload):
+		self._checkPrinter()
+
+	def _onFileSelected(self, event, payload):
+		if payload and payload.get("file"):
+			self.prioritizeFile(payload["file"])
 
-		self._getPathCallback = None
-		self._loadedCallback = None
+	def _useCachedResult(self, filename):
+		if self._cachedResultCallback is None:
+			return False
 
-	def _onParsingProgress(self, progress):
-		self._currentProgress = progress
+		return self._cachedResultCallback(filename, self._contentHashes.pop(filename, None))
 
-	def _analyzeFile(self, filename):
+	def _analyzeFile(self, job):
 		raise NotImplementedError()
 
 class MetadataAnalyzerResults(object):
@@ -0,0 +1,131 @@
+# coding=utf-8
+__author__ = "AstroPrint Product Team <product@astroprint.com>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016-2019 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
+
+import os
+import yaml
+import hashlib
+import logging
+import threading
+
+from collections import OrderedDict
+
+import octoprint.util as util
+
+def contentHasher():
+	"""
+	Returns the hash object used to identify print files by their content. Feed it while the file is
+	written and use hexdigest() as the key for AnalysisCache
+	"""
+	return hashlib.sha1()
+
+def fileContentHash(path, blksize=1048576):
+	h = contentHasher()
+	with open(path, 'rb') as f:
+		for chunk in iter(lambda: f.read(blksize), ''):
+			h.update(chunk)
+
+	return h.hexdigest()
+
+class AnalysisCache(object):
+	"""
+	Analysis results of print files keyed by the hash of their content, so that a file that was already
+	analyzed under another name (re-downloaded, copied from USB, renamed) doesn't need to be analyzed again.
+
+	The results are kept in cache.yaml inside the given folder, the layer index of each file next to it as
+	<hash>.layers. The least recently used entries are dropped when there are more than maxEntries. Using an
+	entry only reorders them in memory, the order is saved with the next set() or by flush().
+	"""
+
+	def __init__(self, folder, maxEntries):
+		self._logger = logging.getLogger(__name__)
+		self._folder = folder
+		self._cacheFile = os.path.join(folder, "cache.yaml")
+		self._cacheTempFile = self._cacheFile + ".tmp"
+		self._maxEntries = maxEntries
+		self._entries = OrderedDict() # oldest first
+		self._lock = threading.Lock()
+		self._dirty = False # the order of the entries changed since they were saved
+
+		self._load()
+
+	def get(self, contentHash):
+		with self._lock:
+			analysis = self._entries.pop(contentHash, None)
+			if analysis is None:
+				return None
+
+			self._entries[contentHash] = analysis
+			self._dirty = True
+
+			return analysis
+
+	def set(self, contentHash, analysis, layerIndex=None):
+		with self._lock:
+			self._entries.pop(contentHash, None)
+			self._entries[contentHash] = analysis
+
+			layersFile = self.layerIndexFile(contentHash)
+			if layerIndex is not None:
+				try:
+					layerIndex.save(layersFile + ".tmp")
+					util.safeRename(layersFile + ".tmp", layersFile)
+
+				except Exception:
+					self._logger.error("Unable to save the layer index of %s" % contentHash, exc_info=True)
+					util.silentRemove(layersFile + ".tmp")
+
+			else:
+				util.silentRemove(layersFile)
+
+			self._evict()
+			self._save()
+
+	def flush(self):
+		"""
+		Saves the order in which the entries were used, if it changed
+		"""
+		with self._lock:
+			if self._dirty:
+				self._save()
+
+	def layerIndexFile(self, contentHash):
+		"""
+		Path of the layer index stored for the given content hash. The file only exists if it was stored with set()
+		"""
+		return os.path.join(self._folder, "%s.layers" % contentHash)
+
+	def _evict(self):
+		while len(self._entries) > self._maxEntries:
+			contentHash, analysis = self._entries.popitem(last=False)
+			util.silentRemove(self.layerIndexFile(contentHash))
+
+	def _load(self):
+		if not os.path.isfile(self._cacheFile):
+			return
+
+		try:
+			with open(self._cacheFile, "r") as f:
+				entries = yaml.safe_load(f)
+
+		except Exception:
+			self._logger.error("Unable to load the analysis cache, starting with an empty one", exc_info=True)
+			return
+
+		for entry in entries or []:
+			self._entries[entry["hash"]] = entry["analysis"]
+
+		self._evict()
+
+	def _save(self):
+		entries = [{"hash": h, "analysis": a} for h, a in self._entries.iteritems()]
+
+		try:
+			with open(self._cacheTempFile, "wb") as f:
+				yaml.safe_dump(entries, f, default_flow_style=False, indent="    ", allow_unicode=True)
+			util.safeRename(self._cacheTempFile, self._cacheFile)
+			self._dirty = False
+
+		except Exception:
+			self._logger.error("Unable to save the analysis cache", exc_info=True)
@@ -0,0 +1,122 @@
+# coding=utf-8
+__author__ = "AstroPrint Product Team <product@astroprint.com>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016-2020 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
+
+import bisect
+import threading
+
+class FileCatalog(object):
+	"""
+	The file data (name, size, date and metadata) of the print files in the uploads folder, indexed by name, by
+	cloud id and sorted by date and by name, so that listing the files doesn't need to stat every one of them and
+	a page of the list can be taken without sorting it.
+
+	The PrintFilesManager keeps it up to date as files are added, removed or their metadata changes, and the
+	uploads folder watchdog for the changes made by others. Entries are returned as copies so callers can add
+	to them.
+	"""
+
+	SORT_KEYS = ("date", "name")
+
+	def __init__(self):
+		self._lock = threading.RLock()
+		self._entries = {} # name -> file data
+		self._byCloudId = {} # cloud id -> name
+		self._byDate = [] # (date, name), oldest first
+		self._byName = [] # names in order
+
+	def __len__(self):
+		return len(self._entries)
+
+	def __contains__(self, name):
+		return name in self._entries
+
+	def get(self, name):
+		with self._lock:
+			fileData = self._entries.get(name)
+			return dict(fileData) if fileData is not None else None
+
+	def getByCloudId(self, cloudId):
+		"""
+		Returns the name of the file downloaded from the cloud with the given id or None
+		"""
+		return self._byCloudId.get(cloudId)
+
+	def names(self):
+		with self._lock:
+			return list(self._byName)
+
+	def set(self, name, fileData):
+		with self._lock:
+			self._remove(name)
+
+			self._entries[name] = fileData
+			bisect.insort(self._byDate, (fileData.get("date") or 0, name))
+			bisect.insort(self._byName, name)
+
+			cloudId = fileData.get("cloud_id")
+			if cloudId:
+				self._byCloudId[cloudId] = name
+
+	def remove(self, name):
+		with self._lock:
+			return self._remove(name)
+
+	def clear(self):
+		with self._lock:
+			self._entries = {}
+			self._byCloudId = {}
+			self._byDate = []
+			self._byName = []
+
+	def query(self, sortBy="date", reverse=False, offset=0, limit=None):
+		"""
+		Returns the total number of files and a list with the data of the files in the given page, sorted by date
+		(ties by name) or by name
+		"""
+		if sortBy not in self.SORT_KEYS:
+			raise ValueError("Files can't be sorted by %s" % sortBy)
+
+		with self._lock:
+			total = len(self._entries)
+			offset = max(0, offset or 0)
+			end = total if limit is None else min(total, offset + max(0, limit))
+
+			if offset >= end:
+				return total, []
+
+			if reverse:
+				start, end = total - end, total - offset
+			else:
+				start = offset
+
+			if sortBy == "date":
+				names = [name for date, name in self._byDate[start:end]]
+			else:
+				names = self._byName[start:end]
+
+			if reverse:
+				names.reverse()
+
+			return total, [dict(self._entries[name]) for name in names]
+
+	def _remove(self, name):
+		fileData = self._entries.pop(name, None)
+		if fileData is None:
+			return False
+
+		dateKey = (fileData.get("date") or 0, name)
+		i = bisect.bisect_left(self._byDate, dateKey)
+		if i < len(self._byDate) and self._byDate[i] == dateKey:
+			del self._byDate[i]
+
+		i = bisect.bisect_left(self._byName, name)
+		if i < len(self._byName) and self._byName[i] == name:
+			del self._byName[i]
+
+		cloudId = fileData.get("cloud_id")
+		if cloudId and self._byCloudId.get(cloudId) == name:
+			del self._byCloudId[cloudId]
+
+		return True
@@ -3,14 +3,21 @@ __author__ = "AstroPrint Product Team <product@astroprint.com>"
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 __copyright__ = "Copyright (C) 2016-2019 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
 
+import os
+import time
+import json
+import shutil
 import threading
 import logging
 import requests
 
 from Queue import Queue
+from octoprint.settings import settings
+from octoprint.util import safeRename, silentRemove
 from astroprint.printer.manager import printerManager
 from octoprint.events import eventManager, Events
 from astroprint.printfiles import FileDestinations
+from astroprint.printfiles.analysiscache import contentHasher
 
 # singleton
 _instance = None
@@ -31,11 +38,94 @@ def downloadManager():
 # successCb 	: callback to report success
 # errorCb 		: callback to report errors
 
+class DownloadHttpError(Exception):
+	def __init__(self, status):
+		super(DownloadHttpError, self).__init__('HTTP %d' % status)
+		self.status = status
+
+class DownloadRestart(Exception):
+	pass
+
+class DownloadJournal(object):
+	"""
+	Progress of a download saved next to its partial file, so that a failed or interrupted download can be
+	continued with Range requests instead of starting again from the first byte.
+
+	The file is split in segments, [start, end, pos] where pos is the next byte to fetch, that can be fetched
+	in parallel. validator is the ETag (or Last-Modified) of the file, sent with If-Range so that a file that
+	changed is downloaded again.
+	"""
+
+	SAVE_INTERVAL = 1.0
+
+	def __init__(self, path, length, validator, segments):
+		self.path = path
+		self.length = length
+		self.validator = validator
+		self.segments = segments
+		self._lock = threading.Lock()
+		self._lastSave = 0
+
+	@classmethod
+	def create(cls, path, length, validator, segmentCount):
+		segmentSize = length // segmentCount
+		segments = []
+		for i in range(segmentCount):
+			start = i * segmentSize
+			end = length if i == segmentCount - 1 else start + segmentSize
+			segments.append([start, end, start])
+
+		return cls(path, length, validator, segments)
+
+	@classmethod
+	def load(cls, path):
+		try:
+			with open(path, 'r') as f:
+				data = json.load(f)
+
+			return cls(path, data['length'], data['validator'], data['segments'])
+
+		except (IOError, ValueError, KeyError):
+			return None
+
+	@property
+	def downloaded(self):
+		return sum([pos - start for start, end, pos in self.segments])
+
+	@property
+	def complete(self):
+		return all([pos >= end for start, end, pos in self.segments])
+
+	def advance(self, segment, count):
+		"""
+		Records that count more bytes of the segment are in the partial file. Returns the bytes downloaded so far
+		"""
+		with self._lock:
+			segment[2] += count
+			if time.time() - self._lastSave >= self.SAVE_INTERVAL:
+				self._save()
+
+			return self.downloaded
+
+	def save(self):
+		with self._lock:
+			self._save()
+
+	def _save(self):
+		with open(self.path + '.tmp', 'w') as f:
+			json.dump({'length': self.length, 'validator': self.validator, 'segments': self.segments}, f)
+
+		safeRename(self.path + '.tmp', self.path)
+		self._lastSave = time.time()
+
 class DownloadWorker(threading.Thread):
+	CHUNK_SIZE = 100000 # download 100kb at a time
+	TIMEOUT = (10.0, 8.0) # (connect timeout, read timeout)
+
 	def __init__(self, manager):
 		self._daemon = True
 		self._manager = manager
-		self._activeRequest = None
+		self._activeRequests = []
 		self._canceled = False
 		self.activeDownload = False
 
@@ -79,87 +169,91 @@ class DownloadWorker(threading.Thread):
 			self.activeDownload = printFileId
 			self._canceled = False
 
+			partFile = os.path.join(self._manager.partsFolder, '%s.part' % printFileId)
+			journalFile = partFile + '.journal'
+
 			while retries > 0:
 				try:
 					#Perform download here
-					r = requests.get(item['downloadUrl'], stream= True, timeout= (10.0, 8.0)) #(connect timeout, read timeout)
-					self._activeRequest = r
-
-					if r.status_code == 200:
-						content_length = float(r.headers['Content-Length'])
-						downloaded_size = 0.0
+					journal, contentHash = self._download(item['downloadUrl'], partFile, journalFile, progressCb)
 
-						if not self._canceled:
-							with open(destFile, 'wb') as fd:
-								for chunk in r.iter_content(100000): #download 100kb at a time
-									if self._canceled: #check right after reading
-										break
-
-									downloaded_size += len(chunk)
-									fd.write(chunk)
-									progressCb(2 + round((downloaded_size / content_length) * 98.0, 1))
-
-									if self._canceled: #check again before going to read next chunk
-										break
-
-						retries = 0 #No more retries after this
-						if not self._canceled:
-							self._manager._logger.info('Download completed for %s' % printFileId)
-
-							if item['printFileInfo'] is None:
-								printerManager().fileManager._metadataAnalyzer.addFileToQueue(destFile)
-
-							fileInfo = {
-								'id': printFileId,
-								'printFileName': printFileName,
-								'info': item['printFileInfo'],
-								'printer': printer,
-								'material': material,
-								'quality': quality,
-								'image': image,
-								'created': created,
-								'sentFromCloud' : sentFromCloud
-							}
-
-							em = eventManager()
-
-							if printerManager().fileManager.saveCloudPrintFile(destFile, fileInfo, FileDestinations.LOCAL):
-								em.fire(
-									Events.CLOUD_DOWNLOAD, {
-										"type": "success",
-										"id": printFileId,
-										"filename": printerManager().fileManager._getBasicFilename(destFile),
-										"info": fileInfo["info"],
-										"printer": fileInfo["printer"],
-										"material": fileInfo["material"],
-										"quality": fileInfo["quality"],
-										"image": fileInfo["image"],
-										"created": fileInfo["created"]
-									}
-								)
-
-								successCb(destFile, fileInfo)
-
-							else:
-								errorCb(destFile, "Couldn't save the file")
-
-					elif r.status_code in [502, 503, 500]:
-						self._manager._logger.warn('Download failed for %s with %d. Retrying...' % (printFileId, r.status_code))
+					retries = 0 #No more retries after this
+					if not self._canceled:
+						self._manager._logger.info('Download completed for %s' % printFileId)
+
+						shutil.move(partFile, destFile)
+						silentRemove(journalFile)
+
+						if item['printFileInfo'] is None:
+							printerManager().fileManager._metadataAnalyzer.addFileToQueue(destFile, contentHash.hexdigest())
+
+						fileInfo = {
+							'id': printFileId,
+							'printFileName': printFileName,
+							'info': item['printFileInfo'],
+							'printer': printer,
+							'material': material,
+							'quality': quality,
+							'image': image,
+							'created': created,
+							'sentFromCloud' : sentFromCloud
+						}
+
+						em = eventManager()
+
+						if printerManager().fileManager.saveCloudPrintFile(destFile, fileInfo, FileDestinations.LOCAL):
+							em.fire(
+								Events.CLOUD_DOWNLOAD, {
+									"type": "success",
+									"id": printFileId,
+									"filename": printerManager().fileManager._getBasicFilename(destFile),
+									"info": fileInfo["info"],
+									"printer": fileInfo["printer"],
+									"material": fileInfo["material"],
+									"quality": fileInfo["quality"],
+									"image": fileInfo["image"],
+									"created": fileInfo["created"]
+								}
+							)
+
+							successCb(destFile, fileInfo)
+
+						else:
+							errorCb(destFile, "Couldn't save the file")
+
+				except DownloadRestart:
+					self._manager._logger.warn('%s changed while downloading, starting again' % printFileId)
+					silentRemove(journalFile)
+					retries -= 1
+					retries or errorCb(destFile, 'The device is unable to download the print file')
+
+				except DownloadHttpError as e:
+					if e.status in [502, 503, 500]:
+						self._manager._logger.warn('Download failed for %s with %d. Retrying...' % (printFileId, e.status))
 						retries -= 1 #This error can be retried
+						self._waitToRetry(retries)
 
 					else:
-						self._manager._logger.error('Download failed for %s with %d' % (printFileId, r.status_code))
+						self._manager._logger.error('Download failed for %s with %d' % (printFileId, e.status))
 						errorCb(destFile, 'The device is unable to download the print file')
 						retries = 0 #No more retries after this
 
-				except requests.exceptions.ConnectTimeout as e:
-					self._manager._logger.warn('Connection timeout for %s. Retrying...' % printFileId)
-					retries -= 1 #This error can be retried
+				except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+					if self._canceled:
+						retries = 0
 
-				except requests.exceptions.ReadTimeout as e:
-					self._manager._logger.warn('Read timeout for %s' % printFileId)
-					not self._canceled and errorCb(destFile, 'Network erros while downloading the print file')
-					retries = 0 #No more retries after this
+					else:
+						# What was downloaded is in the journal, the next attempt continues from there. Attempts that
+						# made some progress don't count
+						if self._madeProgress:
+							retries = 3
+
+						retries -= 1
+						self._manager._logger.warn('Network error for %s (%s). %s' % (printFileId, e, 'Retrying...' if retries > 0 else 'Giving up'))
+						if retries > 0:
+							self._waitToRetry(retries)
+						else:
+							errorCb(destFile, 'Network erros while downloading the print file')
 
 				except requests.exceptions.RequestException as e:
 					self._manager._logger.error('Download connection exception for %s: %s' % (printFileId, e), exc_info=True)
@@ -174,25 +268,209 @@ class DownloadWorker(threading.Thread):
 					else:
 						self._manager._logger.error('Download exception for %s: %s' % (printFileId, e), exc_info=True)
 						not self._canceled and errorCb(destFile, 'The device is unable to download the print file')
-						r.close()
 
 				finally:
 					if self._canceled:
 						retries = 0 #No more retries after this
 						self._manager._logger.warn('Download canceled for %s' % printFileId)
+						silentRemove(partFile)
+						silentRemove(journalFile)
 						errorCb(destFile, 'cancelled')
 
 			self.activeDownload = False
-			self._activeRequest = None
+			self._activeRequests = []
 			downloadQueue.task_done()
 
 	def cancel(self):
 		if self.activeDownload and not self._canceled:
-			if self._activeRequest:
-				self._activeRequest.close() #This can create the exception 'NoneType' object has no attribute 'recv' which is handled above
+			self._canceled = True
+
+			for r in list(self._activeRequests):
+				r.close() #This can create the exception 'NoneType' object has no attribute 'recv' which is handled above
 
 			self._manager._logger.warn('Download canceled requested for %s' % self.activeDownload)
-			self._canceled = True
+
+	def _waitToRetry(self, retriesLeft):
+		delay = 2.0 * (4 - retriesLeft)
+		while delay > 0 and not self._canceled:
+			time.sleep(0.5)
+			delay -= 0.5
+
+	#
+	# Downloads into partFile what's missing according to the journal, starting a new one if there's none or
+	# the file changed. Returns the completed journal and the content hash of the file
+	#
+	def _download(self, url, partFile, journalFile, progressCb):
+		self._madeProgress = False
+
+		journal = DownloadJournal.load(journalFile) if os.path.isfile(partFile) else None
+		firstResponse = None
+
+		if journal and not journal.complete:
+			segment = self._nextSegment(journal)
+			try:
+				firstResponse = self._request(url, journal, segment)
+
+			except DownloadRestart:
+				self._manager._logger.info('%s changed since the download started, starting again' % partFile)
+				journal = None
+
+		elif journal is None:
+			silentRemove(partFile)
+
+		if journal is None:
+			firstResponse = self._request(url)
+			journal = self._newJournal(journalFile, firstResponse)
+			with open(partFile, 'wb') as f:
+				f.truncate(journal.length)
+
+			journal.save()
+
+		contentHash = contentHasher()
+		hashedBytes = 0
+
+		if not journal.complete:
+			if firstResponse is None:
+				firstResponse = self._request(url, journal, self._nextSegment(journal))
+
+			pending = [s for s in journal.segments if s[2] < s[1]]
+			threads = []
+			errors = []
+
+			def fetchSegment(response, segment):
+				try:
+					self._fetch(url, response, partFile, journal, segment, progressCb)
+				except Exception as e:
+					errors.append(e)
+
+			# the first segment is fetched on this thread so that the file can be hashed while it streams in
+			first = pending[0]
+			if first[0] == 0:
+				hashedBytes = self._hashFile(partFile, contentHash, 0, first[2])
+
+			for segment in pending[1:]:
+				t = threading.Thread(target=fetchSegment, args=(None, segment))
+				t.daemon = True
+				t.start()
+				threads.append(t)
+
+			try:
+				self._fetch(url, firstResponse, partFile, journal, first, progressCb, contentHash if first[0] == 0 else None)
+				if first[0] == 0:
+					hashedBytes = first[2]
+
+			finally:
+				for t in threads:
+					t.join()
+
+			journal.save()
+
+			if errors:
+				raise errors[0]
+
+		elif firstResponse is not None:
+			firstResponse.close()
+
+		if not self._canceled:
+			self._hashFile(partFile, contentHash, hashedBytes, journal.length)
+
+		return journal, contentHash
+
+	def _newJournal(self, journalFile, response):
+		length = int(response.headers['Content-Length'])
+		validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+
+		s = settings()
+		segmentCount = 1
+		if response.headers.get('Accept-Ranges') == 'bytes' and length >= s.getInt(['downloads', 'parallelMinSize']):
+			segmentCount = max(1, s.getInt(['downloads', 'parallelSegments']))
+
+		return DownloadJournal.create(journalFile, length, validator, segmentCount)
+
+	def _nextSegment(self, journal):
+		for segment in journal.segments:
+			if segment[2] < segment[1]:
+				return segment
+
+	#
+	# Starts a GET of the whole file or, if a segment is given, of the part of it that is missing
+	#
+	def _request(self, url, journal=None, segment=None):
+		headers = {}
+		if segment:
+			headers['Range'] = 'bytes=%d-%d' % (segment[2], segment[1] - 1)
+			if journal.validator:
+				headers['If-Range'] = journal.validator
+
+		r = requests.get(url, stream= True, timeout= self.TIMEOUT, headers= headers)
+		self._activeRequests.append(r)
+
+		if segment:
+			if r.status_code == 200:
+				# the server ignored the range, the file changed or can't be resumed
+				r.close()
+				raise DownloadRestart()
+
+			elif r.status_code == 206:
+				contentRange = r.headers.get('Content-Range', '')
+				if not contentRange.startswith('bytes %d-' % segment[2]) or not contentRange.endswith('/%d' % journal.length):
+					r.close()
+					raise DownloadRestart()
+
+				return r
+
+		elif r.status_code == 200:
+			return r
+
+		r.close()
+		raise DownloadHttpError(r.status_code)
+
+	#
+	# Writes the data of the response (or a new request if it's None) into the segment of the partial file
+	#
+	def _fetch(self, url, response, partFile, journal, segment, progressCb, contentHash=None):
+		if response is None:
+			response = self._request(url, journal, segment)
+
+		try:
+			with open(partFile, 'r+b', 0) as fd:
+				fd.seek(segment[2])
+				for chunk in response.iter_content(self.CHUNK_SIZE):
+					if self._canceled: #check right after reading
+						break
+
+					chunk = chunk[:segment[1] - segment[2]] # the first request may go on past the segment
+					fd.write(chunk)
+					if contentHash:
+						contentHash.update(chunk)
+
+					downloaded = journal.advance(segment, len(chunk))
+					self._madeProgress = True
+					progressCb(2 + round((float(downloaded) / journal.length) * 98.0, 1))
+
+					if self._canceled or segment[2] >= segment[1]:
+						break
+
+		finally:
+			response.close()
+			try:
+				self._activeRequests.remove(response)
+			except ValueError:
+				pass
+
+	def _hashFile(self, path, contentHash, start, end):
+		with open(path, 'rb') as f:
+			f.seek(start)
+			left = end - start
+			while left > 0 and not self._canceled:
+				chunk = f.read(min(left, 1048576))
+				if not chunk:
+					break
+
+				contentHash.update(chunk)
+				left -= len(chunk)
+
+		return end - left
 
 
 class DownloadManager(object):
@@ -201,6 +479,8 @@ class DownloadManager(object):
 	def __init__(self):
 		self._logger = logging.getLogger(__name__)
 		self.queue = Queue()
+		self.partsFolder = settings().getBaseFolder('downloads')
+		self._removeStaleParts()
 
 		self._workers = []
 		for i in range(self._maxWorkers):
@@ -208,6 +488,21 @@ class DownloadManager(object):
 			self._workers.append( w )
 			w.start()
 
+	#
+	# Partial downloads are kept to continue them if the file is downloaded again, but not forever
+	#
+	def _removeStaleParts(self):
+		maxAge = settings().getFloat(['downloads', 'keepPartialDays']) * 86400
+		now = time.time()
+		for f in os.listdir(self.partsFolder):
+			path = os.path.join(self.partsFolder, f)
+			try:
+				if now - os.path.getmtime(path) > maxAge:
+					os.remove(path)
+
+			except OSError:
+				pass
+
 	def isDownloading(self, printFileId):
 		for w in self._workers:
 			if w.activeDownload == printFileId:
@@ -16,6 +16,7 @@ from octoprint.settings import settings
 from octoprint.events import eventManager, Events
 
 from astroprint.printfiles import PrintFilesManager, MetadataAnalyzer, FileDestinations, AnalysisAborted
+from astroprint.printfiles.layers import LayerIndexBuilder
 from astroprint.util.gCodeAnalyzer import GCodeAnalyzer
 
 class PrintFileManagerGcode(PrintFilesManager):
@@ -25,46 +26,32 @@ class PrintFileManagerGcode(PrintFilesManager):
 
 	def __init__(self):
 		self._logger = logging.getLogger(__name__)
-		self._metadataAnalyzer = GcodeMetadataAnalyzer(getPathCallback=self.getAbsolutePath, loadedCallback=self._onMetadataAnalysisFinished)
+		self._metadataAnalyzer = GcodeMetadataAnalyzer(getPathCallback=self.getAbsolutePath, loadedCallback=self._onMetadataAnalysisFinished, cachedResultCallback=self._applyCachedAnalysis)
 		super(PrintFileManagerGcode, self).__init__()
 
 class GcodeMetadataAnalyzer(MetadataAnalyzer):
-	def __init__(self, getPathCallback, loadedCallback):
+	def __init__(self, getPathCallback, loadedCallback, cachedResultCallback=None):
 		self._logger = logging.getLogger(__name__)
 
-		self._gcode = None
+		super(GcodeMetadataAnalyzer, self).__init__(getPathCallback, loadedCallback, cachedResultCallback)
 
-		super(GcodeMetadataAnalyzer, self).__init__(getPathCallback, loadedCallback)
-
-	def pause(self):
-		super(GcodeMetadataAnalyzer, self).pause()
-
-		if self._gcode is not None:
-			self._logger.debug("Aborting running analysis, will restart when Gcode analyzer is resumed")
-			self._gcode.abort()
-
-	def _analyzeFile(self, filename):
-		path = self._getPathCallback(filename)
+	def _analyzeFile(self, job):
+		path = self._getPathCallback(job.filename)
 
 		if path is None or not os.path.exists(path):
 			return
 
-		self._currentFile = filename
-		self._currentProgress = 0
+		self._logger.debug("Starting analysis of file %s" % job.filename)
+		eventManager().fire(Events.METADATA_ANALYSIS_STARTED, {"file": job.filename})
 
-		try:
-			self._logger.debug("Starting analysis of file %s" % filename)
-			eventManager().fire(Events.METADATA_ANALYSIS_STARTED, {"file": filename})
-			self._gcode = GcodeInterpreter(self._loadedCallback,self._currentFile)
-			self._gcode.progressCallback = self._onParsingProgress
-			self._gcode.load(path)
-
-		finally:
-			self._gcode = None
-			self._currentProgress = None
-			self._currentFile = None
+		gcode = GcodeInterpreter(self._loadedCallback, job.filename)
+		gcode.progressCallback = job.onProgress
+		job.start(gcode)
+		gcode.load(path)
 
 class GcodeInterpreter(object):
+	ANALYSIS_CHUNK_SIZE = 1024 * 1024 # Bytes read at a time by the fallback analysis
+
 	def __init__(self,loadedCallback,currentFile):
 		self._logger = logging.getLogger(__name__)
 
@@ -72,12 +59,19 @@ class GcodeInterpreter(object):
 		self.extrusionAmount = [0]
 		self.extrusionVolume = [0]
 		self.totalMoveTimeMinute = 0
+		self.layerCount = None
+		self.size = None
+		self.layer_height = None
+		self.total_filament = None
+		self.layerIndex = None
 		self.filename = None
 		self.progressCallback = None
 		self._loadedCallback = loadedCallback
 		self._currentFile = currentFile
 		self._abort = False
 		self._filamentDiameter = 0
+		self._layerIndexBuilder = None
+		self._analyzer = None
 
 	def cbGCodeAnalyzerReady(self,timePerLayers,totalPrintTime,layerCount,size,layer_height,total_filament,parent):
 
@@ -95,6 +89,18 @@ class GcodeInterpreter(object):
 
 		self.total_filament = None#total_filament has not got any information
 
+		# file fraction -> print time fraction at the end of each layer
+		timeProfile = []
+		timeFraction = 0.0
+		for layer in timePerLayers or []:
+			timeFraction += layer['time']
+			timeProfile.append((layer['upperPercent'], timeFraction))
+
+		self._buildLayerIndex(totalPrintTime, timeProfile)
+
+		if self._abort:
+			return
+
 		self._logger.debug("Analysis of file %s finished, notifying callback" % self.filename)
 
 		parent._loadedCallback(parent._currentFile, parent)
@@ -105,9 +111,14 @@ class GcodeInterpreter(object):
 		with open(parameters['filename'], "r") as f:
 			self._load(f)
 
-			self._logger.debug("Analysis of file %s finished, notifying callback" % parameters['filename'])
+		self._buildLayerIndex(self.totalMoveTimeMinute * 60, self._timeProfile)
+
+		if self._abort:
+			return
+
+		self._logger.debug("Analysis of file %s finished, notifying callback" % parameters['filename'])
 
-			parameters['parent']._loadedCallback(parameters['parent']._currentFile, parameters['parent'])
+		parameters['parent']._loadedCallback(parameters['parent']._currentFile, parameters['parent'])
 
 	def load(self, filename):
 		if os.path.isfile(filename):
@@ -115,15 +126,51 @@ class GcodeInterpreter(object):
 			self._fileSize = os.stat(filename).st_size
 
 		self.progressCallback(0.0)
-		GCodeAnalyzer(self.filename, False, self.cbGCodeAnalyzerReady, self.cbGCodeAnalyzerException, self).makeCalcs()
+
+		# run in this thread, the analysis workers limit how many GCodeAnalyzer processes there are
+		self._analyzer = GCodeAnalyzer(self.filename, True, self.cbGCodeAnalyzerReady, self.cbGCodeAnalyzerException, self)
+		if not self._abort:
+			self._analyzer.run()
+
+		if self._abort:
+			raise AnalysisAborted()
 
 	def abort(self):
 		self._abort = True
 
+		if self._analyzer is not None:
+			self._analyzer.abort()
+
+		if self._layerIndexBuilder is not None:
+			self._layerIndexBuilder.abort = True
+
+	def _buildLayerIndex(self, printTime, timeProfile):
+		# Layer starts are stored with the analysis so that printing doesn't need to analyze the file again
+		if self._abort:
+			return
+
+		try:
+			self._layerIndexBuilder = LayerIndexBuilder(self.filename, self._fileSize, printTime, timeProfile)
+			self.layerIndex = self._layerIndexBuilder.build()
+
+		except AnalysisAborted:
+			self.layerIndex = None
+
+		except Exception:
+			self._logger.error("Unable to build the layer index of %s" % self.filename, exc_info=True)
+			self.layerIndex = None
+
+		finally:
+			self._layerIndexBuilder = None
+
 	def _load(self, gcodeFile):
-		filePos = 0
-		pos = [0.0, 0.0, 0.0]
-		posOffset = [0.0, 0.0, 0.0]
+		"""
+		Pure python analysis used when the GCodeAnalyzer binary is not available. The file is read in chunks
+		of ANALYSIS_CHUNK_SIZE bytes and G0/G1 moves, the vast majority of lines, take a fast path that splits
+		the line into words once instead of searching it for every parameter.
+		"""
+		posX = posY = posZ = 0.0
+		offsetX = offsetY = offsetZ = 0.0
 		currentE = [0.0]
 		totalExtrusion = [0.0]
 		maxExtrusion = [0.0]
@@ -135,162 +182,217 @@ class GcodeInterpreter(object):
 		feedRateXY = settings().getFloat(["printerParameters", "movementSpeed", "x"])
 		offsets = settings().get(["printerParameters", "extruderOffsets"])
 
-		for line in gcodeFile:
+		# extents and layers of the extruded parts
+		minX = minY = minZ = float("inf")
+		maxX = maxY = maxZ = float("-inf")
+		layersZ = [] # heights of the layers, going down (a sequential print) doesn't start new ones
+
+		getCodeInt = self._getCodeInt
+		getCodeFloat = self._getCodeFloat
+		sqrt = math.sqrt
+		moveCommands = ("G0 ", "G1 ")
+
+		bytesRead = 0
+		remainder = ""
+		self._timeProfile = []
+
+		while True:
 			if self._abort:
 				raise AnalysisAborted()
-			filePos += 1
-
-			try:
-				if self.progressCallback is not None and (filePos % 1000 == 0):
-					if isinstance(gcodeFile, (file)):
-						self.progressCallback(float(gcodeFile.tell()) / float(self._fileSize))
-					elif isinstance(gcodeFile, (list)):
-						self.progressCallback(float(filePos) / float(len(gcodeFile)))
-			except:
-				pass
 
-			if ';' in line:
-				comment = line[line.find(';')+1:].strip()
-				if comment.startswith("filament_diameter"):
-					self._filamentDiameter = float(comment.split("=", 1)[1].strip())
-				elif comment.startswith("CURA_PROFILE_STRING"):
-					curaOptions = self._parseCuraProfileString(comment)
-					if "filament_diameter" in curaOptions:
+			chunk = gcodeFile.read(self.ANALYSIS_CHUNK_SIZE)
+			if chunk:
+				bytesRead += len(chunk)
+				lines = (remainder + chunk).split("\n")
+				remainder = lines.pop()
+			elif remainder:
+				lines = [remainder]
+				remainder = ""
+			else:
+				break
+
+			for line in lines:
+				if ';' in line:
+					comment = line[line.find(';')+1:].strip()
+					if comment.startswith("filament_diameter"):
+						self._filamentDiameter = float(comment.split("=", 1)[1].strip())
+					elif comment.startswith("CURA_PROFILE_STRING"):
+						curaOptions = self._parseCuraProfileString(comment)
+						if "filament_diameter" in curaOptions:
+							try:
+								self._filamentDiameter = float(curaOptions["filament_diameter"])
+							except:
+								self._filamentDiameter = 0.0
+					line = line[0:line.find(';')]
+
+				if line[:3] in moveCommands:
+					x = y = z = e = f = None
+					for word in line.split()[1:]:
+						code = word[0]
 						try:
-							self._filamentDiameter = float(curaOptions["filament_diameter"])
-						except:
-							self._filamentDiameter = 0.0
-				line = line[0:line.find(';')]
-
-			G = self._getCodeInt(line, 'G')
-			M = self._getCodeInt(line, 'M')
-			T = self._getCodeInt(line, 'T')
-
-			if G is not None:
-				if G == 0 or G == 1:	#Move
-					x = self._getCodeFloat(line, 'X')
-					y = self._getCodeFloat(line, 'Y')
-					z = self._getCodeFloat(line, 'Z')
-					e = self._getCodeFloat(line, 'E')
-					f = self._getCodeFloat(line, 'F')
-					oldPos = pos
-					pos = pos[:]
-					if posAbs:
-						if x is not None:
-							pos[0] = x * scale + posOffset[0]
-						if y is not None:
-							pos[1] = y * scale + posOffset[1]
-						if z is not None:
-							pos[2] = z * scale + posOffset[2]
-					else:
-						if x is not None:
-							pos[0] += x * scale
-						if y is not None:
-							pos[1] += y * scale
-						if z is not None:
-							pos[2] += z * scale
-					if f is not None:
-						feedRateXY = f
-
-					moveType = 'move'
-					if e is not None:
-						if absoluteE:
-							e -= currentE[currentExtruder]
-						if e > 0.0:
-							moveType = 'extrude'
-						if e < 0.0:
-							moveType = 'retract'
-						totalExtrusion[currentExtruder] += e
-						currentE[currentExtruder] += e
-						if totalExtrusion[currentExtruder] > maxExtrusion[currentExtruder]:
-							maxExtrusion[currentExtruder] = totalExtrusion[currentExtruder]
-					else:
-						e = 0.0
-
-					if x is not None or y is not None or z is not None:
-						diffX = oldPos[0] - pos[0]
-						diffY = oldPos[1] - pos[1]
-						totalMoveTimeMinute += math.sqrt(diffX * diffX + diffY * diffY) / feedRateXY
-					elif moveType == "extrude":
-						diffX = oldPos[0] - pos[0]
-						diffY = oldPos[1] - pos[1]
-						time1 = math.sqrt(diffX * diffX + diffY * diffY) / feedRateXY
-						time2 = abs(e / feedRateXY)
-						totalMoveTimeMinute += max(time1, time2)
-					elif moveType == "retract":
-						totalMoveTimeMinute += abs(e / feedRateXY)
-
-					if moveType == 'move' and oldPos[2] != pos[2]:
-						if oldPos[2] > pos[2] and abs(oldPos[2] - pos[2]) > 5.0 and pos[2] < 1.0:
-							oldPos[2] = 0.0
-				elif G == 4:	#Delay
-					S = self._getCodeFloat(line, 'S')
-					if S is not None:
-						totalMoveTimeMinute += S / 60.0
-					P = self._getCodeFloat(line, 'P')
-					if P is not None:
-						totalMoveTimeMinute += P / 60.0 / 1000.0
-				elif G == 20:	#Units are inches
-					scale = 25.4
-				elif G == 21:	#Units are mm
-					scale = 1.0
-				elif G == 28:	#Home
-					x = self._getCodeFloat(line, 'X')
-					y = self._getCodeFloat(line, 'Y')
-					z = self._getCodeFloat(line, 'Z')
-					center = [0.0,0.0,0.0]
-					if x is None and y is None and z is None:
-						pos = center
+							if code == 'X':
+								if x is None:
+									x = float(word[1:])
+							elif code == 'Y':
+								if y is None:
+									y = float(word[1:])
+							elif code == 'Z':
+								if z is None:
+									z = float(word[1:])
+							elif code == 'E':
+								if e is None:
+									e = float(word[1:])
+							elif code == 'F':
+								if f is None:
+									f = float(word[1:])
+						except ValueError:
+							pass
+
+				else:
+					G = getCodeInt(line, 'G')
+
+					if G is not None:
+						if G == 0 or G == 1:	#Move
+							x = getCodeFloat(line, 'X')
+							y = getCodeFloat(line, 'Y')
+							z = getCodeFloat(line, 'Z')
+							e = getCodeFloat(line, 'E')
+							f = getCodeFloat(line, 'F')
+
+						else:
+							if G == 4:	#Delay
+								S = getCodeFloat(line, 'S')
+								if S is not None:
+									totalMoveTimeMinute += S / 60.0
+								P = getCodeFloat(line, 'P')
+								if P is not None:
+									totalMoveTimeMinute += P / 60.0 / 1000.0
+							elif G == 20:	#Units are inches
+								scale = 25.4
+							elif G == 21:	#Units are mm
+								scale = 1.0
+							elif G == 28:	#Home
+								x = getCodeFloat(line, 'X')
+								y = getCodeFloat(line, 'Y')
+								z = getCodeFloat(line, 'Z')
+								if x is None and y is None and z is None:
+									posX = posY = posZ = 0.0
+								else:
+									if x is not None:
+										posX = 0.0
+									if y is not None:
+										posY = 0.0
+									if z is not None:
+										posZ = 0.0
+							elif G == 90:	#Absolute position
+								posAbs = True
+							elif G == 91:	#Relative position
+								posAbs = False
+							elif G == 92:
+								x = getCodeFloat(line, 'X')
+								y = getCodeFloat(line, 'Y')
+								z = getCodeFloat(line, 'Z')
+								e = getCodeFloat(line, 'E')
+								if e is not None:
+									currentE[currentExtruder] = e
+								if x is not None:
+									offsetX = posX - x
+								if y is not None:
+									offsetY = posY - y
+								if z is not None:
+									offsetZ = posZ - z
+
+							continue
+
 					else:
-						pos = pos[:]
-						if x is not None:
-							pos[0] = center[0]
-						if y is not None:
-							pos[1] = center[1]
-						if z is not None:
-							pos[2] = center[2]
-				elif G == 90:	#Absolute position
-					posAbs = True
-				elif G == 91:	#Relative position
-					posAbs = False
-				elif G == 92:
-					x = self._getCodeFloat(line, 'X')
-					y = self._getCodeFloat(line, 'Y')
-					z = self._getCodeFloat(line, 'Z')
-					e = self._getCodeFloat(line, 'E')
-					if e is not None:
-						currentE[currentExtruder] = e
+						M = getCodeInt(line, 'M')
+
+						if M is not None:
+							if M == 82:   #Absolute E
+								absoluteE = True
+							elif M == 83:   #Relative E
+								absoluteE = False
+
+						else:
+							T = getCodeInt(line, 'T')
+
+							if T is not None:
+								offsetX -= offsets[currentExtruder]["x"] if currentExtruder < len(offsets) else 0
+								offsetY -= offsets[currentExtruder]["y"] if currentExtruder < len(offsets) else 0
+
+								currentExtruder = T
+
+								offsetX += offsets[currentExtruder]["x"] if currentExtruder < len(offsets) else 0
+								offsetY += offsets[currentExtruder]["y"] if currentExtruder < len(offsets) else 0
+
+								if len(currentE) <= currentExtruder:
+									for i in range(len(currentE), currentExtruder + 1):
+										currentE.append(0.0)
+								if len(maxExtrusion) <= currentExtruder:
+									for i in range(len(maxExtrusion), currentExtruder + 1):
+										maxExtrusion.append(0.0)
+								if len(totalExtrusion) <= currentExtruder:
+									for i in range(len(totalExtrusion), currentExtruder + 1):
+										totalExtrusion.append(0.0)
+
+						continue
+
+				# G0/G1 move
+				oldX = posX
+				oldY = posY
+				if posAbs:
 					if x is not None:
-						posOffset[0] = pos[0] - x
+						posX = x * scale + offsetX
 					if y is not None:
-						posOffset[1] = pos[1] - y
+						posY = y * scale + offsetY
 					if z is not None:
-						posOffset[2] = pos[2] - z
-
-			elif M is not None:
-				if M == 82:   #Absolute E
-					absoluteE = True
-				elif M == 83:   #Relative E
-					absoluteE = False
-
-			elif T is not None:
-				posOffset[0] -= offsets[currentExtruder]["x"] if currentExtruder < len(offsets) else 0
-				posOffset[1] -= offsets[currentExtruder]["y"] if currentExtruder < len(offsets) else 0
-
-				currentExtruder = T
-
-				posOffset[0] += offsets[currentExtruder]["x"] if currentExtruder < len(offsets) else 0
-				posOffset[1] += offsets[currentExtruder]["y"] if currentExtruder < len(offsets) else 0
+						posZ = z * scale + offsetZ
+				else:
+					if x is not None:
+						posX += x * scale
+					if y is not None:
+						posY += y * scale
+					if z is not None:
+						posZ += z * scale
+				if f is not None:
+					feedRateXY = f
+
+				if e is not None:
+					if absoluteE:
+						e -= currentE[currentExtruder]
+					totalExtrusion[currentExtruder] += e
+					currentE[currentExtruder] += e
+					if totalExtrusion[currentExtruder] > maxExtrusion[currentExtruder]:
+						maxExtrusion[currentExtruder] = totalExtrusion[currentExtruder]
+				else:
+					e = 0.0
+
+				if x is not None or y is not None or z is not None:
+					diffX = oldX - posX
+					diffY = oldY - posY
+					totalMoveTimeMinute += sqrt(diffX * diffX + diffY * diffY) / feedRateXY
+				elif e != 0.0:
+					# extrude or retract without moving
+					totalMoveTimeMinute += abs(e / feedRateXY)
+
+				if e > 0.0:
+					if posX < minX: minX = posX
+					if posX > maxX: maxX = posX
+					if posY < minY: minY = posY
+					if posY > maxY: maxY = posY
+					if posZ < minZ: minZ = posZ
+					if posZ > maxZ: maxZ = posZ
+
+					if not layersZ or posZ > layersZ[-1]:
+						layersZ.append(posZ)
+
+			self._timeProfile.append((bytesRead, totalMoveTimeMinute))
 
-				if len(currentE) <= currentExtruder:
-					for i in range(len(currentE), currentExtruder + 1):
-						currentE.append(0.0)
-				if len(maxExtrusion) <= currentExtruder:
-					for i in range(len(maxExtrusion), currentExtruder + 1):
-						maxExtrusion.append(0.0)
-				if len(totalExtrusion) <= currentExtruder:
-					for i in range(len(totalExtrusion), currentExtruder + 1):
-						totalExtrusion.append(0.0)
+			try:
+				if self.progressCallback is not None:
+					self.progressCallback(float(bytesRead) / float(self._fileSize))
+			except:
+				pass
 
 		if self.progressCallback is not None:
 			self.progressCallback(100.0)
@@ -302,6 +404,16 @@ class GcodeInterpreter(object):
 			self.extrusionVolume[i] = (self.extrusionAmount[i] * (math.pi * radius * radius)) / 1000
 		self.totalMoveTimeMinute = totalMoveTimeMinute
 
+		if bytesRead and totalMoveTimeMinute:
+			self._timeProfile = [(float(b) / bytesRead, t / totalMoveTimeMinute) for b, t in self._timeProfile]
+		else:
+			self._timeProfile = []
+
+		self.layerCount = len(layersZ)
+		if self.layerCount > 0:
+			self.size = {'x': maxX - minX, 'y': maxY - minY, 'z': maxZ}
+			self.layer_height = layersZ[1] - layersZ[0] if self.layerCount > 1 else layersZ[0]
+
 	def _parseCuraProfileString(self, comment):
 		return {key: value for (key, value) in map(lambda x: x.split("=", 1), zlib.decompress(base64.b64decode(comment[len("CURA_PROFILE_STRING:"):])).split("\b"))}
 
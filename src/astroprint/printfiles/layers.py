@@ -0,0 +1,208 @@
+# coding=utf-8
+__author__ = "AstroPrint Product Team <product@astroprint.com>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016-2019 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
+
+import re
+import struct
+import bisect
+
+from astroprint.printfiles import AnalysisAborted
+
+class LayerIndex(object):
+	"""
+	Where each layer of a gcode file starts: file offset, line number, Z and estimated seconds of printing
+	before the layer. Layers are counted the same way MachineCom does while printing so the layer
+	numbers reported during a print can be used to look them up.
+	"""
+
+	MAGIC = "APLI"
+	VERSION = 1
+	HEADER = struct.Struct("<4sBQdI") # magic, version, file size, estimated print time, number of layers
+	RECORD = struct.Struct("<QIdd") # file offset, line number, z, estimated seconds before the layer
+
+	def __init__(self, fileSize, printTime, layers):
+		self.fileSize = fileSize
+		self.printTime = printTime
+		self._layers = layers
+		self._offsets = [l[0] for l in layers]
+
+	def __len__(self):
+		return len(self._layers)
+
+	def getLayer(self, layer):
+		"""
+		Returns the (offset, line, z, time) tuple of the given layer, starting at 1
+		"""
+		if layer < 1 or layer > len(self._layers):
+			return None
+
+		return self._layers[layer - 1]
+
+	def getLayerAtFilepos(self, filepos):
+		"""
+		Returns the number of the layer being printed when the file has been read up to filepos, 0 if the
+		first layer has not started yet
+		"""
+		return bisect.bisect_right(self._offsets, filepos)
+
+	def timePerLayers(self):
+		"""
+		The layers in the format of the GCodeAnalyzer layer info: the file fraction where each layer ends
+		(upperPercent) and the fraction of the print time it takes (time)
+		"""
+		result = []
+		count = len(self._layers)
+		for i in range(count):
+			if i + 1 < count:
+				upperOffset = self._layers[i + 1][0]
+				upperTime = self._layers[i + 1][3]
+			else:
+				upperOffset = self.fileSize
+				upperTime = self.printTime
+
+			result.append({
+				'upperPercent': float(upperOffset) / self.fileSize if self.fileSize else 1.0,
+				'time': (upperTime - self._layers[i][3]) / self.printTime if self.printTime else 0.0
+			})
+
+		return result
+
+	def save(self, path):
+		with open(path, "wb") as f:
+			f.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.fileSize, self.printTime, len(self._layers)))
+			for layer in self._layers:
+				f.write(self.RECORD.pack(*layer))
+
+	@classmethod
+	def load(cls, path):
+		with open(path, "rb") as f:
+			magic, version, fileSize, printTime, count = cls.HEADER.unpack(f.read(cls.HEADER.size))
+			if magic != cls.MAGIC or version != cls.VERSION:
+				raise ValueError("%s is not a layer index" % path)
+
+			data = f.read(cls.RECORD.size * count)
+
+		layers = [cls.RECORD.unpack_from(data, i * cls.RECORD.size) for i in range(count)]
+		return cls(fileSize, printTime, layers)
+
+class LayerIndexBuilder(object):
+	"""
+	Finds the layers of a gcode file. Only the lines that move Z and the first extrusion after them are looked
+	at from python, everything else is skipped by the regular expressions.
+
+	timeProfile is a list of (file fraction, print time fraction) points from the analysis, used to estimate
+	the time at which each layer starts.
+	"""
+
+	CHUNK_SIZE = 1024 * 1024
+
+	# same rules as MachineCom._gcode_G0: a G0/G1 with Z changes the height, a G0/G1 without Z that extrudes
+	# at a height above the last layer starts a new layer
+	_regex_zMove = re.compile(r"^[ \t]*G[01](?![0-9])[^;\nZ]*Z([-+]?[0-9]*\.?[0-9]+)", re.M)
+	_regex_extrusion = re.compile(r"^[ \t]*G[01](?![0-9])(?![^;\n]*Z)[^;\n]*?E\+?[0-9]*\.?[0-9]+", re.M)
+
+	def __init__(self, filename, fileSize, printTime, timeProfile=None):
+		self._filename = filename
+		self._fileSize = fileSize
+		self._printTime = printTime or 0.0
+
+		profile = sorted(timeProfile or [])
+		if not profile or profile[0][0] > 0.0:
+			profile.insert(0, (0.0, 0.0))
+		if profile[-1][0] < 1.0:
+			profile.append((1.0, 1.0))
+
+		self._profileFilePoints = [p[0] for p in profile]
+		self._profileTimePoints = [p[1] for p in profile]
+
+		self.abort = False
+
+	def build(self):
+		layers = []
+		currentZ = None
+		lastLayerZ = 0.0
+		chunkOffset = 0
+		chunkLines = 0
+		remainder = ""
+
+		with open(self._filename, "rb") as f:
+			while True:
+				if self.abort:
+					raise AnalysisAborted()
+
+				data = f.read(self.CHUNK_SIZE)
+				if data:
+					chunk = remainder + data
+					lastNewLine = chunk.rfind("\n") + 1
+					if lastNewLine > 0:
+						remainder = chunk[lastNewLine:]
+						chunk = chunk[:lastNewLine]
+					else:
+						remainder = chunk
+						continue
+
+				elif remainder:
+					chunk = remainder
+					remainder = ""
+
+				else:
+					break
+
+				countedPos = 0
+				countedLines = chunkLines
+				segmentStart = 0
+
+				for zMatch in self._regex_zMove.finditer(chunk):
+					segmentEnd = zMatch.start()
+					if currentZ != lastLayerZ:
+						layerPos = self._findExtrusion(chunk, segmentStart, segmentEnd)
+						if layerPos is not None:
+							if currentZ is not None and currentZ > lastLayerZ:
+								countedLines += chunk.count("\n", countedPos, layerPos)
+								countedPos = layerPos
+								layers.append(self._layer(chunkOffset + layerPos, countedLines + 1, currentZ))
+
+							lastLayerZ = currentZ
+
+					try:
+						currentZ = float(zMatch.group(1))
+					except ValueError:
+						pass
+
+					segmentStart = chunk.find("\n", zMatch.end()) + 1 or len(chunk)
+
+				if currentZ != lastLayerZ:
+					layerPos = self._findExtrusion(chunk, segmentStart, len(chunk))
+					if layerPos is not None:
+						if currentZ is not None and currentZ > lastLayerZ:
+							countedLines += chunk.count("\n", countedPos, layerPos)
+							layers.append(self._layer(chunkOffset + layerPos, countedLines + 1, currentZ))
+
+						lastLayerZ = currentZ
+
+				chunkOffset += len(chunk)
+				chunkLines += chunk.count("\n")
+
+		return LayerIndex(self._fileSize, self._printTime, layers)
+
+	def _findExtrusion(self, chunk, start, end):
+		if start >= end:
+			return None
+
+		match = self._regex_extrusion.search(chunk, start, end)
+		return match.start() if match else None
+
+	def _layer(self, offset, line, z):
+		fileFraction = float(offset) / self._fileSize if self._fileSize else 0.0
+		i = bisect.bisect_right(self._profileFilePoints, fileFraction) - 1
+		i = max(0, min(i, len(self._profileFilePoints) - 2))
+
+		fileStart, fileEnd = self._profileFilePoints[i], self._profileFilePoints[i + 1]
+		timeStart, timeEnd = self._profileTimePoints[i], self._profileTimePoints[i + 1]
+		if fileEnd > fileStart:
+			timeFraction = timeStart + (timeEnd - timeStart) * (fileFraction - fileStart) / (fileEnd - fileStart)
+		else:
+			timeFraction = timeStart
+
+		return (offset, line, z, timeFraction * self._printTime)
@@ -0,0 +1,78 @@
+# coding=utf-8
+__author__ = "AstroPrint Product Team <product@astroprint.com>"
+__license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
+__copyright__ = "Copyright (C) 2016-2020 3DaGoGo, Inc - Released under terms of the AGPLv3 License"
+
+# Time the fallback gcode analysis (used when the GCodeAnalyzer binary isn't available) takes on a generated file:
+# the line by line interpreter of test_gcode.py, the way it was before, and the chunked one of GcodeInterpreter.
+#
+# Run from the src folder:
+#
+#   PYTHONPATH=. python astroprint/printfiles/tests/benchmark_gcode.py [lines]
+
+import os
+import sys
+import time
+import random
+import tempfile
+
+from octoprint.settings import settings
+
+from astroprint.printfiles.gcode import GcodeInterpreter
+
+from test_gcode import LineByLineInterpreter
+
+def writeGcode(lines):
+	# layers of extruding moves with travels, retractions and comments, like a sliced file
+	random.seed(1)
+	fd, filename = tempfile.mkstemp(suffix=".gcode")
+	with os.fdopen(fd, "w") as f:
+		f.write(";filament_diameter = 1.75\nG21\nG90\nM82\nG28\nG92 E0\n")
+
+		e = 0.0
+		z = 0.0
+		for i in xrange(lines):
+			if i % 1000 == 0:
+				z += 0.2
+				f.write(";LAYER:%d\nG0 Z%.2f F3000\n" % (i / 1000, z))
+
+			r = random.random()
+			if r < 0.85:
+				e += random.uniform(0.01, 0.1)
+				f.write("G1 X%.3f Y%.3f E%.5f\n" % (random.uniform(50, 150), random.uniform(50, 150), e))
+			elif r < 0.95:
+				f.write("G0 F9000 X%.3f Y%.3f\n" % (random.uniform(50, 150), random.uniform(50, 150)))
+			else:
+				f.write("G1 F2400 E%.5f ; retract\n" % (e - 1))
+				f.write("G1 F2400 E%.5f\n" % e)
+
+	return filename
+
+def analyze(interpreterClass, filename):
+	interpreter = interpreterClass(None, filename)
+
+	start = time.time()
+	with open(filename, "r") as f:
+		interpreter._load(f)
+
+	return time.time() - start, interpreter
+
+def main(lines=400000):
+	settings(init=True, basedir=tempfile.mkdtemp())
+	filename = writeGcode(lines)
+
+	try:
+		with open(filename, "r") as f:
+			lines = sum(1 for line in f)
+
+		print "%d lines, %d bytes" % (lines, os.stat(filename).st_size)
+
+		for name, interpreterClass in (("line by line", LineByLineInterpreter), ("chunked", GcodeInterpreter)):
+			elapsed, interpreter = analyze(interpreterClass, filename)
+			print "%-14s %6.2f secs %8.0f lines/sec, print time %.1f min, filament %.1f mm" % (name, elapsed, lines / elapsed, interpreter.totalMoveTimeMinute, interpreter.extrusionAmount[0])
+
+	finally:
+		os.remove(filename)
+
+if __name__ == "__main__":
+	main(*[int(arg) for arg in sys.argv[1:2]])
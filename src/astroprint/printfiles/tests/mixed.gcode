@@ -0,0 +1,42 @@
+;FLAVOR:RepRap
+;filament_diameter = 1.75
+G21
+G90
+M82
+M104 S200
+G28
+G92 E0
+G1 Z0.200 F3000
+G1 X10.000 Y10.000 F6000
+G1 X40.000 Y10.000 E1.49672 F1800 ; first layer
+G1 X40.000 Y40.000 E2.99344
+G1 X10.000 Y40.000 E4.49016
+G1 X10.000 Y10.000 E5.98688
+G1 E4.98688 F2400
+G4 P500
+G0 Z0.400 F3000
+G1 E5.98688 F2400
+G1 X40.000 Y10.000 E7.48360 F1800
+G1X40.000Y40.000E8.98032
+G1 Y40.000 X10.000 E10.47704
+G1	X10.000 Y10.000 E11.97376 ; not a move, the G code is read up to the next space
+G91
+G1 Z0.200 F3000
+G1 X5.000 Y5.000 E12.47376
+G90
+M83
+G1 X15.000 Y15.000 E0.40000 F1800
+G1 X35.000 Y15.000 E1.00000
+G1 E-1.00000 F2400
+G4 S1
+M82
+G92 E0
+T1
+G1 X25.000 Y25.000 F6000
+G1 X30.000 Y30.000 E0.80000 F1800
+T0
+G92 X0 Y0
+G1 X2.000 Y2.000 E1.20000
+G1 Z10.000 F3000
+G28 X0 Y0
+M84
@@ -0,0 +1,34 @@
+;FLAVOR:Marlin
+;filament_diameter = 2.85
+G21
+G90
+M82
+G28
+G92 E0
+; first object
+G1 Z0.300 F3000
+G1 X10.000 Y10.000 F6000
+G1 X20.000 Y10.000 E0.40000 F1500
+G1 X20.000 Y20.000 E0.80000
+G1 Z0.500 F3000
+G1 X10.000 Y20.000 E1.20000 F1500
+G1 X10.000 Y10.000 E1.60000
+G1 Z0.700 F3000
+G1 X20.000 Y10.000 E2.00000 F1500
+G1 X20.000 Y20.000 E2.40000
+; clear the first object and print the second one next to it
+G1 E1.40000 F2400
+G1 Z10.000 F3000
+G1 X50.000 Y10.000 F6000
+G1 Z0.300 F3000
+G1 E2.40000 F2400
+G1 X60.000 Y10.000 E2.80000 F1500
+G1 X60.000 Y20.000 E3.20000
+G1 Z0.500 F3000
+G1 X50.000 Y20.000 E3.60000 F1500
+G1 X50.000 Y10.000 E4.00000
+G1 Z0.700 F3000
+G1 X60.000 Y10.000 E4.40000 F1500
+G1 X60.000 Y20.000 E4.80000
+G1 Z10.000 F3000
+M84
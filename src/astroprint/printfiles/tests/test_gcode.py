@@ -0,0 +1,221 @@
+import os
+import math
+import tempfile
+import unittest
+from mock import patch
+
+from octoprint.settings import settings
+
+from astroprint.printfiles.gcode import GcodeInterpreter
+
+FIXTURES = os.path.dirname(os.path.abspath(__file__))
+
+class LineByLineInterpreter(GcodeInterpreter):
+	# The fallback analysis as it was before reading the file in chunks, the results of both must match
+	def _load(self, gcodeFile):
+		pos = [0.0, 0.0, 0.0]
+		posOffset = [0.0, 0.0, 0.0]
+		currentE = [0.0]
+		totalExtrusion = [0.0]
+		maxExtrusion = [0.0]
+		currentExtruder = 0
+		totalMoveTimeMinute = 0.0
+		absoluteE = True
+		scale = 1.0
+		posAbs = True
+		feedRateXY = settings().getFloat(["printerParameters", "movementSpeed", "x"])
+		offsets = settings().get(["printerParameters", "extruderOffsets"])
+
+		for line in gcodeFile:
+			if ';' in line:
+				comment = line[line.find(';')+1:].strip()
+				if comment.startswith("filament_diameter"):
+					self._filamentDiameter = float(comment.split("=", 1)[1].strip())
+				line = line[0:line.find(';')]
+
+			G = self._getCodeInt(line, 'G')
+			M = self._getCodeInt(line, 'M')
+			T = self._getCodeInt(line, 'T')
+
+			if G is not None:
+				if G == 0 or G == 1:	#Move
+					x = self._getCodeFloat(line, 'X')
+					y = self._getCodeFloat(line, 'Y')
+					z = self._getCodeFloat(line, 'Z')
+					e = self._getCodeFloat(line, 'E')
+					f = self._getCodeFloat(line, 'F')
+					oldPos = pos
+					pos = pos[:]
+					if posAbs:
+						if x is not None:
+							pos[0] = x * scale + posOffset[0]
+						if y is not None:
+							pos[1] = y * scale + posOffset[1]
+						if z is not None:
+							pos[2] = z * scale + posOffset[2]
+					else:
+						if x is not None:
+							pos[0] += x * scale
+						if y is not None:
+							pos[1] += y * scale
+						if z is not None:
+							pos[2] += z * scale
+					if f is not None:
+						feedRateXY = f
+
+					moveType = 'move'
+					if e is not None:
+						if absoluteE:
+							e -= currentE[currentExtruder]
+						if e > 0.0:
+							moveType = 'extrude'
+						if e < 0.0:
+							moveType = 'retract'
+						totalExtrusion[currentExtruder] += e
+						currentE[currentExtruder] += e
+						if totalExtrusion[currentExtruder] > maxExtrusion[currentExtruder]:
+							maxExtrusion[currentExtruder] = totalExtrusion[currentExtruder]
+					else:
+						e = 0.0
+
+					if x is not None or y is not None or z is not None:
+						diffX = oldPos[0] - pos[0]
+						diffY = oldPos[1] - pos[1]
+						totalMoveTimeMinute += math.sqrt(diffX * diffX + diffY * diffY) / feedRateXY
+					elif moveType == "extrude":
+						diffX = oldPos[0] - pos[0]
+						diffY = oldPos[1] - pos[1]
+						time1 = math.sqrt(diffX * diffX + diffY * diffY) / feedRateXY
+						time2 = abs(e / feedRateXY)
+						totalMoveTimeMinute += max(time1, time2)
+					elif moveType == "retract":
+						totalMoveTimeMinute += abs(e / feedRateXY)
+
+				elif G == 4:	#Delay
+					S = self._getCodeFloat(line, 'S')
+					if S is not None:
+						totalMoveTimeMinute += S / 60.0
+					P = self._getCodeFloat(line, 'P')
+					if P is not None:
+						totalMoveTimeMinute += P / 60.0 / 1000.0
+				elif G == 20:	#Units are inches
+					scale = 25.4
+				elif G == 21:	#Units are mm
+					scale = 1.0
+				elif G == 28:	#Home
+					x = self._getCodeFloat(line, 'X')
+					y = self._getCodeFloat(line, 'Y')
+					z = self._getCodeFloat(line, 'Z')
+					center = [0.0,0.0,0.0]
+					if x is None and y is None and z is None:
+						pos = center
+					else:
+						pos = pos[:]
+						if x is not None:
+							pos[0] = center[0]
+						if y is not None:
+							pos[1] = center[1]
+						if z is not None:
+							pos[2] = center[2]
+				elif G == 90:	#Absolute position
+					posAbs = True
+				elif G == 91:	#Relative position
+					posAbs = False
+				elif G == 92:
+					x = self._getCodeFloat(line, 'X')
+					y = self._getCodeFloat(line, 'Y')
+					z = self._getCodeFloat(line, 'Z')
+					e = self._getCodeFloat(line, 'E')
+					if e is not None:
+						currentE[currentExtruder] = e
+					if x is not None:
+						posOffset[0] = pos[0] - x
+					if y is not None:
+						posOffset[1] = pos[1] - y
+					if z is not None:
+						posOffset[2] = pos[2] - z
+
+			elif M is not None:
+				if M == 82:   #Absolute E
+					absoluteE = True
+				elif M == 83:   #Relative E
+					absoluteE = False
+
+			elif T is not None:
+				posOffset[0] -= offsets[currentExtruder]["x"] if currentExtruder < len(offsets) else 0
+				posOffset[1] -= offsets[currentExtruder]["y"] if currentExtruder < len(offsets) else 0
+
+				currentExtruder = T
+
+				posOffset[0] += offsets[currentExtruder]["x"] if currentExtruder < len(offsets) else 0
+				posOffset[1] += offsets[currentExtruder]["y"] if currentExtruder < len(offsets) else 0
+
+				if len(currentE) <= currentExtruder:
+					for i in range(len(currentE), currentExtruder + 1):
+						currentE.append(0.0)
+				if len(maxExtrusion) <= currentExtruder:
+					for i in range(len(maxExtrusion), currentExtruder + 1):
+						maxExtrusion.append(0.0)
+				if len(totalExtrusion) <= currentExtruder:
+					for i in range(len(totalExtrusion), currentExtruder + 1):
+						totalExtrusion.append(0.0)
+
+		self.extrusionAmount = maxExtrusion
+		self.extrusionVolume = [0] * len(maxExtrusion)
+		for i in range(len(maxExtrusion)):
+			radius = self._filamentDiameter / 2
+			self.extrusionVolume[i] = (self.extrusionAmount[i] * (math.pi * radius * radius)) / 1000
+		self.totalMoveTimeMinute = totalMoveTimeMinute
+
+class GcodeInterpreterTestCase(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+		s = settings(init=True, basedir=tempfile.mkdtemp())
+		s.set(["printerParameters", "extruderOffsets"], [{"x": 0.0, "y": 0.0}, {"x": 15.0, "y": -2.0}])
+
+	def analyze(self, interpreterClass, fixture):
+		interpreter = interpreterClass(None, fixture)
+		with open(os.path.join(FIXTURES, fixture), "r") as f:
+			interpreter._load(f)
+
+		return interpreter
+
+	def assertSameAsLineByLine(self, fixture):
+		expected = self.analyze(LineByLineInterpreter, fixture)
+		result = self.analyze(GcodeInterpreter, fixture)
+
+		self.assertAlmostEqual(expected.totalMoveTimeMinute, result.totalMoveTimeMinute, places=9)
+		self.assertEqual(len(expected.extrusionAmount), len(result.extrusionAmount))
+		for amount, volume, expectedAmount, expectedVolume in zip(result.extrusionAmount, result.extrusionVolume, expected.extrusionAmount, expected.extrusionVolume):
+			self.assertAlmostEqual(expectedAmount, amount, places=9)
+			self.assertAlmostEqual(expectedVolume, volume, places=9)
+
+		return result
+
+	def assertLayers(self, result, layerCount, layerHeight, size):
+		self.assertEqual(layerCount, result.layerCount)
+		self.assertAlmostEqual(layerHeight, result.layer_height, places=6)
+		self.assertEqual(sorted(size.keys()), sorted(result.size.keys()))
+		for axis in size:
+			self.assertAlmostEqual(size[axis], result.size[axis], places=6)
+
+	def test_mixed_commands(self):
+		# relative moves and extrusion, tool change offsets, G92, delays and lines without spaces
+		result = self.assertSameAsLineByLine("mixed.gcode")
+
+		self.assertEqual(2, len(result.extrusionAmount))
+		self.assertLayers(result, 3, 0.2, {'x': 37.0, 'y': 35.0, 'z': 0.6})
+
+	def test_mixed_commands_small_chunks(self):
+		# lines split across chunks
+		with patch.object(GcodeInterpreter, "ANALYSIS_CHUNK_SIZE", 7):
+			result = self.assertSameAsLineByLine("mixed.gcode")
+
+		self.assertLayers(result, 3, 0.2, {'x': 37.0, 'y': 35.0, 'z': 0.6})
+
+	def test_sequential_print(self):
+		# Z goes down to print the second object, its layers are the same as the first one's
+		result = self.assertSameAsLineByLine("sequential.gcode")
+
+		self.assertLayers(result, 3, 0.2, {'x': 50.0, 'y': 10.0, 'z': 0.7})
@@ -10,7 +10,8 @@ from watchdog.events import PatternMatchingEventHandler
 
 class UploadCleanupWatchdogHandler(PatternMatchingEventHandler):
 	"""
-	Takes care of automatically deleting metadata entries for files that get deleted from the uploads folder
+	Takes care of automatically deleting metadata entries for files that get deleted from the uploads folder and
+	of keeping the file manager's catalog up to date with the files added or changed by others
 	"""
 
 	patterns = map(lambda x: "*.%s" % x, SUPPORTED_EXTENSIONS)
@@ -24,4 +25,23 @@ class UploadCleanupWatchdogHandler(PatternMatchingEventHandler):
 		if not filename:
 			return
 
-		fm.removeFileFromMetadata(filename)
\ No newline at end of file
+		fm.removeFileFromMetadata(filename)
+
+	def on_created(self, event):
+		self._refresh(event.src_path)
+
+	def on_modified(self, event):
+		if not event.is_directory:
+			self._refresh(event.src_path)
+
+	def on_moved(self, event):
+		self._refresh(event.src_path)
+		self._refresh(event.dest_path)
+
+	def _refresh(self, path):
+		fm = printerManager().fileManager
+		filename = fm._getBasicFilename(path)
+		if not filename:
+			return
+
+		fm.refreshFileData(filename)
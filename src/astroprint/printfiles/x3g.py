@@ -3,10 +3,12 @@ __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agp
 
 import logging
 import os
+import math
+import struct
 
 from octoprint.events import eventManager, Events
 
-from astroprint.printfiles import PrintFilesManager, MetadataAnalyzer, MetadataAnalyzerResults
+from astroprint.printfiles import PrintFilesManager, MetadataAnalyzer, MetadataAnalyzerResults, AnalysisAborted
 
 class PrintFileManagerX3g(PrintFilesManager):
 	name = 'x3g'
@@ -15,27 +17,222 @@ class PrintFileManagerX3g(PrintFilesManager):
 
 	def __init__(self):
 		self._logger = logging.getLogger(__name__)
-		self._metadataAnalyzer = X3gMetadataAnalyzer(getPathCallback=self.getAbsolutePath, loadedCallback=self._onMetadataAnalysisFinished)
+		self._metadataAnalyzer = X3gMetadataAnalyzer(getPathCallback=self.getAbsolutePath, loadedCallback=self._onMetadataAnalysisFinished, cachedResultCallback=self._applyCachedAnalysis)
 		super(PrintFileManagerX3g, self).__init__()
 
 class X3gMetadataAnalyzer(MetadataAnalyzer):
-	def __init__(self, getPathCallback, loadedCallback):
+	DEFAULT_PROFILE = "Replicator2" # machine profile used for the steps per mm when no printer is connected
+
+	def __init__(self, getPathCallback, loadedCallback, cachedResultCallback=None):
 		self._logger = logging.getLogger(__name__)
-		super(X3gMetadataAnalyzer, self).__init__(getPathCallback, loadedCallback)
 
-	def _analyzeFile(self, filename):
-		path = self._getPathCallback(filename)
+		super(X3gMetadataAnalyzer, self).__init__(getPathCallback, loadedCallback, cachedResultCallback)
+
+	def _analyzeFile(self, job):
+		path = self._getPathCallback(job.filename)
 		if path is None or not os.path.exists(path):
 			return
 
-		self._currentFile = filename
-		self._currentProgress = 0
+		self._logger.debug("Starting analysis of file %s" % job.filename)
+		eventManager().fire(Events.METADATA_ANALYSIS_STARTED, {"file": job.filename})
+
+		try:
+			x3g = X3gInterpreter(self._stepsPerMM())
+			x3g.progressCallback = job.onProgress
+			job.start(x3g)
+			x3g.load(path)
+			results = x3g
+
+		except AnalysisAborted:
+			raise
+
+		except Exception:
+			self._logger.error("Unable to analyze %s" % job.filename, exc_info=True)
+			results = MetadataAnalyzerResults()
+
+		self._logger.debug("Analysis of file %s finished, notifying callback" % job.filename)
+		self._loadedCallback(job.filename, results)
+
+	def _stepsPerMM(self):
+		# The connected printer's profile has the values read from its EEPROM
+		from astroprint.printer.manager import printerManager
+
+		profile = getattr(printerManager(), '_profile', None)
+		if profile is None:
+			import makerbot_driver
+			profile = makerbot_driver.profile.Profile(self.DEFAULT_PROFILE)
+
+		axes = profile.values['axes']
+		return [axes.get(axis, axes['A'])['steps_per_mm'] for axis in ('X', 'Y', 'Z', 'A', 'B')]
+
+class X3gInterpreter(object):
+	"""
+	Print time, filament, layers and size of an x3g file, worked out from the moves in it: their duration (or step
+	rate) and the steps of each axis, which are turned into mm with the printer's steps per mm. The A and B axes
+	are the extruders of tool 0 and 1.
+	"""
 
+	FILAMENT_DIAMETER = 1.75
+	PROGRESS_COMMANDS = 65536 # progress is reported and the abort flag checked every this many commands
+
+	# x, y, z, a, b at the start of all the moves
+	_queuePoint = struct.Struct("<iiiI") # 129: x, y, z, dda (microseconds per step)
+	_setPosition = struct.Struct("<iii") # 130
+	_delay = struct.Struct("<I") # 133: microseconds
+	_queueExtendedPoint = struct.Struct("<iiiiiI") # 139: dda (microseconds per step)
+	_setExtendedPosition = struct.Struct("<iiiii") # 140
+	_queueExtendedPointNew = struct.Struct("<iiiiiIB") # 142: duration (microseconds), relative axes
+	_queueExtendedPointX3g = struct.Struct("<iiiiiIBfh") # 155: dda rate (steps/sec), relative axes, distance (mm), feedrate (mm/sec * 64)
+
+	def __init__(self, stepsPerMM):
+		self._stepsPerMM = stepsPerMM
+		self._abort = False
+
+		self.layerList = None
+		self.extrusionAmount = [0]
+		self.extrusionVolume = [0]
+		self.totalMoveTimeMinute = 0
+		self.layerCount = None
+		self.size = None
+		self.layer_height = None
+		self.total_filament = None
+		self.filename = None
+		self.progressCallback = None
+
+	def abort(self):
+		self._abort = True
+
+	def load(self, filename):
+		from astroprint.printer.s3g.spool import X3gReader
+
+		self.filename = filename
+
+		stepsX, stepsY, stepsZ, stepsA, stepsB = [float(s) for s in self._stepsPerMM]
+		queuePoint = self._queuePoint.unpack_from
+		setPosition = self._setPosition.unpack_from
+		delay = self._delay.unpack_from
+		queueExtendedPoint = self._queueExtendedPoint.unpack_from
+		setExtendedPosition = self._setExtendedPosition.unpack_from
+		queueExtendedPointNew = self._queueExtendedPointNew.unpack_from
+		queueExtendedPointX3g = self._queueExtendedPointX3g.unpack_from
+
+		x = y = z = a = b = 0
+		seconds = 0.0
+		extrudedA = extrudedB = 0.0 # net extrusion, retractions discount it
+		maxExtrudedA = maxExtrudedB = 0.0
+		minX = minY = float("inf")
+		maxX = maxY = maxZ = float("-inf")
+		layersZ = []
+		lastLayerZ = None
+		commands = 0
+
+		reader = X3gReader(filename)
 		try:
-			self._logger.debug("Starting analysis of file %s" % filename)
-			eventManager().fire(Events.METADATA_ANALYSIS_STARTED, {"file": filename})
-			self._logger.debug("Analysis of file %s finished, notifying callback" % filename)
-			self._loadedCallback(self._currentFile, MetadataAnalyzerResults())
+			while True:
+				payload = reader.readPayload()
+				if payload is None:
+					break
+
+				commands += 1
+				if commands % self.PROGRESS_COMMANDS == 0:
+					if self._abort:
+						raise AnalysisAborted()
+
+					if self.progressCallback is not None and reader.size:
+						self.progressCallback(float(reader.pos) / reader.size)
+
+				command = ord(payload[0])
+
+				if command == 155:
+					nx, ny, nz, na, nb, ddaRate, relative, distance, feedrate = queueExtendedPointX3g(payload, 1)
+					if relative:
+						nx, ny, nz, na, nb = self._absolute(relative, (x, y, z, a, b), (nx, ny, nz, na, nb))
+
+					if distance > 0 and feedrate > 0:
+						seconds += distance / (feedrate / 64.0)
+					elif ddaRate:
+						seconds += max(abs(nx - x), abs(ny - y), abs(nz - z), abs(na - a), abs(nb - b)) / float(ddaRate)
+
+				elif command == 142:
+					nx, ny, nz, na, nb, duration, relative = queueExtendedPointNew(payload, 1)
+					if relative:
+						nx, ny, nz, na, nb = self._absolute(relative, (x, y, z, a, b), (nx, ny, nz, na, nb))
+
+					seconds += duration / 1000000.0
+
+				elif command == 139:
+					nx, ny, nz, na, nb, dda = queueExtendedPoint(payload, 1)
+					seconds += max(abs(nx - x), abs(ny - y), abs(nz - z), abs(na - a), abs(nb - b)) * dda / 1000000.0
+
+				elif command == 129:
+					nx, ny, nz, dda = queuePoint(payload, 1)
+					seconds += max(abs(nx - x), abs(ny - y), abs(nz - z)) * dda / 1000000.0
+					na, nb = a, b
+
+				elif command == 140:
+					x, y, z, a, b = setExtendedPosition(payload, 1)
+					continue
+
+				elif command == 130:
+					x, y, z = setPosition(payload, 1)
+					continue
+
+				elif command == 133:
+					seconds += delay(payload, 1)[0] / 1000000.0
+					continue
+
+				else:
+					continue
+
+				extruding = False
+				if na != a:
+					extrudedA += (na - a) / stepsA
+					if extrudedA > maxExtrudedA:
+						maxExtrudedA = extrudedA
+						extruding = True
+
+				if nb != b:
+					extrudedB += (nb - b) / stepsB
+					if extrudedB > maxExtrudedB:
+						maxExtrudedB = extrudedB
+						extruding = True
+
+				if extruding:
+					for px, py in ((x, y), (nx, ny)):
+						if px < minX: minX = px
+						if px > maxX: maxX = px
+						if py < minY: minY = py
+						if py > maxY: maxY = py
+
+					if nz > maxZ: maxZ = nz
+
+					if nz != lastLayerZ:
+						if lastLayerZ is None or nz > lastLayerZ:
+							layersZ.append(nz)
+						lastLayerZ = nz
+
+				x, y, z, a, b = nx, ny, nz, na, nb
+
 		finally:
-			self._currentProgress = None
-			self._currentFile = None
+			reader.close()
+
+		if self.progressCallback is not None:
+			self.progressCallback(100.0)
+
+		self.extrusionAmount = [maxExtrudedA, maxExtrudedB] if maxExtrudedB > 0 else [maxExtrudedA]
+		radius = self.FILAMENT_DIAMETER / 2
+		self.extrusionVolume = [(amount * (math.pi * radius * radius)) / 1000 for amount in self.extrusionAmount]
+		self.totalMoveTimeMinute = seconds / 60
+
+		self.layerCount = len(layersZ)
+		if self.layerCount > 0:
+			self.size = {
+				'x': abs(maxX - minX) / stepsX,
+				'y': abs(maxY - minY) / stepsY,
+				'z': maxZ / stepsZ
+			}
+			self.layer_height = (layersZ[1] - layersZ[0] if self.layerCount > 1 else layersZ[0]) / stepsZ
+
+	def _absolute(self, relative, position, target):
+		# bit n of relative is set when the n-th axis (x, y, z, a, b) is given as an offset from the current position
+		return [p + t if relative & (1 << i) else t for i, (p, t) in enumerate(zip(position, target))]
@@ -17,6 +17,8 @@ var SocketData = Backbone.Model.extend({
   _nextReconnectAttempt: null,
   _autoReconnectTimeouts: [1, 1, 2, 3, 5, 8, 13, 20, 40, 100],
   currentState: 0,
+  _state: null, //printer state kept up to date with the delta updates
+  _stateVersion: null,
   loggedUser: LOGGED_USER, //username or null
   fleetId: FLEET_ID,
   defaults: {
@@ -98,6 +100,10 @@ var SocketData = Backbone.Model.extend({
     }
     this._autoReconnectTrial = 0;
     this.set('box_reachable', 'reachable');
+    //Get only what changed in the printer state after the first update
+    this._state = null;
+    this._stateVersion = null;
+    this._socket.send(JSON.stringify({protocol: {deltas: true}}));
     //Get some initials
     if (this.extruder_count == null) {
       this.extruder_count = (app.printerProfile.toJSON())['extruder_count'];
@@ -128,6 +134,97 @@ var SocketData = Backbone.Model.extend({
   _onReconnectFailed: function() {
     console.error('reconnect failed');
   },
+  _applyStateChange: function(change) {
+    //change is [path, value] or [path] when the key was removed
+    var path = change[0];
+
+    if (path.length == 0) {
+      this._state = change[1];
+      return;
+    }
+
+    var parent = this._state;
+    for (var i = 0; i < path.length - 1; i++) {
+      parent = parent[path[i]];
+    }
+
+    if (change.length > 1) {
+      parent[path[path.length - 1]] = change[1];
+    } else {
+      delete parent[path[path.length - 1]];
+    }
+  },
+  _onCurrentData: function(data) {
+    var flags = data.state.flags;
+    if (data.temps.length) {
+      var temps = data.temps[data.temps.length-1];
+      var extruders = [];
+      var tool = null;
+
+      for (var i = 0; i < this.extruder_count; i++) {
+        if (temps['tool' + i]) {
+          tool = { "current": temps['tool' + i].actual, "target": temps['tool' + i].target }
+          extruders[i] = tool ;
+        }
+      }
+
+      this.set('temps', {
+        bed: temps.bed,
+        extruders: extruders
+      });
+    }
+
+    if (data.state && data.state.text != this.currentState) {
+      this.currentState = data.state.text;
+      var connectionClass = '';
+      var printerStatus = '';
+
+      if (data.state.state == 4) { //4 -> STATE_CONNECTING
+        connectionClass = 'blink-animation';
+        printerStatus = 'connecting';
+      } else if (flags.closedOrError) {
+        connectionClass = 'failed';
+        printerStatus = 'failed';
+      } else if (flags.operational) {
+        connectionClass = 'connected';
+        printerStatus = 'connected';
+      }
+
+      this.connectionView.setPrinterConnection(connectionClass);
+      this.set('printer', {status: printerStatus });
+    }
+
+    if (!flags.paused) {
+      this.set('printing', flags.printing);
+    }
+
+    this.set('paused', flags.paused);
+    this.set('camera', flags.camera);
+    this.set('isBedClear', flags.isBedClear)
+
+    if (flags.printing || flags.paused) {
+      var progress = data.progress;
+      var job = data.job;
+
+      var printFileName = job.file.printFileName ? job.file.printFileName : job.file.name
+
+      this.set('printing_progress', {
+        filename: job.file.name,
+        printFileName: printFileName,
+        rendered_image: job.file.rendered_image,
+        layer_count: job.layerCount,
+        current_layer: progress.currentLayer,
+        percent: progress.completion ? progress.completion.toFixed(1) : 0,
+        time_left: data.progress.printTimeLeft,
+        time_elapsed: progress.printTime ? progress.printTime : 0,
+        heating_up: flags.heatingUp
+      });
+    }
+
+    this.set('tool', data.tool);
+    this.set('printing_speed', data.printing_speed);
+    this.set('printing_flow', data.printing_flow);
+  },
   _onMessage: function(e) {
     for (var prop in e.data) {
       var data = e.data[prop];
@@ -146,75 +243,27 @@ var SocketData = Backbone.Model.extend({
         break;
 
         case "current": {
-          var flags = data.state.flags;
-          if (data.temps.length) {
-            var temps = data.temps[data.temps.length-1];
-            var extruders = [];
-            var tool = null;
-
-            for (var i = 0; i < this.extruder_count; i++) {
-              if (temps['tool' + i]) {
-                tool = { "current": temps['tool' + i].actual, "target": temps['tool' + i].target }
-                extruders[i] = tool ;
-              }
-            }
-
-            this.set('temps', {
-              bed: temps.bed,
-              extruders: extruders
-            });
-          }
-
-          if (data.state && data.state.text != this.currentState) {
-            this.currentState = data.state.text;
-            var connectionClass = '';
-            var printerStatus = '';
-
-            if (data.state.state == 4) { //4 -> STATE_CONNECTING
-              connectionClass = 'blink-animation';
-              printerStatus = 'connecting';
-            } else if (flags.closedOrError) {
-              connectionClass = 'failed';
-              printerStatus = 'failed';
-            } else if (flags.operational) {
-              connectionClass = 'connected';
-              printerStatus = 'connected';
-            }
-
-            this.connectionView.setPrinterConnection(connectionClass);
-            this.set('printer', {status: printerStatus });
-          }
+          this._onCurrentData(data);
+        }
+        break;
 
-          if (!flags.paused) {
-            this.set('printing', flags.printing);
-          }
+        case "currentSnapshot": {
+          this._stateVersion = data.version;
+          this._state = data.data;
+          this._onCurrentData(_.extend({}, this._state, {temps: data.temps}));
+        }
+        break;
 
-          this.set('paused', flags.paused);
-          this.set('camera', flags.camera);
-          this.set('isBedClear', flags.isBedClear)
-
-          if (flags.printing || flags.paused) {
-            var progress = data.progress;
-            var job = data.job;
-
-            var printFileName = job.file.printFileName ? job.file.printFileName : job.file.name
-
-            this.set('printing_progress', {
-              filename: job.file.name,
-              printFileName: printFileName,
-              rendered_image: job.file.rendered_image,
-              layer_count: job.layerCount,
-              current_layer: progress.currentLayer,
-              percent: progress.completion ? progress.completion.toFixed(1) : 0,
-              time_left: data.progress.printTimeLeft,
-              time_elapsed: progress.printTime ? progress.printTime : 0,
-              heating_up: flags.heatingUp
-            });
+        case "currentDelta": {
+          if (this._state && data.base == this._stateVersion) {
+            _.each(data.changes, this._applyStateChange, this);
+            this._stateVersion = data.version;
+            this._onCurrentData(_.extend({}, this._state, {temps: data.temps}));
+          } else {
+            //We missed an update, ask for the whole state again
+            this._stateVersion = null;
+            this._socket.send(JSON.stringify({protocol: {resync: true}}));
           }
-
-          this.set('tool', data.tool);
-          this.set('printing_speed', data.printing_speed);
-          this.set('printing_flow', data.printing_flow);
         }
         break;
 
@@ -64,12 +64,25 @@ var USBFileCollection = Backbone.Collection.extend({
   {
     return this.localStorages.indexOf(location) >= 0;
   },
-  syncLocation: function(location)
+  pageSize: 100,
+  total: null,
+  syncLocation: function(location, offset)
   {
     return this.fetch({
+      remove: !offset,
       data: {
-        location: location ? location : '/'
+        location: location ? location : '/',
+        offset: offset || 0,
+        limit: this.pageSize
       }
-    });
+    })
+      .done(_.bind(function(data, status, xhr){
+        var total = xhr.getResponseHeader('X-Total-Count');
+        this.total = total === null ? this.length : parseInt(total);
+      }, this));
+  },
+  hasMore: function()
+  {
+    return this.total !== null && this.length < this.total;
   }
 });
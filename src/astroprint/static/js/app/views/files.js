@@ -553,23 +553,10 @@ var PrintFilesListView = Backbone.View.extend({
           this.usb_file_views.push(backView);
         }
 
-        this.usbfile_list.each(_.bind(function(file/*, idx*/) {
-          var usb_file_view = null
-          if(this.usbfile_list.extensionMatched(file.get('name'))) {
-            usb_file_view = new USBFileView(file, this);
-          } else {
-            usb_file_view = new BrowsingFileView(
-              {
-                parentView: this,
-                file: file
-              });
-          }
-
-          this.usb_file_views.push( usb_file_view );
-
-        }, this));
+        this.usb_file_views = this.usb_file_views.concat(this.createUSBFileViews(this.usbfile_list.models));
 
         this.render();
+        this.loadMoreUSBFiles(path);
       },this))
       .fail(function(){
         noty({text: "There was an error retrieving files in the drive", timeout: 3000});
@@ -578,6 +565,52 @@ var PrintFilesListView = Backbone.View.extend({
         this.$('.loading-button.sync').removeClass('loading');
       },this))
   },
+  createUSBFileViews: function(files)
+  {
+    return _.map(files, _.bind(function(file) {
+      if(this.usbfile_list.extensionMatched(file.get('name'))) {
+        return new USBFileView(file, this);
+      } else {
+        return new BrowsingFileView(
+          {
+            parentView: this,
+            file: file
+          });
+      }
+    }, this));
+  },
+  loadMoreUSBFiles: function(path)
+  {
+    //The first page is already showing, the rest of the folder is appended as it arrives
+    if (!this.usbfile_list.hasMore() || this.storage_control_view.exploringLocation != path) {
+      return;
+    }
+
+    var loaded = this.usbfile_list.length;
+
+    this.usbfile_list.syncLocation(path, loaded)
+      .done(_.bind(function(){
+        if (this.storage_control_view.exploringLocation != path) {
+          return;
+        }
+
+        var views = this.createUSBFileViews(this.usbfile_list.models.slice(loaded));
+        this.usb_file_views = this.usb_file_views.concat(views);
+
+        if (this.storage_control_view.selected == 'USB') {
+          var container = this.$('.design-list .container-files');
+          _.each(views, function (p) {
+            container.append(p.$el);
+            p.render();
+          });
+        }
+
+        this.loadMoreUSBFiles(path);
+      }, this))
+      .fail(function(){
+        noty({text: "There was an error retrieving files in the drive", timeout: 3000});
+      });
+  },
   render: function()
   {
     var listNoFilteredEl = this.$('.design-list');
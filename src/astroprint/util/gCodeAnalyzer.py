@@ -2,8 +2,8 @@
 import json
 import logging
 
-from threading import Thread as thread
-from sarge import run, Capture
+from threading import Thread as thread, Lock
+from sarge import Command, Capture
 
 class GCodeAnalyzer(thread):
 
@@ -27,70 +27,95 @@ class GCodeAnalyzer(thread):
 		self.totalFilament = None
 		self.parent = parent
 
+		self._processLock = Lock()
+		self._process = None
+		self._aborted = False
+
 	def makeCalcs(self):
 		self.start()
 
-	def run(self):
+	def abort(self):
+		# stops the GCodeAnalyzer process, no callback is called after it
+		with self._processLock:
+			self._aborted = True
+
+			if self._process is not None:
+				try:
+					self._process.terminate()
+				except OSError:
+					pass # already finished
 
-		gcodeData = []
+	def run(self):
 
 		try:
-			pipe = run(
-				('%s/GCodeAnalyzer "%s" 1' if self.layersInfo else '%s/GCodeAnalyzer "%s"') % (
-					'/usr/bin/astroprint',
-					self.filename
-				), stdout=Capture())
+			gcodeData = self._runAnalyzer()
 
-			if pipe.returncode == 0:
-				try:
-					gcodeData = json.loads(pipe.stdout.text)
+			if gcodeData is not None:
+				if self.layersInfo:
+					self.layerList =  gcodeData['layers']
 
-					if self.layersInfo:
-						self.layerList =  gcodeData['layers']
+				self.totalPrintTime = gcodeData['print_time']
 
-					self.totalPrintTime = gcodeData['print_time']
+				self.layerCount = gcodeData['layer_count']
 
-					self.layerCount = gcodeData['layer_count']
+				self.size = gcodeData['size']
 
-					self.size = gcodeData['size']
+				self.layerHeight = gcodeData['layer_height']
 
-					self.layerHeight = gcodeData['layer_height']
+				self.totalFilament = None#total_filament has not got any information
 
-					self.totalFilament = None#total_filament has not got any information
+		except:
+			self._logger.warn('Error executing GCode Analyzer', exc_info=True)
+			gcodeData = None
 
-					self.readyCallback(self.layerList,self.totalPrintTime,self.layerCount,self.size,self.layerHeight,self.totalFilament,self.parent)
+		if self._aborted:
+			return
 
+		if gcodeData is None:
+			if self.exceptionCallback:
+				parameters = {}
+				parameters['parent'] = self.parent
+				parameters['filename'] = self.filename
 
-				except ValueError:
-					self._logger.error("Bad gcode data returned: %s" % pipe.stdout.text)
-					gcodeData = None
+				self.exceptionCallback(parameters)
 
-					if self.exceptionCallback:
-						parameters = {}
-						parameters['parent'] = self.parent
-						parameters['filename'] = self.filename
+		else:
+			self.readyCallback(self.layerList,self.totalPrintTime,self.layerCount,self.size,self.layerHeight,self.totalFilament,self.parent)
 
-						self.exceptionCallback(parameters)
+	def _runAnalyzer(self):
+		stdout = Capture()
 
-			else:
-				self._logger.warn('Error executing GCode Analyzer')
-				gcodeData = None
+		with self._processLock:
+			if self._aborted:
+				return None
 
+			self._process = Command(
+				('%s/GCodeAnalyzer "%s" 1' if self.layersInfo else '%s/GCodeAnalyzer "%s"') % (
+					'/usr/bin/astroprint',
+					self.filename
+				), stdout=stdout)
+			self._process.run(async=True)
 
-				if self.exceptionCallback:
-					parameters = {}
-					parameters['parent'] = self.parent
-					parameters['filename'] = self.filename
+		try:
+			self._process.wait()
 
-					self.exceptionCallback(parameters)
+		finally:
+			with self._processLock:
+				returncode = self._process.returncode
+				self._process = None
 
-		except:
-			gcodeData = None
+		if self._aborted:
+			return None
 
-			if self.exceptionCallback:
-				parameters = {}
-				parameters['parent'] = self.parent
-				parameters['filename'] = self.filename
+		if returncode != 0:
+			self._logger.warn('Error executing GCode Analyzer')
+			return None
 
-				self.exceptionCallback(parameters)
+		try:
+			gcodeData = json.loads(stdout.text)
+
+		except ValueError:
+			self._logger.error("Bad gcode data returned: %s" % stdout.text)
+			return None
 
+		return gcodeData
@@ -135,3 +135,36 @@ class PacketStreamDecoder(object):
 
         else:
             raise Exception('Parser in bad state: too much data provided?')
+
+    def parse_bytes(self, data):
+        """
+        Same as parse_byte for each byte of the given bytearray, the payload is copied in one go.
+        @param data bytearray with bytes added to the stream, at most bytes_needed() of them
+        """
+        i = 0
+        while i < len(data):
+            if self.state == 'WAIT_FOR_DATA':
+                count = min(self.expected_length - len(self.payload), len(data) - i)
+                self.payload.extend(data[i:i + count])
+                i += count
+                if len(self.payload) >= self.expected_length:
+                    self.state = 'WAIT_FOR_CRC'
+
+            else:
+                self.parse_byte(data[i])
+                i += 1
+
+    def bytes_needed(self):
+        """
+        Number of bytes that can be read from the stream without reading past the end of the packet
+        """
+        if self.state == 'WAIT_FOR_HEADER':
+            return 2 # header and length
+
+        elif self.state == 'WAIT_FOR_DATA':
+            return self.expected_length - len(self.payload) + 1 # rest of the payload and CRC
+
+        elif self.state == 'PAYLOAD_READY':
+            return 0
+
+        return 1
@@ -86,7 +86,8 @@ class StreamWriter(AbstractWriter):
 
 				try:
 					while (decoder.state != 'PAYLOAD_READY'):
-						# Try to read a byte
+						# Read as much of the response as the decoder knows is coming: header and length first,
+						# then the payload and CRC
 						data = ''
 						while data == '':
 							if (time.time() > start_time + makerbot_driver.timeout_length):
@@ -95,11 +96,9 @@ class StreamWriter(AbstractWriter):
 
 							# pySerial streams handle blocking read. Be sure to set up a timeout when
 							# initializing them, or this could hang forever
-							data = self.file.read(1)
+							data = self.file.read(decoder.bytes_needed())
 
-						data = ord(data)
-						#self._serialLogEnabled and self._serialLogger.info("byte read: 0x%x" % data)
-						decoder.parse_byte(data)
+						decoder.parse_bytes(bytearray(data))
 
 					self._serialLogEnabled and self._serialLogger.info('{"event":"response_received", "data": "%s"}' % ' '.join('0x{:02x}'.format(x) for x in decoder.payload) )
 					makerbot_driver.Encoder.check_response_code(decoder.payload[0])
@@ -5,10 +5,14 @@ __author__ = "Gina Häußge <osd@foosel.net>"
 __license__ = 'GNU Affero General Public License http://www.gnu.org/licenses/agpl.html'
 
 import datetime
+import heapq
 import logging
 import subprocess
 import Queue
 import threading
+import time
+
+from collections import deque
 
 from octoprint.settings import settings
 
@@ -118,32 +122,66 @@ def eventManager():
 class EventManager(object):
 	"""
 	Handles receiving events and dispatching them to subscribers
+
+	Listeners are grouped by the object they belong to (bound methods of the same object share a group) and each
+	group has its own mailbox. A pool of workers delivers the mailboxes, a group is only ever delivered by one worker
+	at a time so its listeners get events in the order they were fired, while a slow group doesn't hold back the rest.
+
+	Events in COALESCED_EVENTS only carry the latest state: if one is still waiting to be delivered to a listener when
+	it's fired again, the pending one is updated with the new payload instead of queueing another.
 	"""
 
+	WORKERS = 4
+	MAX_EVENTS_PER_TURN = 20 # Events delivered from a mailbox before giving other mailboxes a turn
+	SLOW_LISTENER_SECS = 1.0
+	COALESCED_EVENTS = frozenset([Events.PRINTING_PROGRESS, Events.TEMPERATURE_CHANGE])
+
 	def __init__(self):
 		self._registeredListeners = {}
+		self._mailboxes = {} # listener group -> _ListenerMailbox
+		self._lock = threading.Lock()
 		self._logger = logging.getLogger(__name__)
 
-		self._queue = Queue.PriorityQueue()
-		self._worker = threading.Thread(target=self._work)
-		self._worker.daemon = True
-		self._worker.start()
+		self._queue = Queue.Queue() # mailboxes with events to deliver
+		self._workers = []
+		for i in range(self.WORKERS):
+			worker = threading.Thread(target=self._work, name="EventDispatcher-%d" % i)
+			worker.daemon = True
+			worker.start()
+			self._workers.append(worker)
 
 	def _work(self):
 		while True:
-			(event, payload) = self._queue.get(True)
+			mailbox = self._queue.get(True)
 
-			eventListeners = self._registeredListeners.get(event, None)
-			if eventListeners is None:
-				return
-			self._logger.debug("Firing event: %s (Payload: %r)" % (event, payload))
+			for i in range(self.MAX_EVENTS_PER_TURN):
+				entry = mailbox.next()
+				if entry is None:
+					break
 
-			for listener in eventListeners:
-				self._logger.debug("Sending action to %r" % listener)
-				try:
-					listener(event, payload)
-				except:
-					self._logger.exception("Got an exception while sending event %s (Payload: %r) to %s" % (event, payload, listener))
+				self._deliver(mailbox, *entry)
+
+			if mailbox.release():
+				self._queue.put(mailbox)
+
+	def _deliver(self, mailbox, event, payload, listener, firedAt):
+		self._logger.debug("Sending event %s to %r (Payload: %r)" % (event, listener, payload))
+
+		startedAt = time.time()
+		try:
+			listener(event, payload)
+		except:
+			self._logger.exception("Got an exception while sending event %s (Payload: %r) to %s" % (event, payload, listener))
+
+		finishedAt = time.time()
+		mailbox.recordDelivery(listener, startedAt - firedAt, finishedAt - startedAt)
+
+		if finishedAt - startedAt > self.SLOW_LISTENER_SECS:
+			self._logger.warn("Listener %r took %.2f secs to handle event %s" % (listener, finishedAt - startedAt, event))
+
+	def _listenerGroup(self, callback):
+		owner = getattr(callback, "im_self", None)
+		return callback if owner is None else owner
 
 	def fire(self, event, payload=None):
 		"""
@@ -156,23 +194,48 @@ class EventManager(object):
 		payload being a payload object specific to the event.
 		"""
 
-		if not event in self._registeredListeners.keys():
-			return
-		self._queue.put((event, payload), 0)
+		with self._lock:
+			eventListeners = self._registeredListeners.get(event)
+			if not eventListeners:
+				return
+
+			self._logger.debug("Firing event: %s (Payload: %r)" % (event, payload))
+
+			firedAt = time.time()
+			coalesce = event in self.COALESCED_EVENTS
+			for listener in eventListeners:
+				mailbox = self._mailboxes[self._listenerGroup(listener)]
+				if mailbox.post(event, payload, listener, firedAt, coalesce):
+					self._queue.put(mailbox)
+
+	def hasSubscribers(self, event):
+		"""
+		True if anyone is subscribed to the event. Producers of frequent events use it to skip building payloads
+		nobody is going to get.
+		"""
+		return bool(self._registeredListeners.get(event))
 
 	def subscribe(self, event, callback):
 		"""
 		Subscribe a listener to an event -- pass in the event name (as a string) and the callback object
 		"""
 
-		if not event in self._registeredListeners.keys():
-			self._registeredListeners[event] = []
+		with self._lock:
+			if not event in self._registeredListeners.keys():
+				self._registeredListeners[event] = []
 
-		if callback in self._registeredListeners[event]:
-			# callback is already subscribed to the event
-			return
+			if callback in self._registeredListeners[event]:
+				# callback is already subscribed to the event
+				return
+
+			self._registeredListeners[event].append(callback)
+
+			group = self._listenerGroup(callback)
+			mailbox = self._mailboxes.get(group)
+			if mailbox is None:
+				mailbox = self._mailboxes[group] = _ListenerMailbox(group)
+			mailbox.subscriptions += 1
 
-		self._registeredListeners[event].append(callback)
 		self._logger.debug("Subscribed listener %r for event %s" % (callback, event))
 
 	def unsubscribe (self, event, callback):
@@ -180,17 +243,275 @@ class EventManager(object):
 		Unsubscribe a listener from an event -- pass in the event name (as string) and the callback object
 		"""
 
-		if not event in self._registeredListeners:
-			# no callback registered for callback, just return
-			return
+		with self._lock:
+			if not event in self._registeredListeners:
+				# no callback registered for callback, just return
+				return
 
-		if not callback in self._registeredListeners[event]:
-			# callback not subscribed to event, just return
-			return
+			if not callback in self._registeredListeners[event]:
+				# callback not subscribed to event, just return
+				return
+
+			self._registeredListeners[event].remove(callback)
+
+			# events already waiting for the callback are not delivered anymore
+			group = self._listenerGroup(callback)
+			mailbox = self._mailboxes[group]
+			mailbox.discard(event, callback)
+			mailbox.subscriptions -= 1
+			if mailbox.subscriptions == 0:
+				del self._mailboxes[group]
 
-		self._registeredListeners[event].remove(callback)
 		self._logger.debug("Unsubscribed listener %r for event %s" % (callback, event))
 
+	def getMetrics(self):
+		"""
+		Returns the number of events waiting to be delivered and, for each listener, the events waiting for it, the
+		events delivered and coalesced and the latency (secs from fire to delivery) and duration of the deliveries
+		"""
+
+		with self._lock:
+			mailboxes = self._mailboxes.values()
+
+		listeners = {}
+		for mailbox in mailboxes:
+			listeners.update(mailbox.metrics())
+
+		return {
+			"pending": sum(m["pending"] for m in listeners.values()),
+			"listeners": listeners
+		}
+
+
+class Throttle(object):
+	"""
+	Producer side rate limit for updates that only carry the latest state. Calling the throttle calls func right
+	away if it hasn't been called in the last interval seconds, otherwise one more call is made when the interval is
+	over and the calls in between are dropped. func takes no arguments, it should read the state when it's called.
+
+	The delayed calls of all the throttles are made from one scheduler thread.
+	"""
+
+	def __init__(self, interval, func):
+		self._interval = interval
+		self._func = func
+		self._lock = threading.Lock()
+		self._lastCall = 0
+		self._scheduled = None # token of the delayed call waiting in the scheduler
+
+	def __call__(self):
+		if self._interval > 0:
+			with self._lock:
+				if self._scheduled is not None:
+					return
+
+				wait = self._lastCall + self._interval - time.time()
+				if wait > 0:
+					self._scheduled = object()
+					_throttleScheduler().schedule(time.time() + wait, self, self._scheduled)
+					return
+
+				self._lastCall = time.time()
+
+		self._func()
+
+	def cancel(self):
+		with self._lock:
+			# the scheduler skips the call when its token is no longer the scheduled one
+			self._scheduled = None
+
+	def _delayedCall(self, token):
+		with self._lock:
+			if self._scheduled is not token: # cancelled
+				return
+
+			self._scheduled = None
+			self._lastCall = time.time()
+
+		self._func()
+
+	@staticmethod
+	def intervalForEvent(event):
+		"""
+		Interval between calls for the max rate set for the event in "events > maxRate" (per second, 0 for no limit)
+		"""
+		rate = settings().getFloat(["events", "maxRate", event])
+		return 1.0 / rate if rate else 0
+
+
+_instanceThrottleScheduler = None
+_instanceThrottleSchedulerLock = threading.Lock()
+
+def _throttleScheduler():
+	global _instanceThrottleScheduler
+
+	with _instanceThrottleSchedulerLock:
+		if _instanceThrottleScheduler is None:
+			_instanceThrottleScheduler = _ThrottleScheduler()
+
+	return _instanceThrottleScheduler
+
+
+class _ThrottleScheduler(object):
+	"""
+	Makes the delayed calls of the throttles when they're due, in a single daemon thread
+	"""
+
+	def __init__(self):
+		self._logger = logging.getLogger(__name__)
+		self._condition = threading.Condition()
+		self._calls = [] # heap of (due, sequence, throttle, token)
+		self._sequence = 0
+
+		worker = threading.Thread(target=self._work, name="ThrottleScheduler")
+		worker.daemon = True
+		worker.start()
+
+	def schedule(self, due, throttle, token):
+		with self._condition:
+			self._sequence += 1
+			heapq.heappush(self._calls, (due, self._sequence, throttle, token))
+			if self._calls[0][2] is throttle:
+				self._condition.notify()
+
+	def _work(self):
+		while True:
+			with self._condition:
+				while True:
+					if self._calls:
+						wait = self._calls[0][0] - time.time()
+						if wait <= 0:
+							break
+
+						self._condition.wait(wait)
+
+					else:
+						self._condition.wait()
+
+				due, sequence, throttle, token = heapq.heappop(self._calls)
+
+			try:
+				throttle._delayedCall(token)
+			except:
+				self._logger.exception("Got an exception while making a throttled call")
+
+
+class _ListenerMailbox(object):
+	"""
+	Events waiting to be delivered to a listener group. Only one worker holds a mailbox at a time.
+	"""
+
+	def __init__(self, group):
+		self.group = group
+		self.subscriptions = 0
+
+		self._lock = threading.Lock()
+		self._pending = deque() # [event, payload, listener, firedAt]
+		self._coalescing = {} # (event, listener) -> pending entry
+		self._scheduled = False
+		self._stats = {}
+
+	def post(self, event, payload, listener, firedAt, coalesce):
+		"""
+		Adds an event for the listener, returns True if the mailbox needs to be handed to a worker
+		"""
+		with self._lock:
+			if coalesce:
+				entry = self._coalescing.get((event, listener))
+				if entry is not None:
+					entry[1] = payload # keeps its place in line and the time of the first fire
+					self._listenerStats(listener)["coalesced"] += 1
+					return False
+
+				entry = [event, payload, listener, firedAt]
+				self._coalescing[(event, listener)] = entry
+
+			else:
+				entry = [event, payload, listener, firedAt]
+
+			self._pending.append(entry)
+
+			if self._scheduled:
+				return False
+
+			self._scheduled = True
+			return True
+
+	def next(self):
+		with self._lock:
+			if not self._pending:
+				return None
+
+			entry = self._pending.popleft()
+			if self._coalescing.get((entry[0], entry[2])) is entry:
+				del self._coalescing[(entry[0], entry[2])]
+
+			return entry
+
+	def release(self):
+		"""
+		Called by the worker when it's done with the mailbox, returns True if it has to be handed to a worker again
+		"""
+		with self._lock:
+			self._scheduled = bool(self._pending)
+			return self._scheduled
+
+	def discard(self, event, listener):
+		with self._lock:
+			self._pending = deque(e for e in self._pending if e[0] != event or e[2] != listener)
+			self._coalescing.pop((event, listener), None)
+
+	def recordDelivery(self, listener, latency, duration):
+		with self._lock:
+			stats = self._listenerStats(listener)
+			stats["delivered"] += 1
+			stats["lastLatency"] = latency
+			stats["maxLatency"] = max(stats["maxLatency"], latency)
+			stats["totalLatency"] += latency
+			stats["lastDuration"] = duration
+			stats["maxDuration"] = max(stats["maxDuration"], duration)
+
+	def metrics(self):
+		with self._lock:
+			pending = {}
+			for entry in self._pending:
+				pending[entry[2]] = pending.get(entry[2], 0) + 1
+
+			result = {}
+			for listener, stats in self._stats.iteritems():
+				delivered = stats["delivered"]
+				result[repr(listener)] = {
+					"pending": pending.get(listener, 0),
+					"delivered": delivered,
+					"coalesced": stats["coalesced"],
+					"lastLatency": stats["lastLatency"],
+					"avgLatency": stats["totalLatency"] / delivered if delivered else None,
+					"maxLatency": stats["maxLatency"],
+					"lastDuration": stats["lastDuration"],
+					"maxDuration": stats["maxDuration"]
+				}
+
+			for listener, count in pending.iteritems():
+				if listener not in self._stats:
+					result[repr(listener)] = {"pending": count, "delivered": 0, "coalesced": 0}
+
+			return result
+
+	def _listenerStats(self, listener):
+		stats = self._stats.get(listener)
+		if stats is None:
+			stats = self._stats[listener] = {
+				"delivered": 0,
+				"coalesced": 0,
+				"lastLatency": None,
+				"maxLatency": 0.0,
+				"totalLatency": 0.0,
+				"lastDuration": None,
+				"maxDuration": 0.0
+			}
+
+		return stats
+
 
 class GenericEventListener(object):
 	"""
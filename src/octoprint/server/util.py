@@ -9,7 +9,7 @@ from tornado.httpclient import AsyncHTTPClient, HTTPRequest
 from flask import url_for, make_response, request, current_app
 from flask_login import login_required, login_user, current_user
 from werkzeug.utils import redirect
-from ext.sockjs.tornado import SockJSConnection
+from ext.sockjs.tornado import SockJSConnection, proto
 from itsdangerous import base64_decode
 
 import datetime
@@ -134,6 +134,97 @@ def getApiKey(request):
 #~~ Printer state
 
 
+class CurrentDataEncoder(object):
+	"""
+	Serializes the printer state pushed to the sockjs clients once per update for all of them.
+
+	Clients that negotiate deltas get a "currentSnapshot" with the whole state and a version first and a
+	"currentDelta" with only the values that changed since the previous version after that. Changes are
+	[path, value] pairs, or [path] for a key that was removed. Temperatures reported since the previous update go
+	along in both messages.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self._data = None
+		self._previousData = None
+		self._version = 0
+		self._temperatureSequence = None
+		self._temps = []
+		self._stateJson = None
+		self._snapshotJson = None
+		self._deltaJson = None
+
+	def legacyJson(self, data, temps):
+		"""
+		The "current" message of clients that didn't negotiate deltas, only the temperatures are encoded per client
+		"""
+		with self._lock:
+			self._update(data)
+			if self._stateJson is None:
+				self._stateJson = proto.json_encode(data)
+
+			stateJson = self._stateJson
+
+		# data is a non empty dict, so its JSON ends with "}"
+		return '{"current":%s,"temps":%s}}' % (stateJson[:-1], proto.json_encode(temps))
+
+	def snapshotJson(self, data):
+		with self._lock:
+			self._update(data)
+			if self._snapshotJson is None:
+				self._snapshotJson = proto.json_encode({"currentSnapshot": {
+					"version": self._version,
+					"data": data,
+					"temps": self._temps
+				}})
+
+			return self._snapshotJson
+
+	def deltaJson(self, data):
+		with self._lock:
+			self._update(data)
+			if self._deltaJson is None:
+				changes = []
+				self._diff(self._previousData, data, [], changes)
+				self._deltaJson = proto.json_encode({"currentDelta": {
+					"version": self._version,
+					"base": self._version - 1,
+					"changes": changes,
+					"temps": self._temps
+				}})
+
+			return self._deltaJson
+
+	def _update(self, data):
+		# all the clients get the same data object on each update
+		if data is self._data:
+			return
+
+		self._previousData = self._data
+		self._data = data
+		self._version += 1
+		self._temps, self._temperatureSequence = printerManager().getTemperatureHistory().samplesSince(self._temperatureSequence)
+		self._stateJson = None
+		self._snapshotJson = None
+		self._deltaJson = None
+
+	def _diff(self, old, new, path, changes):
+		if isinstance(old, dict) and isinstance(new, dict):
+			for key, value in new.iteritems():
+				if key not in old:
+					changes.append([path + [key], value])
+				else:
+					self._diff(old[key], value, path + [key], changes)
+
+			for key in old.keys():
+				if key not in new:
+					changes.append([path + [key]])
+
+		elif old != new:
+			changes.append([path, new])
+
+
 class PrinterStateConnection(SockJSConnection):
 	EVENTS = [Events.UPDATED_FILES, Events.METADATA_ANALYSIS_FINISHED, Events.SLICING_STARTED, Events.SLICING_DONE, Events.SLICING_FAILED,
 				Events.TRANSFER_STARTED, Events.TRANSFER_DONE, Events.CLOUD_DOWNLOAD, Events.ASTROPRINT_STATUS, Events.SOFTWARE_UPDATE,
@@ -141,14 +232,17 @@ class PrinterStateConnection(SockJSConnection):
 				Events.GSTREAMER_EVENT, Events.TOOL_CHANGE, Events.COPY_TO_HOME_PROGRESS, Events.EXTERNAL_DRIVE_MOUNTED,
 				Events.EXTERNAL_DRIVE_EJECTED, Events.EXTERNAL_DRIVE_PHISICALLY_REMOVED, Events.LOCAL_VIDEO_STREAMING_STOPPED, Events.PRINTER_PROMPT]
 
+	_encoder = CurrentDataEncoder() # shared by all the connections
+
 	def __init__(self, userManager, eventManager, session):
 		SockJSConnection.__init__(self, session)
 
 		self._logger = logging.getLogger(__name__)
 
-		self._temperatureBacklog = []
-		self._temperatureBacklogMutex = threading.Lock()
+		self._temperatureSequence = None # temperature reports already sent to the client
 		self._emitLock = threading.Lock()
+		self._deltas = False # the client asked for delta updates
+		self._needsSnapshot = False
 
 		self._userManager = userManager
 		self._eventManager = eventManager
@@ -206,18 +300,40 @@ class PrinterStateConnection(SockJSConnection):
 			self._eventManager.unsubscribe(event, self._onEvent)
 
 	def on_message(self, message):
-		pass
+		try:
+			message = json.loads(message)
+		except ValueError:
+			return
+
+		# {"protocol": {"deltas": true}} to get delta updates of the current data,
+		# {"protocol": {"resync": true}} to get a new snapshot when a delta doesn't match the version the client has
+		options = message.get("protocol") if isinstance(message, dict) else None
+		if isinstance(options, dict):
+			if "deltas" in options:
+				self._deltas = bool(options["deltas"])
+
+			self._needsSnapshot = self._deltas
+			if self._needsSnapshot:
+				printerManager().refreshStateData()
 
 	def sendCurrentData(self, data):
-		# add current temperature, log and message backlogs to sent data
-		with self._temperatureBacklogMutex:
-			temperatures = self._temperatureBacklog
-			self._temperatureBacklog = []
+		# data is shared by all the connections, it must not be modified
+		if self._deltas:
+			if self._needsSnapshot:
+				self._needsSnapshot = False
+				self._emitJson(self._encoder.snapshotJson(data))
+			else:
+				self._emitJson(self._encoder.deltaJson(data))
 
-		data.update({
-			"temps": temperatures
-		})
-		self._emit("current", data)
+		elif "temps" in data:
+			# the initial update after connecting, it's only for this client and brings the temperature history
+			self._temperatureSequence = printerManager().getTemperatureHistory().sequence
+			self._emit("current", data)
+
+		else:
+			# add the temperatures reported since the last update
+			temperatures, self._temperatureSequence = printerManager().getTemperatureHistory().samplesSince(self._temperatureSequence)
+			self._emitJson(self._encoder.legacyJson(data, temperatures))
 
 	def sendHistoryData(self, data):
 		pass
@@ -238,8 +354,8 @@ class PrinterStateConnection(SockJSConnection):
 		self._emit("timelapse", timelapseConfig)
 
 	def addTemperature(self, data):
-		with self._temperatureBacklogMutex:
-			self._temperatureBacklog.append(data)
+		# taken from the temperature history when the current data is sent
+		pass
 
 	def _onEvent(self, event, payload):
 		self.sendEvent(event, payload)
@@ -248,6 +364,16 @@ class PrinterStateConnection(SockJSConnection):
 		with self._emitLock:
 			self.send({type: payload})
 
+	def _emitJson(self, message):
+		with self._emitLock:
+			if self.is_closed:
+				return
+
+			if self.session.send_expects_json:
+				self.session.send_jsonified(message)
+			else:
+				self.session.send_message(proto.json_decode(message))
+
 
 #~~ customized large response handler
 
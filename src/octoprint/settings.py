@@ -42,6 +42,15 @@ default_settings = {
 			"temperature": 5,
 			"sdStatus": 1
 		},
+		"streaming": {
+			"enabled": False, # Keep several lines in flight instead of waiting for an ok after each one
+			"maxLines": 4, # Max number of lines sent but not yet acknowledged
+			"rxBufferSize": 127 # Size in bytes of the firmware serial RX buffer (Marlin's default is 128)
+		},
+		"readAhead": { # Commands kept queued while printing through a printer plugin, by transport
+			"serial": 8,
+			"usb": 32 # bulk transfers go out faster than the plugin asks for more
+		},
 		"additionalPorts": []
 	},
 	"server": {
@@ -64,6 +73,14 @@ default_settings = {
 		"graphic-debug": False,
 		"video-rotation": 0,
 		"inactivitySecs": 120.0, # After 2 minutes of inactivity the camera shuts off
+		"snapshotMaxAge": 2.0, # Pictures taken less than this secs ago are reused for new requests, 0 to always take a new one
+		"timelapseUploads": {
+			"maxBytes": 50 * 1024 * 1024 # Timelapse photos kept while they can't be uploaded, the oldest are dropped beyond this
+		},
+		"sharedFrames": { # Shared memory where the GStreamer process leaves photos and local video frames
+			"slots": 4,
+			"slotSize": 1024 * 1024 # Larger frames are sent through the pipe
+		},
 		"freq" : 0 # 0 || "layer" || 60 || 120 || 300 || 900 || 1800
 	},
 	"clearFiles" : False,
@@ -72,6 +89,12 @@ default_settings = {
 		"mobileSizeThreshold": 2 * 1024 * 1024, # 2MB
 		"sizeThreshold": 20 * 1024 * 1024, # 20MB
 	},
+	"analysisCache": {
+		"maxEntries": 200 # Analysis results of print files kept by content, the least recently used are dropped
+	},
+	"analysis": {
+		"workers": 2 # Print files analyzed at the same time, each one can be running a GCodeAnalyzer process
+	},
 	"feature": {
 		"temperatureGraph": True,
 		"waitForStartOnConnect": False,
@@ -79,7 +102,9 @@ default_settings = {
 		"sdSupport": True,
 		"sdAlwaysAvailable": False,
 		"swallowOkAfterResend": True,
-		"repetierTargetTemp": False
+		"repetierTargetTemp": False,
+		"spoolGcode": True, # Pre-process gcode files into a spool when they're selected for printing
+		"spoolX3g": True # Frame the packets of x3g files into a spool when they're selected for printing
 	},
 	"folder": {
 		"uploads": None,
@@ -89,7 +114,11 @@ default_settings = {
 		"virtualSd": None,
 		"userPlugins": None,
 		"tasks": None,
-		"manufacturerPkg": None
+		"manufacturerPkg": None,
+		"spool": None,
+		"analysis": None,
+		"timelapseUploads": None,
+		"downloads": None
 	},
 	"temperature": {
 		"profiles":
@@ -139,9 +168,18 @@ default_settings = {
 	"cloudSlicer": {
 		"loggedUser": None
 	},
+	"downloads": {
+		"parallelSegments": 3, # Connections used to download large print files, if the server supports ranges
+		"parallelMinSize": 32 * 1024 * 1024, # Files smaller than this are downloaded over one connection
+		"keepPartialDays": 7 # Partial downloads are kept this long to continue them if the file is downloaded again
+	},
 	"events": {
 		"enabled": False,
-		"subscriptions": []
+		"subscriptions": [],
+		"maxRate": { # Max times per second the printer fires these events, 0 for no limit
+			"PrintingProgress": 2,
+			"TemperatureChange": 1
+		}
 	},
 	"api": {
 		"enabled": True,
@@ -0,0 +1,64 @@
+import time
+import threading
+import unittest
+
+from octoprint.events import Throttle
+
+class ThrottleTestCase(unittest.TestCase):
+
+	def setUp(self):
+		self.calls = []
+		self.called = threading.Event()
+
+	def call(self):
+		self.calls.append(time.time())
+		self.called.set()
+
+	def test_calls_in_the_interval_are_coalesced(self):
+		throttle = Throttle(0.1, self.call)
+
+		throttle()
+		self.assertEqual(len(self.calls), 1)
+
+		self.called.clear()
+		for i in xrange(10):
+			throttle()
+
+		self.assertEqual(len(self.calls), 1)
+		self.assertTrue(self.called.wait(1))
+		self.assertEqual(len(self.calls), 2)
+		self.assertGreaterEqual(self.calls[1] - self.calls[0], 0.09)
+
+	def test_cancel_drops_the_delayed_call(self):
+		throttle = Throttle(0.1, self.call)
+
+		throttle()
+		throttle()
+		throttle.cancel()
+
+		time.sleep(0.2)
+		self.assertEqual(len(self.calls), 1)
+
+		# it can be called again after the cancel
+		self.called.clear()
+		throttle()
+		self.assertTrue(self.called.is_set())
+
+	def test_throttles_share_the_scheduler(self):
+		first = Throttle(0.2, self.call)
+		second = Throttle(0.05, self.call)
+
+		first()
+		second()
+		first()
+		second()
+
+		deadline = time.time() + 1
+		while len(self.calls) < 4 and time.time() < deadline:
+			time.sleep(0.01)
+
+		self.assertEqual(len(self.calls), 4)
+		self.assertEqual(len([t for t in threading.enumerate() if t.name == "ThrottleScheduler"]), 1)
+
+if __name__ == '__main__':
+	unittest.main()